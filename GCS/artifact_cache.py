@@ -0,0 +1,226 @@
+import os
+import errno
+import shutil
+import hashlib
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+ARTIFACT_CACHE_DIR = os.environ.get("ARTIFACT_CACHE_DIR", str(Path.home() / ".cache" / "gcs-artifacts"))
+ARTIFACT_CACHE_MAX_BYTES = int(os.environ.get("ARTIFACT_CACHE_MAX_BYTES", str(50 * 1024 ** 3)))
+
+# ioctl request that clones a file's extents (reflink) on btrfs/XFS
+FICLONE = 0x40049409
+
+
+class FileLock:
+    """Exclusive inter-process lock on a lock file (flock, or msvcrt on Windows)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                flags = fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB)
+                fcntl.flock(fd, flags)
+            else:
+                mode = msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK
+                msvcrt.locking(fd, mode, 1)
+        except OSError as e:
+            os.close(fd)
+            if not blocking and e.errno in (errno.EAGAIN, errno.EACCES, errno.EWOULDBLOCK):
+                return False
+            raise
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else:
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def _link_or_copy(source: Path, target: Path):
+    """Place source at target as a hard link, a reflink, or (last resort) a copy."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_target = target.with_name(target.name + ".link")
+    tmp_target.unlink(missing_ok=True)
+    try:
+        os.link(source, tmp_target)
+    except OSError:
+        # Different filesystem or no hard link support: try a reflink, then copy
+        cloned = False
+        if fcntl is not None:
+            with open(source, "rb") as src, open(tmp_target, "wb") as dst:
+                try:
+                    fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                    cloned = True
+                except OSError:
+                    pass
+        if not cloned:
+            shutil.copyfile(source, tmp_target)
+    os.replace(tmp_target, target)
+
+
+def _remove_entry(path: Path):
+    """Delete a cache entry without touching the links placed elsewhere.
+
+    Unlinking only needs write access to the directory, so the read-only
+    mode shared by every hard link is left alone. Windows refuses to delete
+    read-only files; there the attribute is cleared first.
+    """
+    try:
+        path.unlink(missing_ok=True)
+    except PermissionError:
+        if os.name != "nt":
+            raise
+        os.chmod(path, 0o644)
+        path.unlink(missing_ok=True)
+
+
+class ArtifactCache:
+    """Host-local cache of downloaded GCS objects, keyed by bucket, name and generation.
+
+    A GCS generation identifies exact object bytes, so a cached entry never
+    goes stale. Entries are hard-linked (or reflinked) into target
+    directories, so a redeploy or rollback to a cached generation costs no
+    transfer and no extra disk. Entries are made read-only because every
+    link shares the same bytes. Per-entry file locks keep processes on one
+    host from fetching the same object twice, and the least recently used
+    entries are evicted once the cache grows past max_bytes. The cache size
+    is scanned once and then kept up to date as entries are added, so only
+    an add that crosses the bound pays for a full scan.
+    """
+
+    def __init__(self, root: str = ARTIFACT_CACHE_DIR, max_bytes: int = ARTIFACT_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        # Bytes under objects/, counted on the first add(); other processes'
+        # additions are picked up by the next eviction scan
+        self._total = None
+        (self.root / "objects").mkdir(parents=True, exist_ok=True)
+        (self.root / "locks").mkdir(parents=True, exist_ok=True)
+        (self.root / "tmp").mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(bucket_name: str, blob_name: str, generation) -> str:
+        return hashlib.sha256(f"{bucket_name}/{blob_name}#{generation}".encode("utf-8")).hexdigest()
+
+    def entry_path(self, key: str) -> Path:
+        return self.root / "objects" / key[:2] / key
+
+    def tmp_path(self, key: str) -> Path:
+        """Where to download an entry, on the cache's filesystem so add() can rename it."""
+        return self.root / "tmp" / f"{key}.{os.getpid()}.part"
+
+    def lock(self, key: str) -> FileLock:
+        return FileLock(self.root / "locks" / f"{key}.lock")
+
+    def get(self, key: str):
+        """Return the cached file for key (marking it recently used), or None."""
+        path = self.entry_path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def link(self, key: str, target: Path) -> bool:
+        """Link a cached entry to target; returns False on a cache miss.
+
+        Another process may evict the entry between the lookup and the link;
+        that is treated as a miss too, so the caller fetches the object.
+        """
+        path = self.get(key)
+        if path is None:
+            return False
+        try:
+            _link_or_copy(path, target)
+        except FileNotFoundError:
+            if path.exists():
+                raise
+            target.with_name(target.name + ".link").unlink(missing_ok=True)
+            return False
+        return True
+
+    def add(self, key: str, source: Path, target: Path = None) -> Path:
+        """Move a verified download into the cache and link it back to target."""
+        path = self.entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            replaced = path.stat().st_size
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(source, path)
+        os.chmod(path, 0o444)
+        if target is not None:
+            _link_or_copy(path, target)
+        if self._total is None:
+            self._total = self.size()
+        else:
+            self._total += path.stat().st_size - replaced
+        if self._total > self.max_bytes:
+            self.evict()
+        return path
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes.
+
+        Once over the bound, entries are removed down to 90% of it, so the
+        adds that follow do not each trigger another scan.
+        """
+        with FileLock(self.root / "locks" / "evict.lock"):
+            entries = []
+            total = 0
+            for path in (self.root / "objects").glob("*/*"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+            if total > self.max_bytes:
+                low_water = self.max_bytes * 0.9
+                entries.sort()
+                for _, size, path in entries:
+                    if total <= low_water:
+                        break
+                    # Links already placed in target directories keep their bytes
+                    _remove_entry(path)
+                    total -= size
+            self._total = total
+
+    def clear(self):
+        with FileLock(self.root / "locks" / "evict.lock"):
+            for path in (self.root / "objects").glob("*/*"):
+                _remove_entry(path)
+            self._total = 0
+
+    def size(self) -> int:
+        total = 0
+        for path in (self.root / "objects").glob("*/*"):
+            try:
+                total += path.stat().st_size
+            except FileNotFoundError:
+                continue
+        return total
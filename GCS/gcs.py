@@ -1,100 +1,514 @@
 import os
-from google.cloud import storage
+import json
+import base64
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import google_crc32c
+from google.api_core import exceptions as api_exceptions
 from dotenv import load_dotenv
 from pathlib import Path
+from gcs_operations import delete_blobs, invalidate_listing_cache
+import _common  # noqa: F401  (puts the repository root on sys.path)
+from common.storage_clients import get_storage_client
+from common.config import require_env
+from common.telemetry import log, telemetry
 load_dotenv()
 
-SA_FILE = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
-if not SA_FILE:
-    raise FileNotFoundError("GOOGLE_APPLICATION_CREDENTIALS environment variable not set")
-
+# Checked by get_client() when the first call is made, not at import
 PROJECT_ID = os.environ.get("PROJECT_ID")
-if not PROJECT_ID:
-    raise FileNotFoundError("PROJECT_ID environment variable not set")
-
 BUCKET_NAME = os.environ.get("BUCKET")
-if not BUCKET_NAME:
-    raise FileNotFoundError("BUCKET environment variable not set")
 
 LOCATION = os.environ.get("LOCATION", "us-central1")
 MODEL_DIR = os.environ.get("MODEL_DIR", "qwen2.5-3b-instruct")
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", "8"))
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(64 * 1024 * 1024)))
+COMPOSITE_UPLOAD_THRESHOLD = int(os.environ.get("COMPOSITE_UPLOAD_THRESHOLD", str(256 * 1024 * 1024)))
+
+# Parts of large files are staged under this prefix until they are composed
+PARTS_PREFIX = "_upload_parts"
+# Object metadata key recording which local file version a blob was uploaded from
+FINGERPRINT_KEY = "source-fingerprint"
+# Folders inside a model directory that are never uploaded (snapshot_download's .cache/huggingface)
+LOCAL_ONLY_DIRS = {".cache"}
+# GCS accepts at most 32 source objects per compose request
+MAX_COMPOSE_SOURCES = 32
+
+
+def get_client():
+    """Shared storage client for PROJECT_ID, created on first use."""
+    require_env("GOOGLE_APPLICATION_CREDENTIALS", "PROJECT_ID", "BUCKET")
+    return get_storage_client(PROJECT_ID)
 
-client = storage.Client(project=PROJECT_ID)
 
 def create_bucket(bucket_name: str = BUCKET_NAME, location: str = LOCATION):
     """Create a GCS bucket if it doesn't exist."""
     try:
-        bucket = client.bucket(bucket_name)
+        bucket = get_client().bucket(bucket_name)
         if bucket.exists():
-            print(f"Bucket '{bucket_name}' already exists")
+            log(f"Bucket '{bucket_name}' already exists")
             return bucket
         
-        bucket = client.create_bucket(bucket_name, location=location)
-        print(f"✓ Created bucket: {bucket.name} in location: {location}")
+        bucket = get_client().create_bucket(bucket_name, location=location)
+        log(f"✓ Created bucket: {bucket.name} in location: {location}")
         return bucket
     except Exception as e:
-        print(f"✗ Error creating bucket: {e}")
+        log(f"✗ Error creating bucket: {e}")
         raise
 
 def upload_model_directory(model_dir_path: str = MODEL_DIR, bucket_name: str = BUCKET_NAME):
     """Upload a model directory to GCS bucket."""
-    bucket = client.bucket(bucket_name)
+    bucket = get_client().bucket(bucket_name)
     
     if not bucket.exists():
         raise FileNotFoundError(f"Bucket '{bucket_name}' does not exist. Create it first using create_bucket()")
     
     model_dir = Path(model_dir_path)
     if model_dir.exists():
-        print(f"Uploading model from {model_dir}...")
+        log(f"Uploading model from {model_dir}...")
         
         folder_name = model_dir.name
-        print(f"Creating folder '{folder_name}' in bucket...")
+        log(f"Creating folder '{folder_name}' in bucket...")
         
-        for file_path in model_dir.rglob("*"):
-            if file_path.is_file():
-                relative_path = file_path.relative_to(model_dir.parent)
-                blob_name = str(relative_path).replace("\\", "/")
-                blob = bucket.blob(blob_name)
+        for file_path, blob_name in _model_files(model_dir):
+            blob = bucket.blob(blob_name)
+            with telemetry.span("gcs.upload", blob=blob_name) as span:
                 blob.upload_from_filename(str(file_path))
-                print(f"  ✓ Uploaded {blob_name}")
-        print("Upload complete!")
+                span.add_bytes(file_path.stat().st_size)
+            log(f"  ✓ Uploaded {blob_name}")
+        invalidate_listing_cache(bucket_name, f"{folder_name}/")
+        log("Upload complete!")
     else:
-        print(f"Model directory {model_dir} not found")
+        log(f"Model directory {model_dir} not found")
+
+
+class _FileSlice:
+    """Read-only, seekable view of one byte range of a file, used to upload a part."""
+
+    def __init__(self, path: Path, offset: int, length: int):
+        self._file = open(path, "rb")
+        self._offset = offset
+        self._length = length
+        self._pos = 0
+        self._file.seek(offset)
+
+    def read(self, size: int = -1) -> bytes:
+        remaining = self._length - self._pos
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        data = self._file.read(size)
+        self._pos += len(data)
+        return data
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, pos: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            pos += self._pos
+        elif whence == os.SEEK_END:
+            pos += self._length
+        self._pos = min(max(pos, 0), self._length)
+        self._file.seek(self._offset + self._pos)
+        return self._pos
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _file_fingerprint(file_path: Path) -> str:
+    stat = file_path.stat()
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def _crc32c_b64(file_path: Path, offset: int = 0, length: int = None) -> str:
+    """CRC32C of a byte range, base64-encoded the way GCS reports it."""
+    checksum = google_crc32c.Checksum()
+    with _FileSlice(file_path, offset, length if length is not None else file_path.stat().st_size) as f:
+        for block in iter(lambda: f.read(8 * 1024 * 1024), b""):
+            checksum.update(block)
+    return base64.b64encode(checksum.digest()).decode("utf-8")
+
+
+def _upload_whole_file(bucket, file_path: Path, blob_name: str, fingerprint: str) -> int:
+    blob = bucket.blob(blob_name)
+    blob.metadata = {FINGERPRINT_KEY: fingerprint}
+    size = file_path.stat().st_size
+    with telemetry.span("gcs.upload", blob=blob_name) as span:
+        blob.upload_from_filename(str(file_path), checksum="crc32c")
+        span.add_bytes(size)
+    log(f"  ✓ Uploaded {blob_name}")
+    return size
+
+
+def _upload_part(bucket, file_path: Path, part_name: str, offset: int, length: int, existing_part=None) -> int:
+    """Upload one part of a large file, skipping it if a previous run already did."""
+    if existing_part is not None and existing_part.size == length:
+        if existing_part.crc32c == _crc32c_b64(file_path, offset, length):
+            return 0
+    blob = bucket.blob(part_name)
+    with telemetry.span("gcs.upload_part", blob=part_name) as span, _FileSlice(file_path, offset, length) as part:
+        blob.upload_from_file(part, size=length, checksum="crc32c")
+        span.add_bytes(length)
+    return length
+
+
+def _compose_parts(bucket, blob_name: str, part_names: list, fingerprint: str):
+    """Compose uploaded parts into the final blob, then delete the parts."""
+    with telemetry.span("gcs.compose", blob=blob_name, parts=len(part_names)):
+        sources = [bucket.blob(name) for name in part_names]
+        intermediates = []
+        level = 0
+        # Compose in rounds of 32 until the remaining sources fit in one request
+        while len(sources) > MAX_COMPOSE_SOURCES:
+            next_sources = []
+            for i in range(0, len(sources), MAX_COMPOSE_SOURCES):
+                intermediate = bucket.blob(f"{part_names[0].rsplit('/', 1)[0]}/compose-{level}-{i // MAX_COMPOSE_SOURCES:05d}")
+                intermediate.compose(sources[i:i + MAX_COMPOSE_SOURCES])
+                intermediates.append(intermediate)
+                next_sources.append(intermediate)
+            sources = next_sources
+            level += 1
+
+        destination = bucket.blob(blob_name)
+        destination.metadata = {FINGERPRINT_KEY: fingerprint}
+        destination.content_type = mimetypes.guess_type(blob_name)[0] or "application/octet-stream"
+        destination.compose(sources)
+
+        for blob in [bucket.blob(name) for name in part_names] + intermediates:
+            try:
+                blob.delete()
+            except api_exceptions.NotFound:
+                pass
+    log(f"  ✓ Uploaded {blob_name} ({len(part_names)} parts)")
+
+
+def _model_files(model_dir: Path):
+    """Yield (local path, blob name) for every file under model_dir.
+
+    Skips LOCAL_ONLY_DIRS, such as the download bookkeeping Hugging Face's
+    snapshot_download keeps in .cache/huggingface.
+    """
+    for file_path in model_dir.rglob("*"):
+        if file_path.is_file() and not any(part in LOCAL_ONLY_DIRS for part in file_path.relative_to(model_dir).parts[:-1]):
+            blob_name = str(file_path.relative_to(model_dir.parent)).replace("\\", "/")
+            yield file_path, blob_name
+
+
+def _list_existing(bucket_name: str, folder_name: str) -> dict:
+    """Map blob name -> Blob for a model folder and its staged upload parts."""
+    with telemetry.span("gcs.list", prefix=f"{folder_name}/") as span:
+        existing = {blob.name: blob for blob in get_client().list_blobs(bucket_name, prefix=f"{folder_name}/")}
+        existing.update({blob.name: blob for blob in get_client().list_blobs(bucket_name, prefix=f"{PARTS_PREFIX}/{folder_name}/")})
+        span.set(items=len(existing))
+    return existing
+
+
+def _upload_files(bucket, files: list, existing: dict, max_workers: int, chunk_size: int, composite_threshold: int):
+    """Upload (local path, blob name) pairs on a thread pool.
+
+    Returns (bytes uploaded, list of error messages, set of blob names that
+    failed). Files of at least composite_threshold bytes are uploaded as
+    parts and composed.
+    """
+    bytes_uploaded = 0
+    errors = []
+    composites = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for file_path, blob_name in files:
+            fingerprint = _file_fingerprint(file_path)
+            size = file_path.stat().st_size
+            if size < composite_threshold:
+                future = pool.submit(_upload_whole_file, bucket, file_path, blob_name, fingerprint)
+                futures[future] = blob_name
+                continue
+
+            part_names = []
+            for index, offset in enumerate(range(0, size, chunk_size)):
+                part_name = f"{PARTS_PREFIX}/{blob_name}/{fingerprint}/part-{index:05d}"
+                part_names.append(part_name)
+                future = pool.submit(
+                    _upload_part, bucket, file_path, part_name, offset,
+                    min(chunk_size, size - offset), existing.get(part_name),
+                )
+                futures[future] = blob_name
+            composites.append((blob_name, part_names, fingerprint))
+
+        failed_files = set()
+        for future in as_completed(futures):
+            try:
+                bytes_uploaded += future.result()
+            except Exception as e:
+                failed_files.add(futures[future])
+                errors.append(f"{futures[future]}: {e}")
+
+        compose_futures = {
+            pool.submit(_compose_parts, bucket, blob_name, part_names, fingerprint): blob_name
+            for blob_name, part_names, fingerprint in composites
+            if blob_name not in failed_files
+        }
+        for future in as_completed(compose_futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed_files.add(compose_futures[future])
+                errors.append(f"{compose_futures[future]}: {e}")
+
+    return bytes_uploaded, errors, failed_files
+
+
+def upload_model_directory_parallel(
+    model_dir_path: str = MODEL_DIR,
+    bucket_name: str = BUCKET_NAME,
+    max_workers: int = UPLOAD_WORKERS,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    composite_threshold: int = COMPOSITE_UPLOAD_THRESHOLD,
+):
+    """Upload a model directory with a thread pool, splitting large files into parts.
+
+    Files smaller than ``composite_threshold`` are uploaded whole, several at
+    a time. Larger files are cut into ``chunk_size`` parts that are uploaded
+    in parallel under ``_upload_parts/`` and then composed into the final
+    object (a parallel composite upload; the result carries a CRC32C but no
+    MD5).
+
+    Rerunning after an interruption resumes: blobs already uploaded from the
+    same local file version (size + mtime) are skipped, and so are parts
+    whose size and CRC32C match, so a large file continues from its last
+    completed part instead of byte zero.
+    """
+    bucket = get_client().bucket(bucket_name)
+
+    if not bucket.exists():
+        raise FileNotFoundError(f"Bucket '{bucket_name}' does not exist. Create it first using create_bucket()")
+
+    model_dir = Path(model_dir_path)
+    if not model_dir.exists():
+        log(f"Model directory {model_dir} not found")
+        return
+
+    folder_name = model_dir.name
+    log(f"Uploading model from {model_dir} with {max_workers} workers...")
+
+    existing = _list_existing(bucket_name, folder_name)
+
+    files = []
+    skipped = 0
+    for file_path, blob_name in _model_files(model_dir):
+        remote = existing.get(blob_name)
+        if remote is not None and (remote.metadata or {}).get(FINGERPRINT_KEY) == _file_fingerprint(file_path):
+            skipped += 1
+            continue
+        files.append((file_path, blob_name))
+
+    with telemetry.span("gcs.upload_model", folder=folder_name, files=len(files), skipped=skipped) as span:
+        bytes_uploaded, errors, _ = _upload_files(
+            bucket, files, existing, max_workers, chunk_size, composite_threshold
+        )
+        span.add_bytes(bytes_uploaded)
+        span.set(failed=len(errors))
+    if files:
+        # Cached listings (gcs_operations.list_bucket_files) no longer match the bucket
+        invalidate_listing_cache(bucket_name, f"{folder_name}/")
+
+    if skipped:
+        log(f"Skipped {skipped} file(s) already uploaded")
+    log(f"Uploaded {bytes_uploaded / (1024 * 1024):.1f} MiB")
+    if errors:
+        for error in errors:
+            log(f"  ✗ {error}")
+        raise RuntimeError(f"{len(errors)} upload(s) failed; rerun to resume")
+    log("Upload complete!")
+
+
+def _manifest_path(model_dir: Path) -> Path:
+    # Kept beside the model directory so it is never uploaded with it
+    return model_dir.parent / f".{model_dir.name}.gcs-manifest.json"
+
+
+def _load_manifest(manifest_path: Path) -> dict:
+    try:
+        with open(manifest_path) as f:
+            return json.load(f).get("files", {})
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest_path: Path, files: dict):
+    tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"version": 1, "files": files}, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def _cached_crc32c(file_path: Path, entry: dict):
+    """Return (crc32c, manifest entry), re-hashing only if size, mtime or inode changed."""
+    stat = file_path.stat()
+    key = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "inode": stat.st_ino}
+    if entry and all(entry.get(k) == v for k, v in key.items()) and entry.get("crc32c"):
+        return entry["crc32c"], entry
+    crc32c = _crc32c_b64(file_path)
+    return crc32c, {**key, "crc32c": crc32c}
+
+
+def sync_model_directory(
+    model_dir_path: str = MODEL_DIR,
+    bucket_name: str = BUCKET_NAME,
+    delete_orphans: bool = False,
+    dry_run: bool = False,
+    manifest_path: str = None,
+    max_workers: int = UPLOAD_WORKERS,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    composite_threshold: int = COMPOSITE_UPLOAD_THRESHOLD,
+):
+    """Upload only the files of a model directory that differ from the bucket.
+
+    A file is unchanged when the remote blob has the same size and CRC32C.
+    Local CRC32C values are cached in a manifest keyed by size, mtime and
+    inode, so unchanged multi-GB shards are not hashed again on later runs.
+    With delete_orphans=True, remote blobs under the model folder that no
+    longer exist locally are deleted. With dry_run=True nothing is changed.
+
+    Returns a summary dict: uploaded / unchanged / deleted blob names,
+    bytes_uploaded and bytes_saved (size of the unchanged files).
+    """
+    bucket = get_client().bucket(bucket_name)
+
+    if not bucket.exists():
+        raise FileNotFoundError(f"Bucket '{bucket_name}' does not exist. Create it first using create_bucket()")
+
+    model_dir = Path(model_dir_path)
+    if not model_dir.exists():
+        raise FileNotFoundError(f"Model directory {model_dir} not found")
+
+    folder_name = model_dir.name
+    manifest_path = Path(manifest_path) if manifest_path else _manifest_path(model_dir)
+    manifest = _load_manifest(manifest_path)
+    log(f"Syncing {model_dir} to gs://{bucket_name}/{folder_name}/...")
+
+    with telemetry.span("gcs.list", prefix=f"{folder_name}/") as span:
+        remote = {
+            blob.name: blob
+            for blob in get_client().list_blobs(
+                bucket_name,
+                prefix=f"{folder_name}/",
+                fields="items(name,size,crc32c),nextPageToken",
+            )
+        }
+        span.set(items=len(remote))
+    local = dict((blob_name, file_path) for file_path, blob_name in _model_files(model_dir))
+
+    # Hash the local files in parallel; manifest hits return immediately
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        hashed = dict(zip(
+            local,
+            pool.map(lambda item: _cached_crc32c(item[1], manifest.get(item[0])), local.items()),
+        ))
+    new_manifest = {blob_name: entry for blob_name, (_, entry) in hashed.items()}
+
+    to_upload, unchanged = [], []
+    bytes_saved = 0
+    for blob_name, file_path in sorted(local.items()):
+        crc32c, entry = hashed[blob_name]
+        blob = remote.get(blob_name)
+        if blob is not None and blob.size == entry["size"] and blob.crc32c == crc32c:
+            unchanged.append(blob_name)
+            bytes_saved += entry["size"]
+        else:
+            to_upload.append((file_path, blob_name))
+    orphans = sorted(set(remote) - set(local)) if delete_orphans else []
+
+    summary = {
+        "uploaded": [blob_name for _, blob_name in to_upload],
+        "unchanged": unchanged,
+        "deleted": orphans,
+        "bytes_uploaded": 0,
+        "bytes_saved": bytes_saved,
+    }
+
+    for blob_name in summary["uploaded"]:
+        log(f"  {'+' if blob_name not in remote else '~'} {blob_name}")
+    for blob_name in orphans:
+        log(f"  - {blob_name}")
+
+    if dry_run:
+        log(f"Dry run: {len(to_upload)} to upload, {len(unchanged)} unchanged, {len(orphans)} to delete")
+        return summary
+
+    errors, failed = [], set()
+    if to_upload:
+        existing = _list_existing(bucket_name, folder_name)
+        with telemetry.span("gcs.upload_model", folder=folder_name, files=len(to_upload)) as span:
+            summary["bytes_uploaded"], errors, failed = _upload_files(
+                bucket, to_upload, existing, max_workers, chunk_size, composite_threshold
+            )
+            span.add_bytes(summary["bytes_uploaded"])
+            span.set(failed=len(errors))
+    if orphans:
+        # Deleted in batch requests; this also drops cached listings for the folder
+        try:
+            delete_blobs(bucket_name, blob_names=orphans)
+        except RuntimeError as e:
+            errors.append(str(e))
+    if to_upload:
+        invalidate_listing_cache(bucket_name, f"{folder_name}/")
+
+    # Files whose upload failed get no manifest entry, so they are hashed
+    # and compared against the bucket again next time
+    for blob_name in failed:
+        new_manifest.pop(blob_name, None)
+    summary["uploaded"] = [blob_name for blob_name in summary["uploaded"] if blob_name not in failed]
+    _save_manifest(manifest_path, new_manifest)
+
+    log(
+        f"Sync summary: {len(summary['uploaded'])} uploaded, {len(unchanged)} unchanged, {len(orphans)} deleted; "
+        f"{summary['bytes_uploaded'] / (1024 * 1024):.1f} MiB uploaded, {bytes_saved / (1024 * 1024):.1f} MiB saved"
+    )
+    if errors:
+        for error in errors:
+            log(f"  ✗ {error}")
+        raise RuntimeError(f"{len(errors)} upload(s) or delete(s) failed; rerun to resume")
+    return summary
 
 
 def delete_bucket(bucket_name: str = BUCKET_NAME):
     """Delete a GCS bucket and all its contents."""
     try:
-        bucket = client.bucket(bucket_name)
+        bucket = get_client().bucket(bucket_name)
         
         if not bucket.exists():
-            print(f"Bucket '{bucket_name}' does not exist")
+            log(f"Bucket '{bucket_name}' does not exist")
             return
         
         # Delete all blobs in the bucket first
-        blobs = client.list_blobs(bucket_name)
-        blob_count = 0
-        for blob in blobs:
-            blob.delete()
-            blob_count += 1
-            print(f"  ✓ Deleted blob: {blob.name}")
-        
-        if blob_count > 0:
-            print(f"Deleted {blob_count} blob(s)")
+        delete_blobs(bucket_name)
         
         # Delete the bucket
         bucket.delete()
-        print(f"✓ Bucket '{bucket_name}' deleted successfully!")
+        log(f"✓ Bucket '{bucket_name}' deleted successfully!")
     except Exception as e:
-        print(f"✗ Error deleting bucket: {e}")
+        log(f"✗ Error deleting bucket: {e}")
         raise
 
 if __name__ == "__main__":
     # Uncomment the line below to create the bucket if it doesn't exist
     # create_bucket(BUCKET_NAME, LOCATION)
     
-    # Upload model directory
-    upload_model_directory(MODEL_DIR, BUCKET_NAME)
+    # Upload model directory (parallel and resumable)
+    upload_model_directory_parallel(MODEL_DIR, BUCKET_NAME)
+    
+    # Or upload only the files that changed since the last run
+    # sync_model_directory(MODEL_DIR, BUCKET_NAME, delete_orphans=False)
+    
+    # Or upload one file at a time
+    # upload_model_directory(MODEL_DIR, BUCKET_NAME)
     
     # Uncomment the line below to delete the bucket
     # delete_bucket(BUCKET_NAME)
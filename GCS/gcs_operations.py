@@ -1,23 +1,50 @@
 import os
-from google.cloud import storage
+import json
+import time
+import random
+import base64
+import hashlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+import google_crc32c
+from google.api_core import exceptions as api_exceptions
 from dotenv import load_dotenv
 from pathlib import Path
+from artifact_cache import ArtifactCache
+import _common  # noqa: F401  (puts the repository root on sys.path)
+from common.storage_clients import get_storage_client
+from common.config import require_env
+from common.telemetry import log, note_retry, telemetry
 load_dotenv()
 
-SA_FILE = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
-if not SA_FILE:
-    raise FileNotFoundError("GOOGLE_APPLICATION_CREDENTIALS environment variable not set")
-
+# Checked by get_client() when the first call is made, not at import
 PROJECT_ID = os.environ.get("PROJECT_ID")
-if not PROJECT_ID:
-    raise FileNotFoundError("PROJECT_ID environment variable not set")
-
 BUCKET_NAME = os.environ.get("BUCKET")
-if not BUCKET_NAME:
-    raise FileNotFoundError("BUCKET environment variable not set")
 
-client = storage.Client(project=PROJECT_ID)
-bucket = client.bucket(BUCKET_NAME)
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", "8"))
+DOWNLOAD_SLICE_SIZE = int(os.environ.get("DOWNLOAD_SLICE_SIZE", str(64 * 1024 * 1024)))
+SLICED_DOWNLOAD_THRESHOLD = int(os.environ.get("SLICED_DOWNLOAD_THRESHOLD", str(256 * 1024 * 1024)))
+DELETE_WORKERS = int(os.environ.get("DELETE_WORKERS", "8"))
+LIST_PAGE_SIZE = int(os.environ.get("LIST_PAGE_SIZE", "1000"))
+LIST_CACHE_DIR = os.environ.get("LIST_CACHE_DIR", ".gcs_list_cache")
+LIST_CACHE_TTL = float(os.environ.get("LIST_CACHE_TTL", "300"))
+
+# Only these object fields are fetched when listing, unless asked otherwise
+DEFAULT_LIST_FIELDS = ("name", "size", "crc32c", "generation")
+
+# GCS accepts at most 100 calls in one batch request
+MAX_BATCH_SIZE = 100
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def get_client():
+    """Shared storage client for PROJECT_ID, created on first use."""
+    require_env("GOOGLE_APPLICATION_CREDENTIALS", "PROJECT_ID", "BUCKET")
+    return get_storage_client(PROJECT_ID)
+
+
+def get_bucket(bucket_name: str = BUCKET_NAME):
+    return get_client().bucket(bucket_name)
+
 
 
 def create_bucket(bucket_name: str = BUCKET_NAME, location: str = None):
@@ -26,54 +53,273 @@ def create_bucket(bucket_name: str = BUCKET_NAME, location: str = None):
         location = os.environ.get("LOCATION", "us-central1")
     
     try:
-        bucket = client.bucket(bucket_name)
+        bucket = get_client().bucket(bucket_name)
         if bucket.exists():
-            print(f"Bucket '{bucket_name}' already exists")
+            log(f"Bucket '{bucket_name}' already exists")
             return bucket
         
-        bucket = client.create_bucket(bucket_name, location=location)
-        print(f"✓ Created bucket: {bucket.name} in location: {location}")
+        bucket = get_client().create_bucket(bucket_name, location=location)
+        log(f"✓ Created bucket: {bucket.name} in location: {location}")
         return bucket
     except Exception as e:
-        print(f"✗ Error creating bucket: {e}")
+        log(f"✗ Error creating bucket: {e}")
         raise
 
 
+def _delete_batch(target_bucket, names: list, max_retries: int):
+    """Delete up to 100 blobs in one batch request, retrying only failed sub-requests.
+
+    Returns (deleted count, list of (name, reason) failures). Blobs that are
+    already gone (404) count as deleted.
+    """
+    with telemetry.span("gcs.delete_batch", blobs=len(names)):
+        deleted = 0
+        failures = []
+        for attempt in range(max_retries + 1):
+            retry = []
+            last_error = None
+            try:
+                with get_client().batch(raise_exception=False) as batch:
+                    for name in names:
+                        target_bucket.delete_blob(name)
+                for name, response in zip(names, batch._responses):
+                    status = response.status_code
+                    if 200 <= status < 300 or status == 404:
+                        deleted += 1
+                    elif status in RETRYABLE_STATUS:
+                        retry.append(name)
+                    else:
+                        failures.append((name, f"HTTP {status}"))
+            except Exception as e:
+                # The batch request itself failed; none of it is known to have applied
+                retry = names
+                last_error = e
+
+            if not retry:
+                break
+            if attempt == max_retries:
+                reason = f"retries exhausted ({last_error})" if last_error else "retries exhausted"
+                failures.extend((name, reason) for name in retry)
+                break
+            names = retry
+            note_retry()
+            time.sleep(min(2 ** attempt, 30) * random.uniform(0.5, 1.0))
+    return deleted, failures
+
+
+def delete_blobs(
+    bucket_name: str = BUCKET_NAME,
+    prefix: str = None,
+    max_workers: int = DELETE_WORKERS,
+    batch_size: int = MAX_BATCH_SIZE,
+    max_retries: int = 3,
+    blob_names: list = None,
+):
+    """Delete every blob in a bucket, or only those under a prefix, in batches.
+
+    Names are streamed from the listing into batch requests of up to 100
+    deletes, which run concurrently on a thread pool. Failed sub-requests
+    with a retryable status are retried with backoff; progress is printed in
+    aggregate. Pass ``blob_names`` to delete exactly those blobs instead of
+    listing a prefix. Returns the number of blobs deleted.
+    """
+    target_bucket = get_client().bucket(bucket_name)
+    batch_size = min(batch_size, MAX_BATCH_SIZE)
+    if blob_names is not None:
+        common = os.path.commonprefix(list(blob_names))
+        prefix = common[: common.rfind("/") + 1]
+    target = f"gs://{bucket_name}/{prefix or ''}"
+    log(f"Deleting blobs under {target}...")
+    start = time.perf_counter()
+
+    deleted = 0
+    failures = []
+    last_report = 0
+
+    def collect(done):
+        nonlocal deleted, last_report
+        for future in done:
+            batch_deleted, batch_failures = future.result()
+            deleted += batch_deleted
+            failures.extend(batch_failures)
+        if deleted - last_report >= 1000:
+            log(f"  … deleted {deleted} blob(s)")
+            last_report = deleted
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = set()
+        names = []
+        if blob_names is None:
+            listing = get_client().list_blobs(bucket_name, prefix=prefix, fields="items(name),nextPageToken")
+            blob_names = (blob.name for blob in listing)
+        for name in blob_names:
+            names.append(name)
+            if len(names) < batch_size:
+                continue
+            pending.add(pool.submit(_delete_batch, target_bucket, names, max_retries))
+            names = []
+            # Keep the listing only a little ahead of the deletes
+            if len(pending) >= max_workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        if names:
+            pending.add(pool.submit(_delete_batch, target_bucket, names, max_retries))
+        collect(as_completed(pending))
+
+    invalidate_listing_cache(bucket_name, prefix)
+    telemetry.record("gcs.delete", time.perf_counter() - start, deleted=deleted, failed=len(failures))
+    log(f"✓ Deleted {deleted} blob(s) under {target}")
+    if failures:
+        for name, reason in failures[:10]:
+            log(f"  ✗ {name}: {reason}")
+        if len(failures) > 10:
+            log(f"  ✗ ... and {len(failures) - 10} more")
+        raise RuntimeError(f"Failed to delete {len(failures)} blob(s)")
+    return deleted
+
+
 def delete_bucket(bucket_name: str = BUCKET_NAME):
     """Delete a GCS bucket and all its contents."""
     try:
-        bucket = client.bucket(bucket_name)
+        bucket = get_client().bucket(bucket_name)
         
         if not bucket.exists():
-            print(f"Bucket '{bucket_name}' does not exist")
+            log(f"Bucket '{bucket_name}' does not exist")
             return
         
         # Delete all blobs in the bucket first
-        blobs = client.list_blobs(bucket_name)
-        blob_count = 0
-        for blob in blobs:
-            blob.delete()
-            blob_count += 1
-            print(f"  ✓ Deleted blob: {blob.name}")
-        
-        if blob_count > 0:
-            print(f"Deleted {blob_count} blob(s)")
+        delete_blobs(bucket_name)
         
         # Delete the bucket
         bucket.delete()
-        print(f"✓ Bucket '{bucket_name}' deleted successfully!")
+        log(f"✓ Bucket '{bucket_name}' deleted successfully!")
     except Exception as e:
-        print(f"✗ Error deleting bucket: {e}")
+        log(f"✗ Error deleting bucket: {e}")
         raise
 
 
-def list_bucket_files():
-    """List all files in the bucket."""
-    print(f"Files in bucket: {bucket.name}")
-    blobs = list(bucket.list_blobs())
-    for blob in blobs:
-        print(f"  - {blob.name} ({blob.size} bytes)")
-    return blobs
+def _listing_cache_path(bucket_name: str, prefix: str, delimiter: str, fields) -> Path:
+    key = hashlib.sha256(json.dumps([prefix, delimiter, sorted(fields)]).encode("utf-8")).hexdigest()[:32]
+    return Path(LIST_CACHE_DIR) / bucket_name / f"{key}.jsonl"
+
+
+def _read_listing_cache(cache_path: Path, ttl: float):
+    """Yield cached object resources, or return None if the cache is missing or stale."""
+    try:
+        f = open(cache_path)
+    except FileNotFoundError:
+        return None
+    with f:
+        header = json.loads(f.readline() or "{}")
+        if time.time() - header.get("created", 0) > ttl:
+            return None
+        return [json.loads(line) for line in f]
+
+
+def invalidate_listing_cache(bucket_name: str = BUCKET_NAME, name: str = None):
+    """Drop cached listings of a bucket that overlap ``name`` or prefix (all if None)."""
+    cache_dir = Path(LIST_CACHE_DIR) / bucket_name
+    if not cache_dir.exists():
+        return
+    for cache_path in cache_dir.glob("*.jsonl"):
+        try:
+            with open(cache_path) as f:
+                prefix = json.loads(f.readline() or "{}").get("prefix") or ""
+        except (OSError, ValueError):
+            prefix = ""
+        if name is None or name.startswith(prefix) or prefix.startswith(name):
+            cache_path.unlink(missing_ok=True)
+
+
+def list_bucket_files(
+    prefix: str = None,
+    delimiter: str = None,
+    fields=DEFAULT_LIST_FIELDS,
+    page_size: int = LIST_PAGE_SIZE,
+    use_cache: bool = False,
+    cache_ttl: float = LIST_CACHE_TTL,
+):
+    """Lazily yield the blobs in the bucket, one page at a time.
+
+    Only ``fields`` are fetched for each object (name, size, crc32c and
+    generation by default), and ``prefix``/``delimiter`` restrict the
+    listing server-side. With use_cache=True, a complete listing is written
+    to LIST_CACHE_DIR and reused for cache_ttl seconds; cached entries keep
+    the generation they were listed at, and the cache is dropped when this
+    module or gcs.py writes under the prefix or a listed generation is found
+    gone.
+
+    The cache is not checked against the bucket before it is reused (that
+    would take the same listing calls it saves), so it only suits a bucket
+    that no one else writes to within cache_ttl. Objects written by another
+    machine, or by HF/hf.py, are not seen until the TTL runs out; a
+    rewritten object fails its generation-pinned download and drops the
+    cache, but a new object is simply missing.
+    """
+    bucket = get_bucket()
+    fields = tuple(dict.fromkeys(("name",) + tuple(fields)))
+    cache_path = _listing_cache_path(bucket.name, prefix, delimiter, fields) if use_cache else None
+
+    if cache_path is not None:
+        cached = _read_listing_cache(cache_path, cache_ttl)
+        if cached is not None:
+            telemetry.record("gcs.list_cached", 0.0, items=len(cached))
+            for resource in cached:
+                blob = bucket.blob(resource["name"])
+                blob._properties.update(resource)
+                yield blob
+            return
+
+    iterator = get_client().list_blobs(
+        bucket.name,
+        prefix=prefix,
+        delimiter=delimiter,
+        fields=f"items({','.join(fields)}),prefixes,nextPageToken",
+        page_size=page_size,
+    )
+
+    # Recorded once the listing is exhausted; the time includes whatever the
+    # caller does between items, since pages are fetched on demand
+    start = time.perf_counter()
+    if cache_path is None:
+        count = 0
+        for blob in iterator:
+            count += 1
+            yield blob
+        telemetry.record("gcs.list", time.perf_counter() - start, items=count)
+        return
+
+    # Stream the listing into the cache file; it is only published once complete
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps({"created": time.time(), "prefix": prefix, "delimiter": delimiter}) + "\n")
+            for blob in iterator:
+                f.write(json.dumps({key: blob._properties[key] for key in fields if key in blob._properties}) + "\n")
+                yield blob
+        os.replace(tmp_path, cache_path)
+        telemetry.record("gcs.list", time.perf_counter() - start, items=iterator.num_results)
+    finally:
+        # Abandoned part-way through: the listing is incomplete, so discard it
+        tmp_path.unlink(missing_ok=True)
+
+
+def list_bucket_folders(prefix: str = None, delimiter: str = "/"):
+    """Return the "folder" prefixes directly under prefix, e.g. one per model."""
+    bucket = get_bucket()
+    iterator = get_client().list_blobs(
+        bucket.name,
+        prefix=prefix,
+        delimiter=delimiter,
+        fields="prefixes,nextPageToken",
+        page_size=LIST_PAGE_SIZE,
+    )
+    with telemetry.span("gcs.list", prefix=prefix) as span:
+        for _ in iterator:
+            pass
+        span.set(items=len(iterator.prefixes))
+    return sorted(iterator.prefixes)
 
 
 def download_file(blob_name: str, local_path: str = None):
@@ -81,27 +327,219 @@ def download_file(blob_name: str, local_path: str = None):
     if local_path is None:
         local_path = blob_name.split("/")[-1]
     
-    blob = bucket.blob(blob_name)
-    blob.download_to_filename(local_path)
-    print(f"✓ Downloaded {blob_name} to {local_path}")
+    blob = get_bucket().blob(blob_name)
+    with telemetry.span("gcs.download", blob=blob_name) as span:
+        blob.download_to_filename(local_path)
+        span.add_bytes(blob.size or 0)
+    log(f"✓ Downloaded {blob_name} to {local_path}")
     return local_path
 
 
-def download_model(local_dir: str = None):
-    """Download entire model from bucket."""
+def download_model(local_dir: str = None, prefix: str = None):
+    """Download entire model from bucket (or only the blobs under prefix)."""
     if local_dir is None:
         local_dir = os.environ.get("DOWNLOAD_DIR", "downloaded_model")
     Path(local_dir).mkdir(exist_ok=True)
-    print(f"Downloading model to {local_dir}...")
+    log(f"Downloading model to {local_dir}...")
     
-    blobs = bucket.list_blobs()
-    for blob in blobs:
+    for blob in list_bucket_files(prefix=prefix):
         local_file = Path(local_dir) / blob.name
         local_file.parent.mkdir(parents=True, exist_ok=True)
-        blob.download_to_filename(str(local_file))
-        print(f"  ✓ Downloaded {blob.name}")
+        with telemetry.span("gcs.download", blob=blob.name) as span:
+            blob.download_to_filename(str(local_file))
+            span.add_bytes(blob.size or 0)
+        log(f"  ✓ Downloaded {blob.name}")
     
-    print("✓ Model download complete!")
+    log("✓ Model download complete!")
+    return local_dir
+
+
+def _file_crc32c(path: Path) -> str:
+    """CRC32C of a local file, base64-encoded the way GCS reports it."""
+    checksum = google_crc32c.Checksum()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(8 * 1024 * 1024), b""):
+            checksum.update(block)
+    return base64.b64encode(checksum.digest()).decode("utf-8")
+
+
+def _download_range(blob, tmp_path: Path, start: int, end: int) -> int:
+    """Download bytes [start, end] of a blob into place in a preallocated file."""
+    with telemetry.span("gcs.download_range", blob=blob.name) as span, open(tmp_path, "r+b") as f:
+        f.seek(start)
+        # Ranged reads cannot be checksummed by the library; the whole file
+        # is verified against the object's CRC32C once all ranges are in
+        blob.download_to_file(f, start=start, end=end, checksum=None)
+        span.add_bytes(end - start + 1)
+    return end - start + 1
+
+
+def _finalize_download(blob, tmp_path: Path, local_file: Path, artifact_cache: ArtifactCache = None, key: str = None):
+    """Verify a finished download end to end, then atomically move it into place.
+
+    With an artifact cache, the file is moved into the cache and linked
+    into place from there.
+    """
+    if blob.crc32c:
+        with telemetry.span("gcs.verify", blob=blob.name) as span:
+            span.add_bytes(tmp_path.stat().st_size)
+            if _file_crc32c(tmp_path) != blob.crc32c:
+                tmp_path.unlink()
+                raise ValueError(f"CRC32C mismatch for {blob.name}")
+    if artifact_cache is not None:
+        artifact_cache.add(key, tmp_path, local_file)
+    else:
+        os.replace(tmp_path, local_file)
+    log(f"  ✓ Downloaded {blob.name}")
+
+
+def download_model_parallel(
+    local_dir: str = None,
+    prefix: str = None,
+    max_workers: int = DOWNLOAD_WORKERS,
+    slice_size: int = DOWNLOAD_SLICE_SIZE,
+    sliced_threshold: int = SLICED_DOWNLOAD_THRESHOLD,
+    use_cache: bool = False,
+    artifact_cache: ArtifactCache = None,
+):
+    """Download a model from the bucket with files and byte ranges in parallel.
+
+    Files are downloaded concurrently. Files of at least sliced_threshold
+    bytes are split into slice_size byte ranges that are written in place
+    into a preallocated ``.part`` file. Each file is checked against the
+    object's CRC32C before it is renamed into place, so a partial or
+    corrupted file never appears under its final name. Reads are pinned to
+    the generation seen at listing time (use_cache=True reuses a cached
+    listing; if a cached generation has since been replaced, the cache is
+    dropped and the download fails so it can be rerun).
+
+    With an ArtifactCache, objects already cached at the listed generation
+    are linked into local_dir without any transfer, and new downloads are
+    added to the cache. If another process on the host is already fetching
+    an object, this call waits for it and links the result.
+    """
+    if local_dir is None:
+        local_dir = os.environ.get("DOWNLOAD_DIR", "downloaded_model")
+    Path(local_dir).mkdir(exist_ok=True)
+    log(f"Downloading model to {local_dir} with {max_workers} workers...")
+    bucket = get_bucket()
+    t0 = time.perf_counter()
+
+    errors = []
+    total_bytes = 0
+    cache_hits = 0
+    locks = {}
+    deferred = []
+
+    def release(name):
+        lock = locks.pop(name, None)
+        if lock is not None:
+            lock.release()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        range_futures = {}
+        pending_ranges = {}
+        files = {}
+        try:
+            for listed in list_bucket_files(prefix=prefix, use_cache=use_cache):
+                if listed.name.endswith("/"):
+                    continue
+                local_file = Path(local_dir) / listed.name
+                local_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = local_file.with_name(local_file.name + ".part")
+                blob = bucket.blob(listed.name, generation=listed.generation)
+                blob.crc32c = listed.crc32c
+                size = listed.size or 0
+                key = None
+
+                if artifact_cache is not None:
+                    key = artifact_cache.key(bucket.name, listed.name, listed.generation)
+                    lock = artifact_cache.lock(key)
+                    if not lock.acquire(blocking=False):
+                        # Another process is fetching this object; link it afterwards
+                        deferred.append((blob, local_file, key, size))
+                        continue
+                    if artifact_cache.link(key, local_file):
+                        lock.release()
+                        cache_hits += 1
+                        continue
+                    locks[listed.name] = lock
+                    tmp_path = artifact_cache.tmp_path(key)
+
+                with open(tmp_path, "wb") as f:
+                    f.truncate(size)
+                files[listed.name] = (blob, tmp_path, local_file, artifact_cache, key)
+                total_bytes += size
+
+                step = slice_size if size >= sliced_threshold else max(size, 1)
+                ranges = [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+                pending_ranges[listed.name] = len(ranges)
+                for start, end in ranges:
+                    future = pool.submit(_download_range, blob, tmp_path, start, end)
+                    range_futures[future] = listed.name
+
+            finalize_futures = {}
+            # Empty files have no ranges to fetch
+            for name, count in pending_ranges.items():
+                if count == 0:
+                    finalize_futures[pool.submit(_finalize_download, *files[name])] = name
+
+            failed = set()
+            for future in as_completed(range_futures):
+                name = range_futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    if isinstance(e, api_exceptions.NotFound):
+                        # The listed generation is gone; the cached listing is stale
+                        invalidate_listing_cache(bucket.name, name)
+                    if name not in failed:
+                        failed.add(name)
+                        errors.append(f"{name}: {e}")
+                        release(name)
+                    continue
+                pending_ranges[name] -= 1
+                if pending_ranges[name] == 0 and name not in failed:
+                    finalize_futures[pool.submit(_finalize_download, *files[name])] = name
+
+            for future in as_completed(finalize_futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(f"{finalize_futures[future]}: {e}")
+                release(finalize_futures[future])
+        finally:
+            for name in list(locks):
+                release(name)
+
+    for blob, local_file, key, size in deferred:
+        with artifact_cache.lock(key):
+            if artifact_cache.link(key, local_file):
+                cache_hits += 1
+                continue
+            # The other process failed; fetch the object ourselves
+            tmp_path = artifact_cache.tmp_path(key)
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.truncate(size)
+                if size:
+                    _download_range(blob, tmp_path, 0, size - 1)
+                _finalize_download(blob, tmp_path, local_file, artifact_cache, key)
+                total_bytes += size
+            except Exception as e:
+                errors.append(f"{blob.name}: {e}")
+
+    telemetry.record(
+        "gcs.download_model", time.perf_counter() - t0, nbytes=total_bytes,
+        error=f"{len(errors)} download(s) failed" if errors else None, cache_hits=cache_hits,
+    )
+    if errors:
+        for error in errors:
+            log(f"  ✗ {error}")
+        raise RuntimeError(f"{len(errors)} download(s) failed")
+    if artifact_cache is not None:
+        log(f"Linked {cache_hits} file(s) from the artifact cache")
+    log(f"✓ Model download complete! ({total_bytes / (1024 * 1024):.1f} MiB)")
     return local_dir
 
 
@@ -110,16 +548,21 @@ def upload_file(local_path: str, blob_name: str = None):
     if blob_name is None:
         blob_name = Path(local_path).name
     
+    bucket = get_bucket()
     blob = bucket.blob(blob_name)
-    blob.upload_from_filename(local_path)
-    print(f"✓ Uploaded {local_path} to {blob_name}")
+    with telemetry.span("gcs.upload", blob=blob_name) as span:
+        blob.upload_from_filename(local_path)
+        span.add_bytes(Path(local_path).stat().st_size)
+    invalidate_listing_cache(bucket.name, blob_name)
+    log(f"✓ Uploaded {local_path} to {blob_name}")
 
 
 def get_model_url(blob_name: str):
     """Get public URL for a file in bucket."""
+    bucket = get_bucket()
     blob = bucket.blob(blob_name)
     url = f"gs://{bucket.name}/{blob_name}"
-    print(f"Model URL: {url}")
+    log(f"Model URL: {url}")
     return url
 
 
@@ -127,10 +570,12 @@ if __name__ == "__main__":
     # Uncomment to create bucket if it doesn't exist
     # create_bucket(BUCKET_NAME)
     
+    bucket = get_bucket()
     if bucket.exists():
         print(f"Bucket: {bucket.name}\n")
         # List files
-        print(list_bucket_files())
+        for blob in list_bucket_files():
+            print(f"  - {blob.name} ({blob.size} bytes)")
     else:
         print(f"Bucket '{BUCKET_NAME}' does not exist. Use create_bucket() to create it.")
     
@@ -0,0 +1,8 @@
+# Makes the shared code in the repository root's common/ folder importable
+# when a script in this folder is run directly (cli.py already can import it).
+import os
+import sys
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.append(_ROOT)
@@ -1,15 +1,462 @@
 # Used to download models from huggingface
+#
+#   python hf.py                                      # load and save_pretrained locally
+#   python hf.py --stage gs://my-bucket/qwen2.5-3b-instruct
+#   python hf.py --snapshot Qwen/Qwen2.5-3B-Instruct Qwen/Qwen2.5-7B-Instruct --local-dir models --reshard 2GB
+#
+# --stage streams the raw repo files (safetensors shards, tokenizer, config)
+# from the Hub straight into GCS without building the model or keeping a
+# local copy. --snapshot downloads the raw files of one or more repos and can
+# split the weights into fixed-size safetensors shards.
 
-from transformers import AutoTokenizer, AutoModelForCausalLM
+import os
+import re
+import json
+import mmap
+import base64
+import struct
+import hashlib
+import argparse
+import fnmatch
+import time
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+import _common  # noqa: F401  (puts the repository root on sys.path)
+from common.config import require_env
+from common.storage_clients import STORAGE_POOL_SIZE, get_storage_client
+from common.telemetry import log, telemetry
 
-model_id = "Qwen/Qwen2.5-3B-Instruct"
-local_dir = "./qwen2.5-3b-instruct"
+load_dotenv()
 
-tokenizer = AutoTokenizer.from_pretrained(model_id)
-model = AutoModelForCausalLM.from_pretrained(
-    model_id,
-    torch_dtype="auto"
-)
+model_id = os.environ.get("HF_MODEL_ID", "Qwen/Qwen2.5-3B-Instruct")
+local_dir = os.environ.get("HF_LOCAL_DIR", "./qwen2.5-3b-instruct")
 
-tokenizer.save_pretrained(local_dir)
-model.save_pretrained(local_dir)
+PROJECT_ID = os.environ.get("PROJECT_ID")
+STAGE_WORKERS = int(os.environ.get("HF_STAGE_WORKERS", "4"))
+# Bytes buffered per file in flight; must be a multiple of 256 KiB for GCS
+STAGE_CHUNK_SIZE = int(os.environ.get("HF_STAGE_CHUNK_SIZE", str(16 * 1024 * 1024)))
+
+# Repo files needed to serve a model; other weight formats (.bin, .pth,
+# .gguf) and repo housekeeping files are skipped unless asked for
+DEFAULT_PATTERNS = ["*.safetensors", "*.safetensors.index.json", "*.json", "*.jinja", "*.txt", "*.model", "*.tiktoken"]
+
+# Object metadata recording which Hub file a blob was staged from
+SOURCE_SHA_KEY = "hf-source-sha"
+
+SNAPSHOT_WORKERS = int(os.environ.get("HF_SNAPSHOT_WORKERS", "8"))
+# Models downloaded at the same time by --snapshot
+SNAPSHOT_MODELS_AT_ONCE = int(os.environ.get("HF_SNAPSHOT_MODELS_AT_ONCE", "2"))
+# Tensors are copied between shards in blocks of this size
+COPY_BLOCK_SIZE = 64 * 1024 * 1024
+# Written after a --snapshot reshard so a rerun neither downloads the original
+# weights again nor reshards them; .cache/ is never uploaded by gcs.py
+RESHARD_MARKER = Path(".cache") / "reshard.json"
+
+
+def download_with_transformers(model_id: str = model_id, local_dir: str = local_dir):
+    """Load the model with transformers and save it locally (needs RAM for the whole model)."""
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = AutoModelForCausalLM.from_pretrained(
+        model_id,
+        torch_dtype="auto"
+    )
+
+    tokenizer.save_pretrained(local_dir)
+    model.save_pretrained(local_dir)
+
+
+def _file_digest(sibling):
+    """(hash name, expected hex digest) the Hub publishes for a repo file.
+
+    Large files are stored with Git LFS and carry a sha256 of the content;
+    small ones only have their git blob id, a sha1 over a git header and
+    the content.
+    """
+    lfs = sibling.lfs
+    if lfs:
+        sha256 = lfs["sha256"] if isinstance(lfs, dict) else lfs.sha256
+        return "sha256", sha256
+    return "git-sha1", sibling.blob_id
+
+
+def list_repo_files(model_id: str, revision: str = None, patterns: list = None):
+    """Return (commit sha, [sibling, ...]) for the repo files matching patterns."""
+    from huggingface_hub import HfApi
+
+    info = HfApi().model_info(model_id, revision=revision, files_metadata=True)
+    patterns = patterns or DEFAULT_PATTERNS
+    files = [s for s in info.siblings if any(fnmatch.fnmatch(s.rfilename, p) for p in patterns)]
+    return info.sha, files
+
+
+def _stage_file(bucket, model_id: str, revision: str, sibling, blob_name: str, chunk_size: int) -> int:
+    """Stream one Hub file into a GCS object, checking both checksums on the fly."""
+    import google_crc32c
+    import requests
+    from huggingface_hub import hf_hub_url
+    from huggingface_hub.utils import build_hf_headers
+
+    with telemetry.span("gcs.upload", blob=blob_name, source=f"{model_id}/{sibling.rfilename}") as span:
+        hash_name, expected = _file_digest(sibling)
+        blob = bucket.blob(blob_name)
+        blob.metadata = {SOURCE_SHA_KEY: expected, "hf-repo": model_id, "hf-revision": revision}
+
+        if hash_name == "sha256":
+            digest = hashlib.sha256()
+        else:
+            digest = hashlib.sha1(f"blob {sibling.size}\0".encode())
+        crc32c = google_crc32c.Checksum()
+        size = 0
+
+        url = hf_hub_url(model_id, sibling.rfilename, revision=revision)
+        with requests.get(url, headers=build_hf_headers(), stream=True, timeout=60) as resp:
+            resp.raise_for_status()
+            # The writer sends each chunk_size block as one resumable-upload request
+            with blob.open("wb", chunk_size=chunk_size, ignore_flush=True) as writer:
+                for block in resp.iter_content(chunk_size=1024 * 1024):
+                    digest.update(block)
+                    crc32c.update(block)
+                    writer.write(block)
+                    size += len(block)
+
+        blob.reload()
+        local_crc32c = base64.b64encode(crc32c.digest()).decode("utf-8")
+        if digest.hexdigest() != expected or blob.crc32c != local_crc32c:
+            blob.delete()
+            raise ValueError(
+                f"Checksum mismatch for {sibling.rfilename}: "
+                f"{hash_name} {digest.hexdigest()} (expected {expected}), "
+                f"crc32c {blob.crc32c} in GCS (expected {local_crc32c})"
+            )
+        span.add_bytes(size)
+    return size
+
+
+def stage_to_gcs(
+    destination: str,
+    model_id: str = model_id,
+    revision: str = None,
+    patterns: list = None,
+    max_workers: int = STAGE_WORKERS,
+    chunk_size: int = STAGE_CHUNK_SIZE,
+):
+    """Copy a Hub model repo to gs://bucket/prefix without loading the model.
+
+    Files are streamed from the Hub into resumable GCS uploads, one
+    chunk_size block at a time, so memory stays at roughly
+    max_workers * chunk_size and no local disk is used. Each file is
+    verified against the Hub's sha256 (or git blob id) and against the
+    CRC32C GCS computed. All files come from one commit; files already
+    staged from the same content are skipped, so a rerun resumes.
+    """
+    require_env("GOOGLE_APPLICATION_CREDENTIALS", "PROJECT_ID")
+    bucket_name, _, prefix = destination[len("gs://"):].partition("/")
+    # One pooled connection per worker at least, shared with the other GCS scripts
+    client = get_storage_client(PROJECT_ID, pool_size=max(max_workers, STORAGE_POOL_SIZE))
+    bucket = client.bucket(bucket_name)
+    revision, files = list_repo_files(model_id, revision, patterns)
+    log(f"Staging {len(files)} file(s) of {model_id}@{revision[:10]} to gs://{bucket_name}/{prefix}")
+
+    with telemetry.span("gcs.list", prefix=f"{prefix}/" if prefix else "") as span:
+        existing = {
+            blob.name: blob
+            for blob in bucket.client.list_blobs(bucket_name, prefix=f"{prefix}/" if prefix else None)
+        }
+        span.set(items=len(existing))
+    start = time.perf_counter()
+    staged_bytes = skipped = 0
+    errors = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for sibling in files:
+            blob_name = f"{prefix}/{sibling.rfilename}" if prefix else sibling.rfilename
+            remote = existing.get(blob_name)
+            if remote is not None and (remote.metadata or {}).get(SOURCE_SHA_KEY) == _file_digest(sibling)[1]:
+                skipped += 1
+                continue
+            future = pool.submit(_stage_file, bucket, model_id, revision, sibling, blob_name, chunk_size)
+            futures[future] = sibling.rfilename
+
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                size = future.result()
+                staged_bytes += size
+                log(f"  ✓ Staged {name} ({size / 1024 ** 2:.1f} MiB)")
+            except Exception as e:
+                errors.append(f"{name}: {e}")
+                log(f"  ✗ Failed to stage {name}: {e}")
+
+    elapsed = time.perf_counter() - start
+    telemetry.record(
+        "gcs.stage_model", elapsed, nbytes=staged_bytes, error=f"{len(errors)} file(s) failed" if errors else None,
+        model=model_id, files=len(futures), skipped=skipped,
+    )
+    log(
+        f"✓ Staged {staged_bytes / 1024 ** 3:.2f} GiB in {elapsed:.1f}s "
+        f"({staged_bytes / 1024 ** 2 / max(elapsed, 1e-9):.1f} MiB/s), {skipped} file(s) already staged"
+    )
+    if errors:
+        raise RuntimeError(f"{len(errors)} file(s) failed to stage: {errors}")
+
+
+def parse_size(size) -> int:
+    """Parse "5GB", "500MB", "2GiB" or a plain byte count."""
+    if isinstance(size, int):
+        return size
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?)(i?)B?\s*", str(size), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size '{size}'")
+    number, unit, binary = match.groups()
+    base = 1024 if binary else 1000
+    return int(float(number) * base ** " KMGT".index(unit.upper() or " "))
+
+
+def read_safetensors_header(path: Path):
+    """Return (header dict, byte offset where tensor data starts) of a safetensors file."""
+    with open(path, "rb") as f:
+        (header_size,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_size))
+    return header, 8 + header_size
+
+
+def _write_shard(path: Path, tensors: list, metadata: dict, sources: dict):
+    """Write (name, info, source path, data start) tensors as one safetensors file.
+
+    Tensor bytes are copied from the memory-mapped source files in blocks,
+    so no tensor is ever loaded whole.
+    """
+    header = {"__metadata__": metadata} if metadata else {}
+    offset = 0
+    for name, info, _, _ in tensors:
+        start, end = info["data_offsets"]
+        header[name] = {"dtype": info["dtype"], "shape": info["shape"], "data_offsets": [offset, offset + end - start]}
+        offset += end - start
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    # Pad the header so tensor data starts 8-byte aligned, as the format recommends
+    header_bytes += b" " * (-len(header_bytes) % 8)
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for _, info, source, data_start in tensors:
+            start, end = info["data_offsets"]
+            view = sources[source]
+            for block in range(data_start + start, data_start + end, COPY_BLOCK_SIZE):
+                f.write(view[block:min(block + COPY_BLOCK_SIZE, data_start + end)])
+    os.replace(tmp_path, path)
+
+
+def reshard_safetensors(model_dir: str, max_shard_size="5GB", force: bool = False) -> bool:
+    """Rewrite a model's safetensors weights as shards of at most max_shard_size.
+
+    Writes model-00001-of-0000N.safetensors files and a
+    model.safetensors.index.json weight map (the layout transformers and
+    vLLM load), then removes the old weight files. Reads go through mmap,
+    so memory use does not depend on model size; the new shards need free
+    disk space equal to the weights. A tensor larger than max_shard_size
+    gets a shard of its own. Returns False when the weights already fit
+    (unless force=True).
+    """
+    model_dir = Path(model_dir)
+    max_bytes = parse_size(max_shard_size)
+    sources = sorted(model_dir.glob("*.safetensors"))
+    index_path = model_dir / "model.safetensors.index.json"
+    if index_path.exists():
+        # Only the files the index lists hold the model. Others are left over,
+        # e.g. the original single file a rerun of snapshot_download fetched
+        # again after an earlier reshard, and would otherwise be read twice.
+        with open(index_path) as f:
+            listed = set(json.load(f)["weight_map"].values())
+        missing = sorted(name for name in listed if not (model_dir / name).exists())
+        if missing:
+            raise FileNotFoundError(f"{index_path} lists missing file(s): {', '.join(missing)}")
+        for stray in [p for p in sources if p.name not in listed]:
+            stray.unlink()
+            log(f"  Removed {stray.name} (not in {index_path.name})")
+        sources = sorted(model_dir / name for name in listed)
+    if not sources:
+        log(f"✗ No safetensors files in {model_dir}")
+        return False
+    if not force and all(p.stat().st_size <= max_bytes for p in sources) and (len(sources) == 1 or index_path.exists()):
+        log(f"✓ {model_dir.name}: weights already in shards of at most {max_shard_size}")
+        return False
+
+    tensors, metadata = [], {}
+    for source in sources:
+        header, data_start = read_safetensors_header(source)
+        metadata.update(header.pop("__metadata__", None) or {})
+        for name, info in sorted(header.items(), key=lambda item: item[1]["data_offsets"][0]):
+            tensors.append((name, info, source, data_start))
+
+    shards, current, current_size = [], [], 0
+    for tensor in tensors:
+        start, end = tensor[1]["data_offsets"]
+        if current and current_size + (end - start) > max_bytes:
+            shards.append(current)
+            current, current_size = [], 0
+        current.append(tensor)
+        current_size += end - start
+    if current:
+        shards.append(current)
+
+    # Shard names never collide with the files being read from
+    names = [f"model-{i + 1:05d}-of-{len(shards):05d}.safetensors" for i in range(len(shards))]
+    if any(model_dir / name in sources for name in names):
+        names = [f"model-resharded-{i + 1:05d}-of-{len(shards):05d}.safetensors" for i in range(len(shards))]
+
+    files, views = [], {}
+    try:
+        for source in sources:
+            f = open(source, "rb")
+            files.append(f)
+            views[source] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        weight_map = {}
+        for name, shard in zip(names, shards):
+            _write_shard(model_dir / name, shard, metadata, views)
+            weight_map.update({tensor[0]: name for tensor in shard})
+    finally:
+        for view in views.values():
+            view.close()
+        for f in files:
+            f.close()
+
+    total_size = sum(info["data_offsets"][1] - info["data_offsets"][0] for _, info, _, _ in tensors)
+    index = {"metadata": {"total_size": total_size}, "weight_map": weight_map}
+    with open(index_path, "w") as f:
+        json.dump(index, f, indent=2)
+    for source in sources:
+        if source.name not in names:
+            source.unlink()
+
+    log(f"✓ {model_dir.name}: resharded {len(sources)} file(s) into {len(shards)} shard(s) of at most {max_shard_size}")
+    return True
+
+
+def download_snapshot(
+    model_id: str = model_id,
+    local_dir: str = local_dir,
+    revision: str = None,
+    patterns: list = None,
+    max_workers: int = SNAPSHOT_WORKERS,
+) -> str:
+    """Download the raw repo files (no model loading), several files at once.
+
+    An interrupted download resumes: files already complete are kept and
+    partial files continue from where they stopped.
+    """
+    from huggingface_hub import snapshot_download
+
+    return snapshot_download(
+        model_id,
+        revision=revision,
+        local_dir=local_dir,
+        allow_patterns=patterns or DEFAULT_PATTERNS,
+        max_workers=max_workers,
+    )
+
+
+def _reshard_done(model_dir: Path, revision: str, max_bytes: int) -> bool:
+    """Whether model_dir already holds this revision resharded to max_bytes."""
+    try:
+        with open(model_dir / RESHARD_MARKER) as f:
+            marker = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return False
+    return (
+        marker.get("revision") == (revision or "main")
+        and marker.get("max_shard_size") == max_bytes
+        and all((model_dir / name).exists() for name in marker.get("files", []))
+    )
+
+
+def _write_reshard_marker(model_dir: Path, revision: str, max_bytes: int):
+    index_path = model_dir / "model.safetensors.index.json"
+    files = [index_path.name]
+    if index_path.exists():
+        with open(index_path) as f:
+            files += sorted(set(json.load(f)["weight_map"].values()))
+    marker_path = model_dir / RESHARD_MARKER
+    marker_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(marker_path, "w") as f:
+        json.dump({"revision": revision or "main", "max_shard_size": max_bytes, "files": files}, f, indent=2)
+
+
+def stage_snapshots(
+    model_ids: list,
+    local_root: str = ".",
+    reshard_size=None,
+    revision: str = None,
+    patterns: list = None,
+    models_at_once: int = SNAPSHOT_MODELS_AT_ONCE,
+) -> list:
+    """Download (and optionally reshard) many models as one batch.
+
+    Each model goes to local_root/<repo name, lowercased>, the folder
+    layout gcs.py uploads. Returns one {"model_id", "local_dir", "resharded",
+    "seconds", "error"} dict per model; a failed model does not stop the
+    others. A model already resharded to the same size from the same
+    revision is skipped, since downloading it again would fetch the
+    original weight files the reshard replaced.
+    """
+    def stage(repo_id):
+        target = Path(local_root) / repo_id.split("/")[-1].lower()
+        start = time.perf_counter()
+        result = {"model_id": repo_id, "local_dir": str(target), "resharded": False, "seconds": 0.0, "error": None}
+        try:
+            if reshard_size and _reshard_done(target, revision, parse_size(reshard_size)):
+                log(f"  ✓ {repo_id} already downloaded and resharded in {target}")
+                result["resharded"] = True
+                result["seconds"] = time.perf_counter() - start
+                return result
+            with telemetry.span("hf.download_snapshot", model=repo_id):
+                download_snapshot(repo_id, str(target), revision, patterns)
+            log(f"  ✓ Downloaded {repo_id} to {target}")
+            if reshard_size:
+                with telemetry.span("hf.reshard", model=repo_id, max_shard_size=str(reshard_size)):
+                    result["resharded"] = reshard_safetensors(target, reshard_size)
+                if result["resharded"]:
+                    _write_reshard_marker(target, revision, parse_size(reshard_size))
+        except Exception as e:
+            result["error"] = str(e)
+            log(f"  ✗ Failed to stage {repo_id}: {e}")
+        result["seconds"] = time.perf_counter() - start
+        return result
+
+    log(f"Staging {len(model_ids)} model(s) into {local_root}...")
+    with ThreadPoolExecutor(max_workers=models_at_once) as pool:
+        results = list(pool.map(stage, model_ids))
+    failed = sum(1 for r in results if r["error"])
+    log(f"✓ Staged {len(results) - failed} model(s), {failed} failed")
+    return results
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Download a model from the Hugging Face Hub")
+    parser.add_argument("--model-id", default=model_id)
+    parser.add_argument("--local-dir", default=local_dir)
+    parser.add_argument("--stage", metavar="GS_URI", help="stream the repo files to gs://bucket/prefix instead")
+    parser.add_argument("--revision", help="branch, tag or commit to stage (default: main)")
+    parser.add_argument("--include", nargs="*", help="file patterns to stage (default: safetensors, tokenizer, config)")
+    parser.add_argument("--snapshot", nargs="+", metavar="MODEL_ID", help="download the raw files of these repos into --local-dir")
+    parser.add_argument("--reshard", metavar="SIZE", help="with --snapshot, split weights into shards of at most SIZE (e.g. 2GB)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    if args.snapshot:
+        stage_snapshots(args.snapshot, args.local_dir, args.reshard, args.revision, args.include)
+    elif args.stage:
+        stage_to_gcs(args.stage, args.model_id, args.revision, args.include)
+    else:
+        download_with_transformers(args.model_id, args.local_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import json
+
+# Vertex AI rejects online prediction requests larger than 1.5 MB
+MAX_PAYLOAD_BYTES = 1_500_000
+
+
+def build_chat_instance(
+    messages: list,
+    max_tokens: int = 512,
+    temperature: float = 0.2,
+    top_p: float = 0.9
+):
+    """Build one instance in the chatCompletions request format."""
+    return {
+        "@requestFormat": "chatCompletions",
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "top_p": top_p
+    }
+
+
+def as_messages(item):
+    """Turn a plain prompt into a single user message; pass conversations through."""
+    if isinstance(item, str):
+        return [{"role": "user", "content": item}]
+    return item
+
+
+def extract_content(prediction):
+    """Return the message content of one prediction, or None if it has none.
+
+    The serving containers wrap each prediction in a list, so the
+    content lives at prediction[0]['message']['content'].
+    """
+    result = prediction
+    if isinstance(result, list) and len(result) > 0:
+        result = result[0]
+    if isinstance(result, dict) and 'message' in result:
+        return result['message'].get('content', '')
+    return None
+
+
+def instance_size(instance: dict) -> int:
+    """Size in bytes that an instance adds to the JSON request body."""
+    return len(json.dumps(instance, separators=(",", ":")).encode("utf-8"))
+
+
+def stream_delta(event: dict):
+    """Return the text delta carried by one streamed event, or None.
+
+    vLLM sends OpenAI-style chunks (choices[0].delta.content); TGI's native
+    stream sends {"token": {"text": ...}}.
+    """
+    choices = event.get("choices")
+    if choices:
+        choice = choices[0]
+        delta = choice.get("delta") or choice.get("message") or {}
+        if isinstance(delta, dict):
+            return delta.get("content")
+        return choice.get("text")
+    token = event.get("token")
+    if isinstance(token, dict) and not token.get("special"):
+        return token.get("text")
+    return None
+
+
+class StreamParser:
+    """Incremental parser for server-sent events from streamRawPredict.
+
+    feed() takes raw bytes as they arrive, which may end in the middle of
+    a line or even of a UTF-8 character, and returns the text deltas of
+    every event completed so far. Lines without a "data:" prefix are
+    parsed as bare JSON, since some containers stream JSON lines instead.
+    """
+
+    def __init__(self):
+        self._buffer = b""
+        self._data_lines = []
+        self.done = False
+
+    def feed(self, chunk: bytes) -> list:
+        self._buffer += chunk
+        deltas = []
+        while not self.done:
+            newline = self._buffer.find(b"\n")
+            if newline < 0:
+                break
+            line = self._buffer[:newline].rstrip(b"\r").decode("utf-8")
+            self._buffer = self._buffer[newline + 1:]
+            deltas.extend(self._handle_line(line))
+        return deltas
+
+    def close(self) -> list:
+        """Flush an event left unterminated when the stream ended."""
+        deltas = []
+        if self._buffer and not self.done:
+            deltas.extend(self._handle_line(self._buffer.decode("utf-8")))
+        self._buffer = b""
+        deltas.extend(self._dispatch())
+        return deltas
+
+    def _handle_line(self, line: str) -> list:
+        if not line:
+            # A blank line ends the current event
+            return self._dispatch()
+        if line.startswith(":"):
+            return []
+        if line.startswith("data:"):
+            self._data_lines.append(line[5:].lstrip())
+            return []
+        if line.startswith(("event:", "id:", "retry:")):
+            return []
+        self._data_lines.append(line)
+        return self._dispatch()
+
+    def _dispatch(self) -> list:
+        if not self._data_lines:
+            return []
+        data = "\n".join(self._data_lines)
+        self._data_lines = []
+        if data.strip() == "[DONE]":
+            self.done = True
+            return []
+        event = json.loads(data)
+        # Vertex may wrap each chunk in a one-element list
+        if isinstance(event, list):
+            event = event[0] if event else {}
+        delta = stream_delta(event)
+        return [delta] if delta else []
@@ -0,0 +1,272 @@
+import os
+import time
+import random
+import threading
+from google.api_core import exceptions as api_exceptions
+from chat_payload import as_messages, build_chat_instance, extract_content
+from resilience import is_retryable, metrics
+import _common  # noqa: F401  (puts the repository root on sys.path)
+from common.telemetry import log, note_retry, telemetry
+from vertex_clients import init_vertex
+from vertex_inference_online import ENDPOINT_DISPLAY_NAME, LOCATION, PROJECT_ID, PREDICT_DEADLINE, _is_not_found
+
+# Endpoints to spread requests over: "display_name[@location][:weight]", comma separated,
+# e.g. "llama-deploy@us-central1:3,llama-deploy@europe-west4:1"
+ENDPOINT_POOL = os.environ.get("ENDPOINT_POOL", "")
+# "least_outstanding" or "ewma" (latency-weighted)
+ROUTER_POLICY = os.environ.get("ROUTER_POLICY", "least_outstanding")
+ROUTER_EJECT_AFTER = int(os.environ.get("ROUTER_EJECT_AFTER", "3"))
+ROUTER_EJECT_TIME = float(os.environ.get("ROUTER_EJECT_TIME", "30"))
+ROUTER_MAX_EJECT_TIME = float(os.environ.get("ROUTER_MAX_EJECT_TIME", "300"))
+
+EWMA_ALPHA = 0.3
+
+
+def _is_endpoint_failure(error: Exception) -> bool:
+    """Errors that say something about the endpoint's health, not the request."""
+    return (
+        is_retryable(error)
+        or _is_not_found(error)
+        or isinstance(error, (api_exceptions.DeadlineExceeded, api_exceptions.InternalServerError, ConnectionError))
+    )
+
+
+class EndpointTarget:
+    """One endpoint in the pool, with its routing state."""
+
+    def __init__(self, display_name: str, location: str = LOCATION, weight: float = 1.0, project: str = PROJECT_ID):
+        self.display_name = display_name
+        self.location = location
+        self.weight = weight
+        self.project = project
+        self.endpoint = None
+        self.outstanding = 0
+        self.ewma_latency = None
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.probing = False
+
+    @property
+    def name(self) -> str:
+        return f"{self.display_name}@{self.location}"
+
+    def resolve(self):
+        """Look the endpoint up in its own region (once, until it is invalidated)."""
+        if self.endpoint is None:
+            init_vertex(PROJECT_ID, LOCATION)
+            from google.cloud import aiplatform
+            endpoints = aiplatform.Endpoint.list(
+                filter=f'display_name="{self.display_name}"',
+                project=self.project,
+                location=self.location,
+            )
+            if not endpoints:
+                raise api_exceptions.NotFound(f"Endpoint '{self.name}' not found")
+            self.endpoint = endpoints[0]
+        return self.endpoint
+
+    def __repr__(self):
+        return f"EndpointTarget({self.name!r}, weight={self.weight})"
+
+
+def parse_pool(spec: str) -> list:
+    """Parse an ENDPOINT_POOL string into EndpointTargets."""
+    targets = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, weight = item.partition(":")
+        display_name, _, location = name.partition("@")
+        targets.append(EndpointTarget(display_name, location or LOCATION, float(weight or 1)))
+    return targets
+
+
+class EndpointRouter:
+    """Client-side load balancer over endpoints in one or more regions.
+
+    Each request picks two endpoints at random in proportion to their
+    weights and sends to the less loaded one: fewer requests in flight
+    ("least_outstanding"), or lower latency EWMA times requests in flight
+    ("ewma"). Weights therefore set each endpoint's share of traffic when
+    the pool is idle (e.g. weight 0.05 for a canary) while load still
+    steers requests away from slow or busy endpoints.
+
+    After ``eject_after`` consecutive failures (quota, unavailable,
+    timeout, not found) an endpoint is ejected for ``eject_time``
+    seconds, doubling on each repeated ejection up to ``max_eject_time``.
+    When that time is up one probe request is let through: success puts
+    the endpoint back, failure ejects it again. A request that fails on
+    one endpoint is retried on another.
+    """
+
+    def __init__(
+        self,
+        targets: list,
+        policy: str = ROUTER_POLICY,
+        eject_after: int = ROUTER_EJECT_AFTER,
+        eject_time: float = ROUTER_EJECT_TIME,
+        max_eject_time: float = ROUTER_MAX_EJECT_TIME,
+    ):
+        if not targets:
+            raise ValueError("EndpointRouter needs at least one endpoint")
+        if policy not in ("least_outstanding", "ewma"):
+            raise ValueError(f"Unknown routing policy '{policy}'")
+        self.targets = list(targets)
+        self.policy = policy
+        self.eject_after = eject_after
+        self.eject_time = eject_time
+        self.max_eject_time = max_eject_time
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, spec: str = ENDPOINT_POOL, **kwargs):
+        return cls(parse_pool(spec), **kwargs)
+
+    def _score(self, target: EndpointTarget) -> float:
+        if self.policy == "ewma":
+            # Unmeasured endpoints look fast so they get traffic and a measurement
+            return (target.ewma_latency or 0.0) * (target.outstanding + 1)
+        return target.outstanding
+
+    def _available(self, now: float, exclude: set) -> list:
+        available = []
+        for target in self.targets:
+            if target in exclude or target.weight <= 0:
+                continue
+            if target.ejected_until <= now and not target.probing:
+                available.append(target)
+        return available
+
+    def pick(self, exclude: set = ()) -> EndpointTarget:
+        """Choose the endpoint for the next request and count it as in flight."""
+        with self._lock:
+            now = time.monotonic()
+            candidates = self._available(now, exclude)
+            if not candidates:
+                # Everything is ejected: fail open to the one that comes back first,
+                # keeping drained (weight 0) endpoints out unless nothing else is left
+                rest = (
+                    [t for t in self.targets if t not in exclude and t.weight > 0]
+                    or [t for t in self.targets if t not in exclude]
+                    or self.targets
+                )
+                candidates = [min(rest, key=lambda t: t.ejected_until)]
+
+            first = random.choices(candidates, weights=[t.weight or 1e-9 for t in candidates])[0]
+            others = [t for t in candidates if t is not first]
+            chosen = first
+            if others:
+                second = random.choices(others, weights=[t.weight or 1e-9 for t in others])[0]
+                if self._score(second) < self._score(first):
+                    chosen = second
+
+            if chosen.ejected_until and chosen.ejected_until <= now:
+                chosen.probing = True
+            chosen.outstanding += 1
+            return chosen
+
+    def release(self, target: EndpointTarget, latency: float = None, error: Exception = None):
+        """Record the outcome of a request sent to target."""
+        with self._lock:
+            target.outstanding -= 1
+            if error is None or not _is_endpoint_failure(error):
+                if latency is not None and error is None:
+                    if target.ewma_latency is None:
+                        target.ewma_latency = latency
+                    else:
+                        target.ewma_latency += EWMA_ALPHA * (latency - target.ewma_latency)
+                if target.probing or target.ejected_until:
+                    log(f"✓ Endpoint {target.name} is healthy again")
+                target.consecutive_failures = 0
+                target.ejections = 0
+                target.ejected_until = 0.0
+                target.probing = False
+                return
+
+            target.consecutive_failures += 1
+            if target.probing or target.consecutive_failures >= self.eject_after:
+                target.ejections += 1
+                duration = min(self.max_eject_time, self.eject_time * 2 ** (target.ejections - 1))
+                target.ejected_until = time.monotonic() + duration
+                target.probing = False
+                metrics.incr("router_ejections")
+                log(f"✗ Ejecting endpoint {target.name} for {duration:.0f}s: {error}")
+
+    def predict(self, instances: list, deadline: float = PREDICT_DEADLINE):
+        """Send instances to one endpoint of the pool, failing over to others.
+
+        Each endpoint is tried at most once. Errors that are the request's
+        fault (e.g. InvalidArgument) are raised without failing over.
+        """
+        with telemetry.span("vertex.router_predict", instances=len(instances)) as span:
+            give_up = None if deadline is None else time.monotonic() + deadline
+            tried = set()
+            last_error = None
+            while len(tried) < len(self.targets):
+                timeout = None if give_up is None else give_up - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                target = self.pick(exclude=tried)
+                tried.add(target)
+                start = time.monotonic()
+                try:
+                    response = target.resolve().predict(instances=instances, timeout=timeout)
+                except Exception as e:
+                    self.release(target, error=e)
+                    if _is_not_found(e):
+                        target.endpoint = None
+                    if not _is_endpoint_failure(e):
+                        raise
+                    last_error = e
+                    metrics.incr("router_failovers")
+                    note_retry()
+                    continue
+                self.release(target, latency=time.monotonic() - start)
+                span.set(endpoint=target.name)
+                return response
+
+            if last_error is not None:
+                raise last_error
+            raise api_exceptions.DeadlineExceeded(f"Deadline of {deadline}s exceeded")
+
+    def chat_completion(
+        self,
+        messages,
+        max_tokens: int = 512,
+        temperature: float = 0.2,
+        top_p: float = 0.9,
+        deadline: float = PREDICT_DEADLINE,
+    ):
+        """Send one prompt or conversation through the pool and return the reply content."""
+        instance = build_chat_instance(as_messages(messages), max_tokens, temperature, top_p)
+        response = self.predict([instance], deadline=deadline)
+        predictions = list(response.predictions or [])
+        if not predictions:
+            return None
+        content = extract_content(predictions[0])
+        return content if content is not None else str(predictions)
+
+    def status(self) -> list:
+        """Routing state of every endpoint, for logging or a health page."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "endpoint": t.name,
+                    "weight": t.weight,
+                    "outstanding": t.outstanding,
+                    "ewma_latency_s": t.ewma_latency,
+                    "ejected_for_s": max(0.0, t.ejected_until - now),
+                }
+                for t in self.targets
+            ]
+
+
+if __name__ == "__main__":
+    if ENDPOINT_POOL:
+        router = EndpointRouter.from_env()
+    else:
+        router = EndpointRouter([EndpointTarget(ENDPOINT_DISPLAY_NAME)])
+    for prompt in ["What is machine learning?", "What is a neural network?"]:
+        print(router.chat_completion(prompt, max_tokens=100))
+    for row in router.status():
+        print(row)
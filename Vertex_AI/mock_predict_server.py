@@ -0,0 +1,128 @@
+# Local stand-in for a Vertex AI endpoint, used to exercise the inference
+# clients offline. It answers chatCompletions instances with a canned reply.
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockPredictServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 overflows under concurrent benchmarks;
+    # dropped SYNs are retried after 1 s, which would show up as client latency
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class MockPredictHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without this, delayed ACKs add ~40 ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_POST(self):
+        # latency and error_rate are set on the server by start_mock_server()
+        server = self.server
+        try:
+            body = self._read_json()
+        except ValueError:
+            self._send_json(400, {"error": {"code": 400, "message": "Invalid JSON"}})
+            return
+
+        if server.latency:
+            time.sleep(server.latency)
+        if server.error_rate and random.random() < server.error_rate:
+            self._send_json(503, {"error": {"code": 503, "message": "Mock endpoint unavailable"}})
+            return
+
+        if self.path.endswith(":predict"):
+            instances = body.get("instances", [])
+            predictions = [[_mock_choice(instance)] for instance in instances]
+            self._send_json(200, {"predictions": predictions, "deployedModelId": "mock"})
+        elif self.path.endswith(":streamRawPredict"):
+            self._stream_chat(body)
+        else:
+            self._send_json(404, {"error": {"code": 404, "message": f"Unknown route {self.path}"}})
+
+    def _stream_chat(self, body: dict):
+        """Stream the mock answer word by word as OpenAI-style SSE chunks."""
+        # token_interval is set on the server by start_mock_server()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        words = _mock_choice(body)["message"]["content"].split(" ")
+        for i, word in enumerate(words):
+            chunk = {"choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}}]}
+            frame = f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+            # Split each frame across two writes so clients see partial frames
+            middle = len(frame) // 2
+            self.wfile.write(frame[:middle])
+            self.wfile.flush()
+            self.wfile.write(frame[middle:])
+            self.wfile.flush()
+            if self.server.token_interval:
+                time.sleep(self.server.token_interval)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def _mock_choice(instance: dict):
+    messages = instance.get("messages") or [{"content": ""}]
+    prompt = messages[-1].get("content", "")
+    return {
+        "index": 0,
+        "message": {"role": "assistant", "content": f"Mock answer to: {prompt}"},
+        "finish_reason": "stop",
+    }
+
+
+def start_mock_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    token_interval: float = 0.0,
+):
+    """Start the mock server on a background thread.
+
+    Returns (server, api_base); pass api_base to the inference clients and
+    call server.shutdown() when done. port=0 picks a free port.
+    """
+    server = MockPredictServer((host, port), MockPredictHandler)
+    server.latency = latency
+    server.error_rate = error_rate
+    server.token_interval = token_interval
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    api_base = f"http://{host}:{server.server_address[1]}"
+    return server, api_base
+
+
+if __name__ == "__main__":
+    server = MockPredictServer(("127.0.0.1", 8080), MockPredictHandler)
+    server.latency = 0.05
+    server.error_rate = 0.0
+    server.token_interval = 0.02
+    print("Mock predict server listening on http://127.0.0.1:8080")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
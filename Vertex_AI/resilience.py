@@ -0,0 +1,274 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from google.api_core import exceptions as api_exceptions
+import _common  # noqa: F401  (puts the repository root on sys.path)
+from common.telemetry import note_retry
+
+RETRY_MAX_ATTEMPTS = int(os.environ.get("RETRY_MAX_ATTEMPTS", "5"))
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", "20"))
+# Client-side request rate limit (requests/second); 0 disables the limiter
+PREDICT_RATE_LIMIT = float(os.environ.get("PREDICT_RATE_LIMIT", "0"))
+# Delay before a hedged request when too few latencies have been recorded
+HEDGE_DEFAULT_DELAY = float(os.environ.get("HEDGE_DEFAULT_DELAY", "2"))
+# Starting size of the hedge thread pool; it grows with the number of calls in flight
+HEDGE_WORKERS = int(os.environ.get("HEDGE_WORKERS", "16"))
+
+# Quota (429) and overload (503) errors are worth retrying; anything else
+# (bad request, not found, permission) fails the same way on every attempt
+THROTTLE_ERRORS = (api_exceptions.TooManyRequests, api_exceptions.ResourceExhausted)
+RETRYABLE_ERRORS = THROTTLE_ERRORS + (api_exceptions.ServiceUnavailable,)
+
+
+def is_throttled(error: Exception) -> bool:
+    return isinstance(error, THROTTLE_ERRORS) or getattr(error, "code", None) == 429
+
+
+def is_retryable(error: Exception) -> bool:
+    return isinstance(error, RETRYABLE_ERRORS) or getattr(error, "code", None) in (429, 503)
+
+
+class Metrics:
+    """Thread-safe named counters (retries, hedges, throttles, ...)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def incr(self, name: str, count: int = 1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + count
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+metrics = Metrics()
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose rate adapts to quota errors (AIMD).
+
+    Each request takes one token; tokens refill at ``rate`` per second up to
+    ``burst``. A throttling error halves the rate (at most once per
+    ``cooldown`` seconds, so one burst of 429s counts once), and every
+    success raises it by ``increase`` again, up to ``max_rate``.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        max_rate: float = None,
+        min_rate: float = 0.1,
+        burst: float = None,
+        increase: float = 0.1,
+        cooldown: float = 1.0,
+    ):
+        self.rate = rate
+        self.max_rate = max_rate or rate
+        self.min_rate = min_rate
+        self.burst = burst or max(1.0, rate)
+        self.increase = increase
+        self.cooldown = cooldown
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: float = None):
+        """Take one token, waiting for it; DeadlineExceeded if it takes longer than timeout."""
+        give_up = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            if give_up is not None and now + wait_time > give_up:
+                raise api_exceptions.DeadlineExceeded("Deadline exceeded waiting for the rate limiter")
+            metrics.incr("rate_limited_waits")
+            time.sleep(wait_time)
+
+    def try_acquire(self) -> bool:
+        """Take one token if one is available now; never waits."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self._last_decrease = now
+
+
+class LatencyTracker:
+    """Sliding window of recent request latencies for percentile estimates."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentile(self, p: float):
+        """Latency at percentile p, or None until min_samples are recorded."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+_hedge_executor = None
+_hedge_workers = 0
+_hedge_in_flight = 0
+_hedge_lock = threading.Lock()
+
+
+def _enter_hedged_call() -> ThreadPoolExecutor:
+    """Count one more call in flight and return a pool big enough for all of them.
+
+    Each call needs up to two threads (primary and hedge), plus headroom for
+    losers still finishing in the background. A pool that has become too
+    small is replaced by a larger one. Calls already using the old pool
+    keep it alive; once they finish it is garbage collected and its idle
+    threads exit.
+    """
+    global _hedge_executor, _hedge_workers, _hedge_in_flight
+    with _hedge_lock:
+        _hedge_in_flight += 1
+        needed = 2 * _hedge_in_flight
+        if _hedge_executor is None or needed > _hedge_workers:
+            _hedge_workers = max(HEDGE_WORKERS, 2 * needed)
+            _hedge_executor = ThreadPoolExecutor(max_workers=_hedge_workers, thread_name_prefix="hedge")
+        return _hedge_executor
+
+
+def _exit_hedged_call():
+    global _hedge_in_flight
+    with _hedge_lock:
+        _hedge_in_flight -= 1
+
+
+def hedged_call(fn, delay: float, limiter: AdaptiveRateLimiter = None):
+    """Call fn, and call it a second time if the first has not answered after delay.
+
+    The delay counts from when the first call starts running, not from when
+    it was queued. With a limiter, the second call needs a token of its own
+    and is skipped when none is available right away. Returns the first
+    successful result. The slower call cannot be interrupted and finishes
+    in the background; its result is discarded. Only use this for
+    idempotent calls.
+    """
+    executor = _enter_hedged_call()
+    try:
+        started = threading.Event()
+
+        def run_primary():
+            started.set()
+            return fn()
+
+        primary = executor.submit(run_primary)
+        started.wait()
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        if limiter is not None and not limiter.try_acquire():
+            metrics.incr("hedges_rate_limited")
+            return primary.result()
+
+        metrics.incr("hedges")
+        hedge = executor.submit(fn)
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        metrics.incr("hedge_wins")
+                    return future.result()
+                first_error = first_error or future.exception()
+        raise first_error
+    finally:
+        _exit_hedged_call()
+
+
+def call_with_retry(
+    fn,
+    deadline: float = None,
+    max_attempts: int = RETRY_MAX_ATTEMPTS,
+    base_delay: float = RETRY_BASE_DELAY,
+    max_delay: float = RETRY_MAX_DELAY,
+    limiter: AdaptiveRateLimiter = None,
+):
+    """Call fn(timeout) with exponential backoff and full jitter on 429/503.
+
+    ``deadline`` is the total time budget in seconds for all attempts,
+    including waits for the rate limiter and between retries; each attempt
+    gets the remaining budget as its timeout (None means no deadline). A
+    retry that cannot start before the deadline is not attempted, and the
+    last error is raised instead.
+    """
+    give_up = None if deadline is None else time.monotonic() + deadline
+    attempt = 0
+    while True:
+        remaining = None if give_up is None else give_up - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            metrics.incr("deadline_exceeded")
+            raise api_exceptions.DeadlineExceeded(f"Deadline of {deadline}s exceeded")
+        if limiter is not None:
+            limiter.acquire(remaining)
+            if give_up is not None:
+                remaining = give_up - time.monotonic()
+
+        metrics.incr("attempts")
+        try:
+            result = fn(remaining)
+        except Exception as e:
+            attempt += 1
+            if not is_retryable(e):
+                raise
+            if is_throttled(e):
+                metrics.incr("throttled")
+                if limiter is not None:
+                    limiter.on_throttle()
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            if attempt >= max_attempts or (give_up is not None and time.monotonic() + delay >= give_up):
+                metrics.incr("retries_exhausted")
+                raise
+            metrics.incr("retries")
+            note_retry()
+            time.sleep(delay)
+            continue
+
+        if limiter is not None:
+            limiter.on_success()
+        return result
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "3600"))
+# SQLite file for the on-disk tier; unset keeps the cache in memory only
+RESPONSE_CACHE_DB = os.environ.get("RESPONSE_CACHE_DB")
+RESPONSE_CACHE_DB_SIZE = int(os.environ.get("RESPONSE_CACHE_DB_SIZE", "100000"))
+
+# Writes between size checks of the SQLite tier (COUNT(*) scans the table)
+PRUNE_INTERVAL = 100
+
+
+def is_deterministic(instance: dict) -> bool:
+    """True if a chatCompletions instance always produces the same reply.
+
+    Only greedy decoding (temperature 0) is deterministic; any sampling
+    temperature makes two identical requests return different replies, so
+    caching them would change behaviour.
+    """
+    return float(instance.get("temperature", 1.0)) <= 0
+
+
+def cache_key(endpoint: str, instance: dict) -> str:
+    """Canonical hash of the endpoint and the full request instance.
+
+    The instance carries the messages and every generation parameter, and
+    is serialized with sorted keys so dict ordering does not change the key.
+    """
+    payload = json.dumps(
+        {"endpoint": endpoint, "instance": instance},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier cache of model replies: an in-memory LRU and optional SQLite.
+
+    Entries expire after ``ttl`` seconds. The memory tier holds at most
+    ``max_size`` entries; the SQLite tier (``db_path``) keeps up to
+    ``max_db_size`` entries across processes and restarts, and disk hits
+    are promoted to memory. All methods are thread-safe.
+    """
+
+    def __init__(
+        self,
+        max_size: int = RESPONSE_CACHE_SIZE,
+        ttl: float = RESPONSE_CACHE_TTL,
+        db_path: str = RESPONSE_CACHE_DB,
+        max_db_size: int = RESPONSE_CACHE_DB_SIZE,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.db_path = db_path
+        self.max_db_size = max_db_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._writes = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+
+    def get(self, key: str):
+        """Return the cached reply for a key, or None on a miss or expiry."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                    self._remember(key, value, row[1])
+                    self.hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value):
+        """Store a JSON-serializable reply under a key."""
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), expires_at, now),
+                )
+                self._writes += 1
+                if self._writes % PRUNE_INTERVAL == 0:
+                    self._prune_db(now)
+
+    def _remember(self, key: str, value, expires_at: float):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _prune_db(self, now: float):
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_db_size:
+            # Least recently read entries go first
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_db_size,),
+            )
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,321 @@
+# Offline batch prediction: JSONL prompts in, sharded JSONL results out.
+#
+#   python vertex_batch_predict.py prompts.jsonl gs://my-bucket/results/run-1
+#   python vertex_batch_predict.py gs://my-bucket/prompts.jsonl gs://my-bucket/results/run-2 --mode job
+#
+# Each input line is a JSON object with "prompt" (a string) or "messages" (a
+# chat conversation) and an optional "id", or a bare JSON string.
+
+import os
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from dotenv import load_dotenv
+from chat_payload import MAX_PAYLOAD_BYTES, as_messages, build_chat_instance
+from vertex_clients import init_vertex
+from vertex_inference_online import ENDPOINT_DISPLAY_NAME, LOCATION, PROJECT_ID, _pack_batches, _predict_chunk
+import _common  # noqa: F401  (puts the repository root on sys.path)
+from common.storage_clients import get_storage_client
+from common.telemetry import log, telemetry
+
+load_dotenv()
+
+MODEL_ID = os.environ.get("MODEL_ID", "llama-3-1-8b-instruct-1770100369749")
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+BATCH_SHARD_SIZE = int(os.environ.get("BATCH_SHARD_SIZE", "1000"))
+
+JOB_STATE_FILE = "_batch_job.json"
+INSTANCES_FILE = "_instances.jsonl"
+
+def _get_storage_client():
+    return get_storage_client(PROJECT_ID)
+
+
+def _split_gcs_uri(uri: str):
+    bucket, _, name = uri[len("gs://"):].partition("/")
+    return bucket, name
+
+
+def _join(base: str, name: str) -> str:
+    return f"{base.rstrip('/')}/{name}"
+
+
+def _open(uri: str, mode: str = "r"):
+    """Open a local path or gs:// URI as a text stream.
+
+    GCS objects are read and written in chunks, never loaded whole; a
+    written object only appears once the stream is closed.
+    """
+    if uri.startswith("gs://"):
+        bucket_name, name = _split_gcs_uri(uri)
+        blob = _get_storage_client().bucket(bucket_name).blob(name)
+        return blob.open(mode, encoding="utf-8")
+    if "w" in mode:
+        Path(uri).parent.mkdir(parents=True, exist_ok=True)
+    return open(uri, mode, encoding="utf-8")
+
+
+def _exists(uri: str) -> bool:
+    if uri.startswith("gs://"):
+        bucket_name, name = _split_gcs_uri(uri)
+        return _get_storage_client().bucket(bucket_name).blob(name).exists()
+    return Path(uri).exists()
+
+
+def _write_jsonl(uri: str, records: list):
+    """Write a whole file atomically: readers see all of it or none of it."""
+    if uri.startswith("gs://"):
+        with _open(uri, "w") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return
+    tmp_path = f"{uri}.tmp"
+    with _open(tmp_path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, uri)
+
+
+def read_requests(input_uri: str):
+    """Yield (index, id, messages) for every line of a JSONL prompt file.
+
+    Raises ValueError naming the line number for an object that has
+    neither "messages" nor "prompt".
+    """
+    with _open(input_uri) as f:
+        index = 0
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, dict):
+                request_id = item.get("id", index)
+                if "messages" in item:
+                    messages = item["messages"]
+                elif "prompt" in item:
+                    messages = as_messages(item["prompt"])
+                else:
+                    raise ValueError(f"{input_uri} line {line_number}: expected a \"prompt\" or \"messages\" field")
+            else:
+                request_id = index
+                messages = as_messages(item)
+            yield index, request_id, messages
+            index += 1
+
+
+def _shard_uri(output_uri: str, shard: int) -> str:
+    return _join(output_uri, f"results-{shard:05d}.jsonl")
+
+
+def _shards(requests, shard_size: int):
+    """Group the request stream into (shard number, requests) lists."""
+    shard, batch = 0, []
+    for request in requests:
+        batch.append(request)
+        if len(batch) == shard_size:
+            yield shard, batch
+            shard, batch = shard + 1, []
+    if batch:
+        yield shard, batch
+
+
+def run_online(
+    input_uri: str,
+    output_uri: str,
+    endpoint_display_name: str = ENDPOINT_DISPLAY_NAME,
+    concurrency: int = BATCH_CONCURRENCY,
+    shard_size: int = BATCH_SHARD_SIZE,
+    batch_size: int = 16,
+    max_tokens: int = 512,
+    temperature: float = 0.2,
+    top_p: float = 0.9,
+):
+    """Fan the prompts out to the online endpoint and write sharded results.
+
+    Input is read one shard (``shard_size`` lines) at a time, and at most
+    two shards are in flight, so memory use does not grow with the input.
+    Each shard's requests are packed into multi-instance predict calls and
+    sent by ``concurrency`` threads; the next shard is queued before the
+    current one is waited on, so the threads stay busy across shard
+    boundaries. Shards are written in order as ``results-NNNNN.jsonl`` once
+    all of their lines are done. Shards that already exist are skipped, so
+    rerunning a crashed job with the same output resumes where it stopped.
+    """
+    written = skipped = failed = 0
+    in_flight = deque()
+
+    def finish(shard, shard_uri, requests, results, chunks, start):
+        nonlocal written, failed
+        for chunk in chunks:
+            chunk.result()
+        telemetry.record("vertex.batch_shard", time.perf_counter() - start, shard=shard, instances=len(requests))
+
+        records = []
+        for (index, request_id, _), result in zip(requests, results):
+            records.append({"index": index, "id": request_id, "content": result["content"], "error": result["error"]})
+            failed += result["error"] is not None
+        _write_jsonl(shard_uri, records)
+        written += 1
+        log(f"✓ Shard {shard} written: {shard_uri} ({len(records)} results)")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for shard, requests in _shards(read_requests(input_uri), shard_size):
+            shard_uri = _shard_uri(output_uri, shard)
+            if _exists(shard_uri):
+                skipped += 1
+                continue
+
+            instances = [
+                build_chat_instance(messages, max_tokens, temperature, top_p)
+                for _, _, messages in requests
+            ]
+            results = [None] * len(instances)
+            start = time.perf_counter()
+            chunks = [
+                executor.submit(_predict_chunk, indexes, instances, results, endpoint_display_name)
+                for indexes in _pack_batches(instances, batch_size, MAX_PAYLOAD_BYTES)
+            ]
+            in_flight.append((shard, shard_uri, requests, results, chunks, start))
+            if len(in_flight) > 1:
+                finish(*in_flight.popleft())
+        while in_flight:
+            finish(*in_flight.popleft())
+
+    log(f"✓ Batch prediction completed: {written} shard(s) written, {skipped} already done, {failed} failed item(s)")
+
+
+def stage_instances(input_uri: str, instances_uri: str, max_tokens: int = 512, temperature: float = 0.2, top_p: float = 0.9) -> int:
+    """Stream the prompts into a JSONL file of chatCompletions instances."""
+    count = 0
+    with _open(instances_uri, "w") as f:
+        for _, _, messages in read_requests(input_uri):
+            f.write(json.dumps(build_chat_instance(messages, max_tokens, temperature, top_p), ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def _save_job_state(state_uri: str, job):
+    with _open(state_uri, "w") as f:
+        json.dump({"job": job.resource_name}, f)
+
+
+def _find_job(display_name: str, output_uri: str):
+    """A job submitted earlier for this output that has not failed, or None.
+
+    Covers a crash between submitting the job and saving its state file.
+    """
+    from google.cloud import aiplatform
+
+    for job in aiplatform.BatchPredictionJob.list(filter=f'display_name="{display_name}"'):
+        if job.state.name in ("JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"):
+            continue
+        if job.gca_resource.output_config.gcs_destination.output_uri_prefix.rstrip("/") == output_uri.rstrip("/"):
+            return job
+    return None
+
+
+def run_job(
+    input_uri: str,
+    output_uri: str,
+    model_id: str = MODEL_ID,
+    machine_type: str = "g2-standard-12",
+    accelerator_type: str = "NVIDIA_L4",
+    accelerator_count: int = 1,
+    starting_replica_count: int = 1,
+    max_replica_count: int = 1,
+    max_tokens: int = 512,
+    temperature: float = 0.2,
+    top_p: float = 0.9,
+):
+    """Run the prompts as a Vertex AI BatchPredictionJob on the registered model.
+
+    The prompts are converted to instances and staged next to the output,
+    then the job writes its predictions under ``output_uri``. The job's
+    resource name is saved in ``_batch_job.json`` there; rerunning with the
+    same output reattaches to that job instead of submitting a new one. If
+    the state file was never written, a job with the same display name and
+    output that has not failed is reused.
+    """
+    if not output_uri.startswith("gs://"):
+        raise ValueError("A batch prediction job needs a gs:// output location")
+    init_vertex(PROJECT_ID, LOCATION)
+    from google.cloud import aiplatform
+    state_uri = _join(output_uri, JOB_STATE_FILE)
+    display_name = f"batch-{Path(input_uri).stem}"
+
+    if _exists(state_uri):
+        with _open(state_uri) as f:
+            job_name = json.load(f)["job"]
+        job = aiplatform.BatchPredictionJob(job_name)
+        log(f"✓ Reattached to batch prediction job: {job_name}")
+    else:
+        job = _find_job(display_name, output_uri)
+        if job is not None:
+            _save_job_state(state_uri, job)
+            log(f"✓ Reattached to batch prediction job: {job.resource_name}")
+    if job is None:
+        instances_uri = _join(output_uri, INSTANCES_FILE)
+        log(f"Staging instances to {instances_uri}...")
+        count = stage_instances(input_uri, instances_uri, max_tokens, temperature, top_p)
+        log(f"✓ Staged {count} instance(s)")
+
+        job = aiplatform.BatchPredictionJob.create(
+            job_display_name=display_name,
+            model_name=model_id,
+            instances_format="jsonl",
+            predictions_format="jsonl",
+            gcs_source=instances_uri,
+            gcs_destination_prefix=output_uri,
+            machine_type=machine_type,
+            accelerator_type=accelerator_type,
+            accelerator_count=accelerator_count,
+            starting_replica_count=starting_replica_count,
+            max_replica_count=max_replica_count,
+            sync=False,
+        )
+        job.wait_for_resource_creation()
+        _save_job_state(state_uri, job)
+        log(f"✓ Batch prediction job submitted: {job.resource_name}")
+
+    with telemetry.span("vertex.batch_job", job=job.resource_name):
+        job.wait()
+    log(f"✓ Batch prediction job finished: {job.state.name}, output in {job.output_info.gcs_output_directory}")
+    return job
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Batch prediction from a JSONL prompt file")
+    parser.add_argument("input", help="local path or gs:// URI of the prompt JSONL file")
+    parser.add_argument("output", help="local directory or gs:// prefix for the results")
+    parser.add_argument("--mode", choices=["online", "job"], default="online")
+    parser.add_argument("--endpoint", default=ENDPOINT_DISPLAY_NAME, help="endpoint display name (online mode)")
+    parser.add_argument("--model-id", default=MODEL_ID, help="registered model (job mode)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--shard-size", type=int, default=BATCH_SHARD_SIZE)
+    parser.add_argument("--max-tokens", type=int, default=512)
+    parser.add_argument("--temperature", type=float, default=0.2)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    if args.mode == "job":
+        run_job(args.input, args.output, args.model_id, max_tokens=args.max_tokens, temperature=args.temperature)
+    else:
+        run_online(
+            args.input,
+            args.output,
+            args.endpoint,
+            concurrency=args.concurrency,
+            shard_size=args.shard_size,
+            max_tokens=args.max_tokens,
+            temperature=args.temperature,
+        )
+
+
+if __name__ == "__main__":
+    main()
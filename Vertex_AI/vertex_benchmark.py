@@ -0,0 +1,301 @@
+# Load generator and latency benchmark for deployed endpoints.
+#
+#   python vertex_benchmark.py --mock --requests 200 --concurrency 16
+#   python vertex_benchmark.py --mode stream --rate 5 --requests 300 --output bench.json
+
+import os
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+from dotenv import load_dotenv
+from vertex_inference_async import AsyncPredictClient
+
+load_dotenv()
+
+ENDPOINT_DISPLAY_NAME = os.environ.get("ENDPOINT_DISPLAY_NAME", "llama-3-1-8b-instruct-deploy")
+
+WORDS = (
+    "model data training inference latency token endpoint cloud storage vector "
+    "gradient batch layer attention network prompt answer question example system"
+).split()
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120]
+
+
+def prompt_lengths(distribution: str, count: int, rng: random.Random) -> list:
+    """Draw prompt lengths (in words) from a distribution spec.
+
+    Specs: "fixed:64", "uniform:16:256", "lognormal:4.0:0.8" (mu, sigma of
+    the log length).
+    """
+    kind, *params = distribution.split(":")
+    params = [float(p) for p in params]
+    if kind == "fixed":
+        return [int(params[0])] * count
+    if kind == "uniform":
+        return [rng.randint(int(params[0]), int(params[1])) for _ in range(count)]
+    if kind == "lognormal":
+        return [max(1, int(rng.lognormvariate(params[0], params[1]))) for _ in range(count)]
+    raise ValueError(f"Unknown prompt length distribution '{distribution}'")
+
+
+def make_messages(mode: str, words: int, rng: random.Random) -> list:
+    """Build the request messages for one benchmark request."""
+    prompt = " ".join(rng.choice(WORDS) for _ in range(words))
+    if mode == "chat":
+        # A short multi-turn conversation, like the chat_completion examples
+        return [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": "Hello!"},
+            {"role": "assistant", "content": "Hi! How can I help?"},
+            {"role": "user", "content": prompt},
+        ]
+    return [{"role": "user", "content": prompt}]
+
+
+async def _one_request(
+    client: AsyncPredictClient,
+    mode: str,
+    messages: list,
+    max_tokens: int,
+    temperature: float,
+    start: float = None,
+) -> dict:
+    # start is the arrival time, so open-loop latency includes queueing
+    start = start or time.perf_counter()
+    record = {"start": start, "latency": None, "ttft": None, "output_tokens": 0, "error": None}
+    try:
+        if mode == "stream":
+            async for delta in client.stream_chat_completion(messages, max_tokens, temperature):
+                if record["ttft"] is None:
+                    record["ttft"] = time.perf_counter() - start
+                # vLLM sends one delta per generated token
+                record["output_tokens"] += 1
+        else:
+            content = await client.chat_completion(messages, max_tokens, temperature)
+            # Without usage data, whitespace-separated words approximate tokens
+            record["output_tokens"] = len((content or "").split())
+        record["latency"] = time.perf_counter() - start
+        if record["ttft"] is None:
+            record["ttft"] = record["latency"]
+    except Exception as e:
+        record["latency"] = time.perf_counter() - start
+        record["error"] = type(e).__name__
+    return record
+
+
+def percentile(values: list, p: float):
+    """Nearest-rank percentile of a list (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def histogram(values: list, buckets: list = LATENCY_BUCKETS) -> list:
+    """Per-bucket (not cumulative) counts: [{"le": bound, "count": n}, ...]."""
+    counts = [0] * (len(buckets) + 1)
+    for value in values:
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+    return [{"le": bound, "count": count} for bound, count in zip(buckets + ["+Inf"], counts)]
+
+
+def summarize(records: list, wall_time: float, config: dict) -> dict:
+    ok = [r for r in records if not r["error"]]
+    latencies = [r["latency"] for r in ok]
+    ttfts = [r["ttft"] for r in ok]
+    errors = {}
+    for r in records:
+        if r["error"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    output_tokens = sum(r["output_tokens"] for r in ok)
+
+    def stats(values):
+        return {
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "mean": sum(values) / len(values) if values else None,
+            "max": max(values) if values else None,
+        }
+
+    return {
+        "config": config,
+        "requests": len(records),
+        "succeeded": len(ok),
+        "error_rate": (len(records) - len(ok)) / len(records) if records else 0.0,
+        "errors": errors,
+        "wall_time_s": wall_time,
+        "requests_per_s": len(records) / wall_time if wall_time else None,
+        "output_tokens_per_s": output_tokens / wall_time if wall_time else None,
+        "latency_s": stats(latencies),
+        "ttft_s": stats(ttfts),
+        "latency_histogram": histogram(latencies),
+        "ttft_histogram": histogram(ttfts),
+    }
+
+
+async def run_benchmark(
+    client: AsyncPredictClient,
+    mode: str = "predict",
+    num_requests: int = 100,
+    concurrency: int = 8,
+    rate: float = None,
+    prompt_distribution: str = "fixed:32",
+    warmup: int = 5,
+    max_tokens: int = 128,
+    temperature: float = 0.2,
+    seed: int = 0,
+) -> dict:
+    """Run one benchmark and return the summary report.
+
+    mode is "predict" (one user prompt, like predict_text), "chat" (a
+    multi-turn conversation, like chat_completion) or "stream" (streamed
+    chat, which measures time-to-first-token).
+
+    Without ``rate`` the load is closed-loop: ``concurrency`` workers each
+    send their next request as soon as the previous one finishes. With
+    ``rate`` (requests/second) the load is open-loop: arrivals follow a
+    Poisson process regardless of how fast the endpoint answers, which is
+    what exposes queueing under load; ``concurrency`` then caps requests in
+    flight. The first ``warmup`` requests are sent sequentially and not
+    counted.
+    """
+    rng = random.Random(seed)
+    lengths = prompt_lengths(prompt_distribution, num_requests + warmup, rng)
+    requests = [make_messages(mode, n, rng) for n in lengths]
+
+    for messages in requests[:warmup]:
+        await _one_request(client, mode, messages, max_tokens, temperature)
+    requests = requests[warmup:]
+
+    start = time.perf_counter()
+    if rate:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited(messages):
+            arrival = time.perf_counter()
+            async with semaphore:
+                return await _one_request(client, mode, messages, max_tokens, temperature, arrival)
+
+        tasks = []
+        next_arrival = start
+        for messages in requests:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(limited(messages)))
+            next_arrival += rng.expovariate(rate)
+        records = await asyncio.gather(*tasks)
+    else:
+        queue = iter(requests)
+        records = []
+
+        async def worker():
+            for messages in queue:
+                records.append(await _one_request(client, mode, messages, max_tokens, temperature))
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_time = time.perf_counter() - start
+
+    config = {
+        "mode": mode,
+        "requests": num_requests,
+        "concurrency": concurrency,
+        "rate": rate,
+        "prompt_distribution": prompt_distribution,
+        "warmup": warmup,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+    }
+    return summarize(list(records), wall_time, config)
+
+
+def print_report(report: dict):
+    def fmt(value):
+        return "-" if value is None else f"{value * 1000:.1f} ms"
+
+    print(f"\n📊 Benchmark ({report['config']['mode']}): {report['requests']} requests in {report['wall_time_s']:.2f}s")
+    print(f"  Throughput: {report['requests_per_s']:.2f} req/s, {report['output_tokens_per_s']:.1f} tokens/s")
+    print(f"  Errors: {report['error_rate']:.1%} {report['errors'] or ''}")
+    for name in ("latency_s", "ttft_s"):
+        stats = report[name]
+        print(f"  {name[:-2]:<8} p50 {fmt(stats['p50'])}  p95 {fmt(stats['p95'])}  p99 {fmt(stats['p99'])}")
+
+    print("  Latency histogram:")
+    peak = max((b["count"] for b in report["latency_histogram"]), default=0) or 1
+    for bucket in report["latency_histogram"]:
+        bar = "#" * round(40 * bucket["count"] / peak)
+        label = f"{bucket['le']}s" if bucket["le"] != "+Inf" else "+Inf"
+        print(f"    <= {label:>6} {bucket['count']:>6} {bar}")
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark a deployed Vertex AI endpoint")
+    parser.add_argument("--endpoint", default=ENDPOINT_DISPLAY_NAME, help="endpoint display name")
+    parser.add_argument("--mode", choices=["predict", "chat", "stream"], default="predict")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=None, help="open-loop arrival rate (req/s)")
+    parser.add_argument("--prompt-length", default="fixed:32", help="fixed:N | uniform:MIN:MAX | lognormal:MU:SIGMA")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--temperature", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--mock", action="store_true", help="run against a local mock predict server")
+    return parser.parse_args(argv)
+
+
+async def _main(argv=None):
+    args = _parse_args(argv)
+    server = None
+    if args.mock:
+        from mock_predict_server import start_mock_server
+
+        server, api_base = start_mock_server(latency=0.05, token_interval=0.005)
+        client = AsyncPredictClient("projects/mock/locations/mock/endpoints/mock", api_base=api_base)
+    else:
+        client = AsyncPredictClient.from_display_name(args.endpoint)
+
+    try:
+        async with client:
+            report = await run_benchmark(
+                client,
+                mode=args.mode,
+                num_requests=args.requests,
+                concurrency=args.concurrency,
+                rate=args.rate,
+                prompt_distribution=args.prompt_length,
+                warmup=args.warmup,
+                max_tokens=args.max_tokens,
+                temperature=args.temperature,
+                seed=args.seed,
+            )
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Report written to {args.output}")
+
+
+def main(argv=None):
+    asyncio.run(_main(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import os
+import threading
+import _common  # noqa: F401  (puts the repository root on sys.path)
+from common.config import require_env
+
+# The Google client libraries take seconds to import, so they are imported
+# inside the functions that need them; importing a helper from these scripts
+# stays fast and works without credentials.
+
+# Connections kept open for REST calls to Vertex AI (raw/streaming predict)
+VERTEX_POOL_SIZE = int(os.environ.get("VERTEX_POOL_SIZE", "32"))
+
+CLOUD_PLATFORM_SCOPE = "https://www.googleapis.com/auth/cloud-platform"
+
+_lock = threading.Lock()
+_credentials = None
+_initialized = None
+_sessions = {}
+_endpoint_service_clients = {}
+_model_service_clients = {}
+
+
+def get_credentials():
+    """Process-wide default credentials, loaded once so cached tokens are reused."""
+    global _credentials
+    if _credentials is None:
+        require_env("GOOGLE_APPLICATION_CREDENTIALS")
+        import google.auth
+
+        with _lock:
+            if _credentials is None:
+                _credentials, _ = google.auth.default(scopes=[CLOUD_PLATFORM_SCOPE])
+    return _credentials
+
+
+def init_vertex(project: str, location: str):
+    """Call aiplatform.init once per (project, location) instead of on every call.
+
+    aiplatform.init replaces the SDK's global configuration, which drops the
+    API clients it has already created (and their open channels). Repeated
+    calls with the same arguments are therefore skipped.
+    """
+    global _initialized
+    if _initialized == (project, location):
+        return
+    if not project:
+        raise FileNotFoundError("PROJECT_ID environment variable not set")
+    from google.cloud import aiplatform
+
+    credentials = get_credentials()
+    with _lock:
+        if _initialized != (project, location):
+            aiplatform.init(project=project, location=location, credentials=credentials)
+            _initialized = (project, location)
+
+
+def endpoint_api_base(endpoint, location: str) -> str:
+    """Base URL for raw/streaming predict calls to an endpoint.
+
+    Endpoints with a dedicated DNS name must be called there; the others
+    are served by the shared regional host.
+    """
+    if getattr(endpoint, "dedicated_endpoint_enabled", False) and getattr(endpoint, "dedicated_endpoint_dns", None):
+        return f"https://{endpoint.dedicated_endpoint_dns}"
+    return f"https://{location}-aiplatform.googleapis.com"
+
+
+def mock_endpoint_name(endpoint_display_name: str) -> str:
+    """Resource name used for an endpoint when requests go to a mock server (PREDICT_API_BASE)."""
+    return f"projects/mock/locations/mock/endpoints/{endpoint_display_name}"
+
+
+def get_authorized_session(pool_size: int = VERTEX_POOL_SIZE):
+    """Shared authenticated requests session for REST calls, with a sized connection pool."""
+    session = _sessions.get(pool_size)
+    if session is not None:
+        return session
+    from google.auth.transport.requests import AuthorizedSession
+    from requests.adapters import HTTPAdapter
+
+    credentials = get_credentials()
+    with _lock:
+        session = _sessions.get(pool_size)
+        if session is None:
+            session = AuthorizedSession(credentials)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[pool_size] = session
+        return session
+
+
+def get_endpoint_service_client(location: str):
+    """Shared low-level Endpoint API client (aiplatform_v1.EndpointServiceClient) for a region.
+
+    Its calls return long-running operations that can be polled without
+    blocking, which the high-level SDK does not expose.
+    """
+    client = _endpoint_service_clients.get(location)
+    if client is not None:
+        return client
+    from google.cloud import aiplatform_v1
+
+    credentials = get_credentials()
+    with _lock:
+        client = _endpoint_service_clients.get(location)
+        if client is None:
+            client = aiplatform_v1.EndpointServiceClient(
+                credentials=credentials,
+                client_options={"api_endpoint": f"{location}-aiplatform.googleapis.com"},
+            )
+            _endpoint_service_clients[location] = client
+        return client
+
+
+def get_model_service_client(location: str):
+    """Shared low-level Model API client (aiplatform_v1.ModelServiceClient) for a region.
+
+    Like get_endpoint_service_client, its uploads and deletes return
+    long-running operations that can be polled (or looked up again by name)
+    without blocking.
+    """
+    client = _model_service_clients.get(location)
+    if client is not None:
+        return client
+    from google.cloud import aiplatform_v1
+
+    credentials = get_credentials()
+    with _lock:
+        client = _model_service_clients.get(location)
+        if client is None:
+            client = aiplatform_v1.ModelServiceClient(
+                credentials=credentials,
+                client_options={"api_endpoint": f"{location}-aiplatform.googleapis.com"},
+            )
+            _model_service_clients[location] = client
+        return client
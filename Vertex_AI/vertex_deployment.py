@@ -1,127 +1,151 @@
 import os
 import time
-from google.cloud import aiplatform
 from dotenv import load_dotenv
-from vertexai import model_garden
+from vertex_clients import get_endpoint_service_client, init_vertex
+from chat_payload import build_chat_instance
+import _common  # noqa: F401  (puts the repository root on sys.path)
+from common.telemetry import log, telemetry
 load_dotenv()
 
-SA_FILE = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
-if not SA_FILE:
-    raise FileNotFoundError("GOOGLE_APPLICATION_CREDENTIALS environment variable not set")
-
+# Checked when the first cloud call is made (see vertex_clients), not at import
 PROJECT_ID = os.environ.get("PROJECT_ID")
-if not PROJECT_ID:
-    raise FileNotFoundError("PROJECT_ID environment variable not set")
 
 LOCATION = os.environ.get("LOCATION", "us-central1")
 ENDPOINT_DISPLAY_NAME = os.environ.get("ENDPOINT_DISPLAY_NAME", "llama-3-1-8b-instruct-deploy")
 MODEL_DISPLAY_NAME = os.environ.get("MODEL_DISPLAY_NAME", "llama-3-1-8b-instruct-1770100369749")
 MODEL_ID = os.environ.get("MODEL_ID", "llama-3-1-8b-instruct-1770100369749")
+FLEET_POLL_INTERVAL = float(os.environ.get("FLEET_POLL_INTERVAL", "15"))
+# Probes the new model must serve before a rollout step is judged, and the
+# most probes sent trying (at a 10% step, about 10 probes per sample)
+PROBE_MIN_SAMPLES = int(os.environ.get("PROBE_MIN_SAMPLES", "20"))
+PROBE_MAX_REQUESTS = int(os.environ.get("PROBE_MAX_REQUESTS", "500"))
+# Longest a health check may keep probing (seconds)
+PROBE_MAX_SECONDS = float(os.environ.get("PROBE_MAX_SECONDS", "600"))
+
+# Autoscaling metrics Vertex AI can scale a deployed model on, by short name
+AUTOSCALING_METRICS = {
+    "cpu_utilization": "aiplatform.googleapis.com/prediction/online/cpu/utilization",
+    "accelerator_duty_cycle": "aiplatform.googleapis.com/prediction/online/accelerator/duty_cycle",
+    "request_count_per_minute": "aiplatform.googleapis.com/prediction/online/request_count",
+}
+
+# Replica ranges and autoscaling targets (percent, or requests per minute
+# per replica) to deploy with; pass profile="..." to the deploy functions
+DEPLOYMENT_PROFILES = {
+    "dev": {"min_replica_count": 1, "max_replica_count": 1, "autoscaling": {}},
+    "standard": {"min_replica_count": 1, "max_replica_count": 3, "autoscaling": {"accelerator_duty_cycle": 60}},
+    "burst": {"min_replica_count": 2, "max_replica_count": 10, "autoscaling": {"accelerator_duty_cycle": 50, "request_count_per_minute": 600}},
+    "cpu": {"min_replica_count": 1, "max_replica_count": 5, "autoscaling": {"cpu_utilization": 60}},
+}
+
+def _list_endpoints(endpoint_display_name: str) -> list:
+    from google.cloud import aiplatform
+
+    with telemetry.span("vertex.endpoint_list", endpoint=endpoint_display_name):
+        return aiplatform.Endpoint.list(filter=f'display_name="{endpoint_display_name}"')
 
-aiplatform.init(project=PROJECT_ID, location=LOCATION)
 
 def list_deployments(endpoint_display_name: str = ENDPOINT_DISPLAY_NAME):
+    init_vertex(PROJECT_ID, LOCATION)
     try:
-        endpoints = aiplatform.Endpoint.list(
-            filter=f'display_name="{endpoint_display_name}"'
-        )
+        endpoints = _list_endpoints(endpoint_display_name)
         
         if not endpoints:
-            print(f"✗ Endpoint '{endpoint_display_name}' not found")
+            log(f"✗ Endpoint '{endpoint_display_name}' not found")
             return
         
         endpoint = endpoints[0]
         deployments = endpoint.list_models()
         
-        print(f"Deployments on endpoint '{endpoint_display_name}':")
+        log(f"Deployments on endpoint '{endpoint_display_name}':")
         for deployed_model in deployments:
-            print(f"  • {deployed_model.display_name} (ID: {deployed_model.id})")
+            log(f"  • {deployed_model.display_name} (ID: {deployed_model.id})")
         
         return deployments
         
     except Exception as e:
-        print(f"✗ Error listing deployments: {e}")
+        log(f"✗ Error listing deployments: {e}")
         raise
 
 def undeploy_model(
     endpoint_display_name: str = ENDPOINT_DISPLAY_NAME,
     deployed_model_id: str = None
 ):
+    init_vertex(PROJECT_ID, LOCATION)
     try:
-        endpoints = aiplatform.Endpoint.list(
-            filter=f'display_name="{endpoint_display_name}"'
-        )
+        endpoints = _list_endpoints(endpoint_display_name)
         
         if not endpoints:
-            print(f"✗ Endpoint '{endpoint_display_name}' not found")
+            log(f"✗ Endpoint '{endpoint_display_name}' not found")
             return
         
         endpoint = endpoints[0]
         
         if deployed_model_id:
-            print(f"Undeploying model {deployed_model_id}...")
-            endpoint.undeploy(deployed_model_id=deployed_model_id)
-            print(f"✓ Model undeployed successfully!")
+            log(f"Undeploying model {deployed_model_id}...")
+            with telemetry.span("vertex.undeploy", endpoint=endpoint_display_name, deployed_model=deployed_model_id):
+                endpoint.undeploy(deployed_model_id=deployed_model_id)
+            log(f"✓ Model undeployed successfully!")
         else:
-            print("Please provide a deployed_model_id")
+            log("Please provide a deployed_model_id")
             
     except Exception as e:
-        print(f"✗ Error undeploying model: {e}")
+        log(f"✗ Error undeploying model: {e}")
         raise
 
 def undeploy_model_by_name(
     endpoint_display_name: str = ENDPOINT_DISPLAY_NAME,
     model_display_name: str = None
 ):
+    init_vertex(PROJECT_ID, LOCATION)
     try:
-        endpoints = aiplatform.Endpoint.list(
-            filter=f'display_name="{endpoint_display_name}"'
-        )
+        endpoints = _list_endpoints(endpoint_display_name)
         
         if not endpoints:
-            print(f"✗ Endpoint '{endpoint_display_name}' not found")
+            log(f"✗ Endpoint '{endpoint_display_name}' not found")
             return
         
         endpoint = endpoints[0]
         deployments = endpoint.list_models()
         
         if not model_display_name:
-            print("Please provide a model_display_name")
+            log("Please provide a model_display_name")
             return
         
         found = False
         for deployed_model in deployments:
             if deployed_model.display_name == model_display_name:
-                print(f"Undeploying model '{model_display_name}' (ID: {deployed_model.id})...")
-                endpoint.undeploy(deployed_model_id=deployed_model.id)
-                print(f"✓ Model '{model_display_name}' undeployed successfully!")
+                log(f"Undeploying model '{model_display_name}' (ID: {deployed_model.id})...")
+                with telemetry.span("vertex.undeploy", endpoint=endpoint_display_name, deployed_model=deployed_model.id):
+                    endpoint.undeploy(deployed_model_id=deployed_model.id)
+                log(f"✓ Model '{model_display_name}' undeployed successfully!")
                 found = True
                 break
         
         if not found:
-            print(f"✗ Model with display name '{model_display_name}' not found on endpoint")
+            log(f"✗ Model with display name '{model_display_name}' not found on endpoint")
             
     except Exception as e:
-        print(f"✗ Error undeploying model: {e}")
+        log(f"✗ Error undeploying model: {e}")
         raise
 
 def delete_endpoint(endpoint_display_name: str = ENDPOINT_DISPLAY_NAME):
+    init_vertex(PROJECT_ID, LOCATION)
     try:
-        endpoints = aiplatform.Endpoint.list(
-            filter=f'display_name="{endpoint_display_name}"'
-        )
+        endpoints = _list_endpoints(endpoint_display_name)
         
         if not endpoints:
-            print(f"✗ Endpoint '{endpoint_display_name}' not found")
+            log(f"✗ Endpoint '{endpoint_display_name}' not found")
             return
         
         endpoint = endpoints[0]
-        print(f"Deleting endpoint '{endpoint_display_name}'...")
-        endpoint.delete()
-        print(f"✓ Endpoint deleted successfully!")
+        log(f"Deleting endpoint '{endpoint_display_name}'...")
+        with telemetry.span("vertex.endpoint_delete", endpoint=endpoint_display_name):
+            endpoint.delete()
+        log(f"✓ Endpoint deleted successfully!")
         
     except Exception as e:
-        print(f"✗ Error deleting endpoint: {e}")
+        log(f"✗ Error deleting endpoint: {e}")
         raise
 
 def deploy_model(
@@ -135,17 +159,21 @@ def deploy_model(
     model_display_name: str = MODEL_DISPLAY_NAME,
     fast_tryout_enabled: bool = True,
 ):
+    init_vertex(PROJECT_ID, LOCATION)
+    from vertexai import model_garden
+
     model = model_garden.OpenModel(open_model_id)
-    endpoint = model.deploy(
-        accept_eula=accept_eula,
-        machine_type=machine_type,
-        accelerator_type=accelerator_type,
-        accelerator_count=accelerator_count,
-        serving_container_image_uri=serving_container_image_uri,
-        endpoint_display_name=endpoint_display_name,
-        model_display_name=model_display_name,
-        fast_tryout_enabled=fast_tryout_enabled,
-    )
+    with telemetry.span("vertex.deploy", endpoint=endpoint_display_name, model=open_model_id):
+        endpoint = model.deploy(
+            accept_eula=accept_eula,
+            machine_type=machine_type,
+            accelerator_type=accelerator_type,
+            accelerator_count=accelerator_count,
+            serving_container_image_uri=serving_container_image_uri,
+            endpoint_display_name=endpoint_display_name,
+            model_display_name=model_display_name,
+            fast_tryout_enabled=fast_tryout_enabled,
+        )
     return endpoint
 
 def deploy_registered_model(
@@ -155,50 +183,703 @@ def deploy_registered_model(
     machine_type: str = "g2-standard-12",
     accelerator_type: str = "NVIDIA_L4",
     accelerator_count: int = 1,
-    min_replica_count: int = 1,
-    max_replica_count: int = 1,
+    min_replica_count: int = None,
+    max_replica_count: int = None,
+    reconcile: bool = False,
+    profile: str = None,
 ):
+    """Create an endpoint and deploy a registered model to it.
+
+    profile picks replica counts and autoscaling targets from
+    DEPLOYMENT_PROFILES; explicit replica counts override it (without a
+    profile, one replica). With reconcile=True, an existing endpoint and
+    deployment are reused and only what differs is changed (see
+    reconcile_registered_model).
+    """
+    if reconcile:
+        return reconcile_registered_model(
+            model_id,
+            endpoint_display_name,
+            deployed_model_display_name,
+            machine_type,
+            accelerator_type,
+            accelerator_count,
+            min_replica_count,
+            max_replica_count,
+            profile=profile,
+        )
+    spec = resolve_profile(profile, min_replica_count=min_replica_count, max_replica_count=max_replica_count)
+    init_vertex(PROJECT_ID, LOCATION)
+    from google.cloud import aiplatform
+
     try:
         if not model_id:
             raise ValueError("MODEL_ID is required. Please provide a model_id or set MODEL_ID in .env")
         
-        print(f"Creating endpoint '{endpoint_display_name}'...")
-        endpoint = aiplatform.Endpoint.create(
-            display_name=endpoint_display_name
-        )
-        print(f"✓ Endpoint created: {endpoint.resource_name}")
+        log(f"Creating endpoint '{endpoint_display_name}'...")
+        with telemetry.span("vertex.endpoint_create", endpoint=endpoint_display_name):
+            endpoint = aiplatform.Endpoint.create(
+                display_name=endpoint_display_name
+            )
+        log(f"✓ Endpoint created: {endpoint.resource_name}")
         
-        print(f"Getting model with ID: {model_id}...")
+        log(f"Getting model with ID: {model_id}...")
         model = aiplatform.Model(model_id)
-        print(f"✓ Found model: {model.resource_name}")
+        log(f"✓ Found model: {model.resource_name}")
         
-        print(f"Deploying model to endpoint...")
-        model.deploy(
-            endpoint=endpoint,
-            deployed_model_display_name=deployed_model_display_name,
-            machine_type=machine_type,
-            accelerator_type=accelerator_type,
-            accelerator_count=accelerator_count,
-            min_replica_count=min_replica_count,
-            max_replica_count=max_replica_count,
-        )
-        print(f"✓ Model deployed successfully!")
+        log(f"Deploying model to endpoint...")
+        with telemetry.span("vertex.deploy", endpoint=endpoint_display_name, model=model_id):
+            model.deploy(
+                endpoint=endpoint,
+                deployed_model_display_name=deployed_model_display_name,
+                machine_type=machine_type,
+                accelerator_type=accelerator_type,
+                accelerator_count=accelerator_count,
+                min_replica_count=spec["min_replica_count"],
+                max_replica_count=spec["max_replica_count"],
+                **{f"autoscaling_target_{name}": target for name, target in spec["autoscaling"].items()},
+            )
+        log(f"✓ Model deployed successfully!")
         
         return endpoint
         
     except Exception as e:
-        print(f"✗ Error deploying registered model: {e}")
+        log(f"✗ Error deploying registered model: {e}")
+        raise
+
+# Fleet operations
+#
+# Each endpoint gets a queue of steps (create, deploy, undeploy, delete) that
+# run one after another, because Vertex AI rejects concurrent changes to one
+# endpoint. Queues of different endpoints run at the same time: every step is
+# submitted as a long-running operation and one loop polls all of them.
+
+DEFAULT_MACHINE_SPEC = {
+    "machine_type": "g2-standard-12",
+    "accelerator_type": "NVIDIA_L4",
+    "accelerator_count": 1,
+    "min_replica_count": 1,
+    "max_replica_count": 1,
+    "autoscaling": {},
+}
+
+
+def resolve_profile(profile: str = None, **overrides) -> dict:
+    """Machine spec from the defaults, a deployment profile, then explicit values (None is ignored)."""
+    if profile is not None and profile not in DEPLOYMENT_PROFILES:
+        raise ValueError(f"Unknown deployment profile '{profile}', expected one of {sorted(DEPLOYMENT_PROFILES)}")
+    spec = {**DEFAULT_MACHINE_SPEC, **DEPLOYMENT_PROFILES.get(profile, {})}
+    spec.update({key: value for key, value in overrides.items() if value is not None})
+    unknown = set(spec["autoscaling"]) - set(AUTOSCALING_METRICS)
+    if unknown:
+        raise ValueError(f"Unknown autoscaling metric(s) {sorted(unknown)}, expected {sorted(AUTOSCALING_METRICS)}")
+    return spec
+
+
+def _autoscaling_metric_specs(autoscaling: dict) -> list:
+    from google.cloud.aiplatform_v1.types import AutoscalingMetricSpec
+
+    return [
+        AutoscalingMetricSpec(metric_name=AUTOSCALING_METRICS[name], target=int(target))
+        for name, target in sorted(autoscaling.items())
+    ]
+
+
+def _parent() -> str:
+    return f"projects/{PROJECT_ID}/locations/{LOCATION}"
+
+
+def _model_resource_name(model_id: str) -> str:
+    return model_id if "/" in model_id else f"{_parent()}/models/{model_id}"
+
+
+def _list_endpoints_by_name() -> dict:
+    """All endpoints of the project and region, by display name, in one list call."""
+    client = get_endpoint_service_client(LOCATION)
+    return {endpoint.display_name: endpoint for endpoint in client.list_endpoints(parent=_parent())}
+
+
+def _split_with_new_model(traffic_split: dict, traffic_percentage: int, deployed_model_id: str = "0") -> dict:
+    """Give a deployed model traffic_percentage% and scale the others to the rest.
+
+    The default ID "0" stands for the model being deployed by the request.
+    """
+    current = {k: v for k, v in traffic_split.items() if v and k != deployed_model_id}
+    if not current:
+        return {**{k: 0 for k in traffic_split if k != deployed_model_id}, deployed_model_id: 100}
+    total = sum(current.values())
+    split = {k: 0 for k in traffic_split}
+    split.update({k: int(v * (100 - traffic_percentage) / total) for k, v in current.items()})
+    split[deployed_model_id] = 100 - sum(v for k, v in split.items() if k != deployed_model_id)
+    return split
+
+
+def _split_without_model(traffic_split: dict, deployed_model_id: str) -> dict:
+    """Spread the traffic of a model being undeployed over the remaining ones."""
+    remaining = {k: v for k, v in traffic_split.items() if k != deployed_model_id}
+    total = sum(remaining.values())
+    if not remaining:
+        return {}
+    if total == 0:
+        first = next(iter(remaining))
+        return {k: (100 if k == first else 0) for k in remaining}
+    split = {k: int(v * 100 / total) for k, v in remaining.items()}
+    largest = max(split, key=split.get)
+    split[largest] += 100 - sum(split.values())
+    return split
+
+
+def _run_fleet_steps(queues: dict, poll_interval: float = FLEET_POLL_INTERVAL) -> list:
+    """Run per-endpoint step queues concurrently and return one result row per step.
+
+    queues maps an endpoint display name to a list of (action, model, submit)
+    or (action, model, submit, on_done) steps; submit() starts a long-running
+    operation and returns it, or returns None when there is nothing to do,
+    and on_done(result) is called when the operation succeeds. A failed step
+    skips the rest of its endpoint's queue.
+
+    Each step is recorded as two telemetry spans, vertex.<action>.submit
+    (the API call) and vertex.<action>.wait (until the poller saw the
+    operation finish, so up to poll_interval late; the server-side run time
+    is attached as server_s when the operation reports it).
+    """
+    rows = []
+    running = {}
+    queues = {name: list(steps) for name, steps in queues.items()}
+
+    def start_next(name):
+        while queues[name]:
+            action, model, submit, *on_done = queues[name].pop(0)
+            row = {"endpoint": name, "action": action, "model": model, "status": "running", "seconds": 0.0, "error": None}
+            rows.append(row)
+            started = time.monotonic()
+            try:
+                with telemetry.span(f"vertex.{action}.submit", endpoint=name, model=model):
+                    operation = submit()
+            except Exception as e:
+                row.update(status="failed", error=str(e))
+                skip_rest(name)
+                return
+            if operation is None:
+                row["status"] = "unchanged"
+                continue
+            if not hasattr(operation, "done"):
+                # A call that finished right away instead of returning an operation
+                row.update(status="done", seconds=time.monotonic() - started)
+                for callback in on_done:
+                    callback(operation)
+                continue
+            log(f"  → {action}{f' {model}' if model else ''} on '{name}' submitted")
+            running[name] = (operation, row, started, time.monotonic(), on_done)
+            return
+
+    def skip_rest(name):
+        for action, model, *_ in queues.pop(name, []):
+            rows.append({"endpoint": name, "action": action, "model": model, "status": "skipped", "seconds": 0.0, "error": None})
+        queues[name] = []
+
+    for name in queues:
+        start_next(name)
+
+    while running:
+        time.sleep(poll_interval)
+        for name, (operation, row, started, submitted, on_done) in list(running.items()):
+            if not operation.done():
+                continue
+            del running[name]
+            row["seconds"] = time.monotonic() - started
+            error = operation.exception()
+            telemetry.record(
+                f"vertex.{row['action']}.wait", time.monotonic() - submitted, error=str(error) if error is not None else None,
+                endpoint=name, model=row["model"], server_s=_operation_server_seconds(operation),
+            )
+            if error is not None:
+                row.update(status="failed", error=str(error))
+                log(f"  ✗ {row['action']} on '{name}' failed: {error}")
+                skip_rest(name)
+            else:
+                row["status"] = "done"
+                for callback in on_done:
+                    callback(operation.result())
+                log(f"  ✓ {row['action']} on '{name}' done in {row['seconds'] / 60:.1f} min")
+                start_next(name)
+    return rows
+
+
+def _operation_server_seconds(operation):
+    """How long Vertex AI says a finished operation ran, or None if it does not say."""
+    generic = getattr(getattr(operation, "metadata", None), "generic_metadata", None)
+    if generic is None or not generic.create_time or not generic.update_time:
+        return None
+    return (generic.update_time - generic.create_time).total_seconds()
+
+
+def print_fleet_results(rows: list):
+    log(f"\n{'ENDPOINT':<36} {'ACTION':<10} {'MODEL':<36} {'STATUS':<10} {'MINUTES':>7}")
+    for row in rows:
+        log(
+            f"{row['endpoint']:<36} {row['action']:<10} {str(row['model'] or '-'):<36} "
+            f"{row['status']:<10} {row['seconds'] / 60:>7.1f}"
+            + (f"  {row['error']}" if row["error"] else "")
+        )
+
+
+def deploy_fleet(specs: list, poll_interval: float = FLEET_POLL_INTERVAL) -> list:
+    """Deploy many models to many endpoints at once.
+
+    specs is a list of (model_id, endpoint_display_name, machine_spec)
+    tuples. machine_spec is a dict with any of machine_type,
+    accelerator_type, accelerator_count, min_replica_count,
+    max_replica_count, autoscaling (e.g. {"accelerator_duty_cycle": 60}),
+    profile (a DEPLOYMENT_PROFILES name), deployed_model_display_name and
+    traffic_percentage (default 100); missing keys use the profile, then
+    DEFAULT_MACHINE_SPEC. Missing endpoints
+    are created. Endpoints are listed once, all operations are submitted
+    with one poller waiting on them, and a result row is returned per step.
+    """
+    init_vertex(PROJECT_ID, LOCATION)
+    from google.cloud.aiplatform_v1.types import Endpoint as GcaEndpoint
+
+    client = get_endpoint_service_client(LOCATION)
+    endpoints = _list_endpoints_by_name()
+    resource_names = {name: endpoint.name for name, endpoint in endpoints.items()}
+    queues = {}
+
+    def create_step(name):
+        def submit():
+            return client.create_endpoint(parent=_parent(), endpoint=GcaEndpoint(display_name=name))
+
+        def on_done(endpoint):
+            resource_names[name] = endpoint.name
+        return submit, on_done
+
+    def deploy_step(model_id, name, spec):
+        # The endpoint may only exist once an earlier create step has finished
+        return lambda: _deploy_submit(client, resource_names[name], model_id, spec)()
+
+    for model_id, name, machine_spec in specs:
+        machine_spec = dict(machine_spec or {})
+        spec = resolve_profile(machine_spec.pop("profile", None), **machine_spec)
+        steps = queues.setdefault(name, [])
+        if name not in endpoints and not steps:
+            steps.append(("create", None, *create_step(name)))
+        steps.append(("deploy", model_id, deploy_step(model_id, name, spec)))
+
+    log(f"Deploying {len(specs)} model(s) to {len(queues)} endpoint(s)...")
+    rows = _run_fleet_steps(queues, poll_interval)
+    print_fleet_results(rows)
+    return rows
+
+
+def undeploy_fleet(specs: list, poll_interval: float = FLEET_POLL_INTERVAL) -> list:
+    """Undeploy many models at once.
+
+    specs is a list of (model, endpoint_display_name) tuples (extra tuple
+    items are ignored, so deploy_fleet specs can be reused); model matches
+    a deployed model's ID, display name or model ID. Traffic of an
+    undeployed model moves to the models that stay.
+    """
+    init_vertex(PROJECT_ID, LOCATION)
+    client = get_endpoint_service_client(LOCATION)
+    endpoints = _list_endpoints_by_name()
+    queues = {}
+
+    def undeploy_step(model, name):
+        def submit():
+            endpoint = client.get_endpoint(name=endpoints[name].name)
+            for deployed_model in endpoint.deployed_models:
+                if model in (deployed_model.id, deployed_model.display_name, deployed_model.model.split("/")[-1], deployed_model.model):
+                    return _undeploy_submit(client, endpoint.name, deployed_model.id)()
+            return None
+        return submit
+
+    for model, name, *_ in specs:
+        if name not in endpoints:
+            log(f"✗ Endpoint '{name}' not found")
+            continue
+        queues.setdefault(name, []).append(("undeploy", model, undeploy_step(model, name)))
+
+    log(f"Undeploying {len(specs)} model(s) from {len(queues)} endpoint(s)...")
+    rows = _run_fleet_steps(queues, poll_interval)
+    print_fleet_results(rows)
+    return rows
+
+
+def teardown_fleet(endpoint_display_names: list, poll_interval: float = FLEET_POLL_INTERVAL) -> list:
+    """Undeploy every model from the endpoints and delete them, all endpoints at once."""
+    init_vertex(PROJECT_ID, LOCATION)
+    client = get_endpoint_service_client(LOCATION)
+    endpoints = _list_endpoints_by_name()
+    queues = {}
+
+    for name in endpoint_display_names:
+        endpoint = endpoints.get(name)
+        if endpoint is None:
+            log(f"✗ Endpoint '{name}' not found")
+            continue
+        steps = queues.setdefault(name, [])
+        for deployed_model in endpoint.deployed_models:
+            steps.append(("undeploy", deployed_model.display_name, _undeploy_submit(client, endpoint.name, deployed_model.id)))
+        steps.append(("delete", None, lambda resource_name=endpoint.name: client.delete_endpoint(name=resource_name)))
+
+    log(f"Tearing down {len(queues)} endpoint(s)...")
+    rows = _run_fleet_steps(queues, poll_interval)
+    print_fleet_results(rows)
+    return rows
+
+
+def _machine_spec_matches(deployed_model, spec: dict) -> bool:
+    resources = deployed_model.dedicated_resources
+    if not resources or not resources.machine_spec.machine_type:
+        return False
+    machine = resources.machine_spec
+    accelerator = machine.accelerator_type.name if machine.accelerator_count else None
+    wanted_accelerator = spec["accelerator_type"] if spec["accelerator_count"] else None
+    return (
+        machine.machine_type == spec["machine_type"]
+        and accelerator == wanted_accelerator
+        and machine.accelerator_count == spec["accelerator_count"]
+    )
+
+
+def reconcile_registered_model(
+    model_id: str = MODEL_ID,
+    endpoint_display_name: str = ENDPOINT_DISPLAY_NAME,
+    deployed_model_display_name: str = MODEL_DISPLAY_NAME,
+    machine_type: str = "g2-standard-12",
+    accelerator_type: str = "NVIDIA_L4",
+    accelerator_count: int = 1,
+    min_replica_count: int = None,
+    max_replica_count: int = None,
+    traffic_percentage: int = 100,
+    dry_run: bool = False,
+    poll_interval: float = FLEET_POLL_INTERVAL,
+    profile: str = None,
+    autoscaling: dict = None,
+) -> list:
+    """Bring an endpoint to the wanted state with the smallest change.
+
+    Reads the endpoint (by display name), its deployed models, their
+    machine spec and replica counts, and the traffic split, then plans:
+      - no endpoint: create it and deploy the model
+      - model not deployed: deploy it with traffic_percentage of traffic
+      - model deployed on another machine spec: deploy the new spec, then
+        undeploy the old deployed model (its traffic moves to the new one)
+      - replica counts or autoscaling targets differ: change them in place
+        (no redeploy)
+      - traffic share differs: update the endpoint's traffic split
+      - otherwise nothing; a rerun of the same deploy returns in seconds
+    With dry_run=True the plan is printed but not applied. Returns the
+    fleet result rows of the applied steps.
+    """
+    init_vertex(PROJECT_ID, LOCATION)
+    if not model_id:
+        raise ValueError("MODEL_ID is required. Please provide a model_id or set MODEL_ID in .env")
+    client = get_endpoint_service_client(LOCATION)
+    spec = resolve_profile(
+        profile,
+        machine_type=machine_type,
+        accelerator_type=accelerator_type,
+        accelerator_count=accelerator_count,
+        min_replica_count=min_replica_count,
+        max_replica_count=max_replica_count,
+        autoscaling=autoscaling,
+        deployed_model_display_name=deployed_model_display_name,
+        traffic_percentage=traffic_percentage,
+    )
+    # Deployed models name the project by number, not ID, so compare the model IDs
+    # only, and the version too when model_id asks for one (ID@VERSION)
+    short_model_id, _, version = model_id.split("/")[-1].partition("@")
+
+    def is_wanted_model(dm) -> bool:
+        name, _, name_version = dm.model.partition("@")
+        if name.split("/")[-1] != short_model_id:
+            return False
+        return not version or (dm.model_version_id or name_version) == version
+
+    endpoints = client.list_endpoints(parent=_parent(), filter=f'display_name="{endpoint_display_name}"')
+    endpoint = next(iter(endpoints), None)
+
+    if endpoint is None:
+        log(f"Plan for '{endpoint_display_name}': create endpoint, deploy {model_id}")
+        if dry_run:
+            return []
+        return deploy_fleet([(model_id, endpoint_display_name, spec)], poll_interval)
+
+    current = [dm for dm in endpoint.deployed_models if is_wanted_model(dm)]
+    matching = [dm for dm in current if _machine_spec_matches(dm, spec)]
+    steps = []
+
+    if not matching:
+        steps.append(("deploy", model_id, _deploy_submit(client, endpoint.name, model_id, spec)))
+        for old in current:
+            steps.append(("undeploy", old.id, _undeploy_submit(client, endpoint.name, old.id)))
+    else:
+        deployed = matching[0]
+        resources = deployed.dedicated_resources
+        current_scaling = (
+            resources.min_replica_count,
+            resources.max_replica_count,
+            sorted((m.metric_name, m.target) for m in resources.autoscaling_metric_specs),
+        )
+        wanted_scaling = (
+            spec["min_replica_count"],
+            spec["max_replica_count"],
+            sorted((m.metric_name, m.target) for m in _autoscaling_metric_specs(spec["autoscaling"])),
+        )
+        if current_scaling != wanted_scaling:
+            steps.append(("scale", deployed.id, _scale_submit(client, endpoint.name, deployed, spec)))
+        for old in current:
+            if old.id != deployed.id:
+                steps.append(("undeploy", old.id, _undeploy_submit(client, endpoint.name, old.id)))
+        if endpoint.traffic_split.get(deployed.id, 0) != traffic_percentage or len(current) > 1:
+            steps.append(("traffic", deployed.id, _traffic_submit(client, endpoint.name, deployed.id, traffic_percentage)))
+
+    if not steps:
+        log(f"✓ '{endpoint_display_name}' already serves {model_id} as requested, nothing to do")
+        return []
+    log(f"Plan for '{endpoint_display_name}': " + ", ".join(f"{action} {target}" for action, target, _ in steps))
+    if dry_run:
+        return []
+    rows = _run_fleet_steps({endpoint_display_name: steps}, poll_interval)
+    print_fleet_results(rows)
+    return rows
+
+
+def _deploy_submit(client, endpoint_name: str, model_id: str, spec: dict):
+    from google.cloud.aiplatform_v1.types import DedicatedResources, DeployedModel, MachineSpec
+
+    def submit():
+        endpoint = client.get_endpoint(name=endpoint_name)
+        deployed_model = DeployedModel(
+            model=_model_resource_name(model_id),
+            display_name=spec.get("deployed_model_display_name") or model_id.split("/")[-1],
+            dedicated_resources=DedicatedResources(
+                machine_spec=MachineSpec(
+                    machine_type=spec["machine_type"],
+                    accelerator_type=spec["accelerator_type"],
+                    accelerator_count=spec["accelerator_count"],
+                ),
+                min_replica_count=spec["min_replica_count"],
+                max_replica_count=spec["max_replica_count"],
+                autoscaling_metric_specs=_autoscaling_metric_specs(spec.get("autoscaling", {})),
+            ),
+        )
+        return client.deploy_model(
+            endpoint=endpoint_name,
+            deployed_model=deployed_model,
+            traffic_split=_split_with_new_model(dict(endpoint.traffic_split), spec.get("traffic_percentage", 100)),
+        )
+    return submit
+
+
+def _undeploy_submit(client, endpoint_name: str, deployed_model_id: str):
+    def submit():
+        endpoint = client.get_endpoint(name=endpoint_name)
+        return client.undeploy_model(
+            endpoint=endpoint_name,
+            deployed_model_id=deployed_model_id,
+            traffic_split=_split_without_model(dict(endpoint.traffic_split), deployed_model_id),
+        )
+    return submit
+
+
+def _scale_submit(client, endpoint_name: str, deployed_model, spec: dict):
+    from google.cloud.aiplatform_v1.types import DedicatedResources, DeployedModel
+
+    def submit():
+        resources = DedicatedResources(deployed_model.dedicated_resources)
+        resources.min_replica_count = spec["min_replica_count"]
+        resources.max_replica_count = spec["max_replica_count"]
+        resources.autoscaling_metric_specs = _autoscaling_metric_specs(spec["autoscaling"])
+        return client.mutate_deployed_model(
+            endpoint=endpoint_name,
+            deployed_model=DeployedModel(id=deployed_model.id, dedicated_resources=resources),
+            update_mask={"paths": [
+                "dedicated_resources.min_replica_count",
+                "dedicated_resources.max_replica_count",
+                "dedicated_resources.autoscaling_metric_specs",
+            ]},
+        )
+    return submit
+
+
+def _traffic_submit(client, endpoint_name: str, deployed_model_id: str, traffic_percentage: int):
+    from google.cloud.aiplatform_v1.types import Endpoint as GcaEndpoint
+
+    def submit():
+        endpoint = client.get_endpoint(name=endpoint_name)
+        split = _split_with_new_model(dict(endpoint.traffic_split), traffic_percentage, deployed_model_id)
+        live = {dm.id for dm in endpoint.deployed_models}
+        split = {k: v for k, v in split.items() if k in live}
+        return client.update_endpoint(
+            endpoint=GcaEndpoint(name=endpoint_name, traffic_split=split),
+            update_mask={"paths": ["traffic_split"]},
+        )
+    return submit
+
+
+def probe_health(
+    endpoint_name: str,
+    deployed_model_id: str,
+    min_samples: int = PROBE_MIN_SAMPLES,
+    max_probes: int = PROBE_MAX_REQUESTS,
+    max_error_rate: float = None,
+    max_seconds: float = PROBE_MAX_SECONDS,
+) -> dict:
+    """Send short probe requests through the endpoint and measure one deployed model.
+
+    Every response says which deployed model served it, so latencies are
+    attributed to deployed_model_id; errors cannot be attributed and are
+    counted for the endpoint as a whole. Probing goes on until the model
+    has served min_samples probes, max_probes were sent or max_seconds
+    have passed, so a model on a small traffic share still gets enough
+    samples. With max_error_rate, probing stops early once at least
+    min_samples probes were sent and the error rate is above it. Returns
+    error_rate, p95_latency_s (None if the model served no probe), samples
+    and probes.
+    """
+    from google.cloud import aiplatform
+
+    endpoint = aiplatform.Endpoint(endpoint_name)
+    instance = build_chat_instance([{"role": "user", "content": "Reply with OK."}], max_tokens=8, temperature=0)
+    latencies, errors, probes = [], 0, 0
+    give_up = time.monotonic() + max_seconds
+    while len(latencies) < min_samples and probes < max_probes:
+        remaining = give_up - time.monotonic()
+        if remaining <= 0:
+            break
+        if max_error_rate is not None and probes >= min_samples and errors / probes > max_error_rate:
+            break
+        probes += 1
+        start = time.perf_counter()
+        try:
+            response = endpoint.predict(instances=[instance], timeout=min(60, remaining))
+        except Exception:
+            errors += 1
+            continue
+        if response.deployed_model_id == deployed_model_id:
+            latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "error_rate": errors / probes if probes else 0.0,
+        "p95_latency_s": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else None,
+        "samples": len(latencies),
+        "probes": probes,
+    }
+
+
+def rollout_traffic(
+    endpoint_display_name: str,
+    from_deployed_model_id: str,
+    to_deployed_model_id: str,
+    steps: tuple = (10, 25, 50, 100),
+    bake_time: float = 300,
+    max_error_rate: float = 0.01,
+    max_p95_latency: float = None,
+    health_check=None,
+    undeploy_old: bool = False,
+    min_samples: int = PROBE_MIN_SAMPLES,
+) -> bool:
+    """Shift traffic from one deployed model to another in gated steps (blue/green).
+
+    At each step the new model gets that percentage of the traffic the two
+    models share (other deployed models keep theirs). After bake_time
+    seconds, health_check(endpoint_resource_name, to_deployed_model_id) is
+    run (probe_health by default); if the error rate is above
+    max_error_rate, the p95 latency above max_p95_latency, or the new model
+    served fewer than min_samples probes (too few to judge it), the
+    original split is restored and False is returned. With undeploy_old=True the old
+    model is undeployed once it gets no traffic.
+    """
+    init_vertex(PROJECT_ID, LOCATION)
+    from google.cloud.aiplatform_v1.types import Endpoint as GcaEndpoint
+
+    client = get_endpoint_service_client(LOCATION)
+    health_check = health_check or (
+        lambda name, deployed_model_id: probe_health(
+            name, deployed_model_id, min_samples, max_error_rate=max_error_rate
+        )
+    )
+    endpoint = next(iter(client.list_endpoints(parent=_parent(), filter=f'display_name="{endpoint_display_name}"')), None)
+    if endpoint is None:
+        log(f"✗ Endpoint '{endpoint_display_name}' not found")
+        return False
+
+    original = dict(endpoint.traffic_split)
+    pair_total = original.get(from_deployed_model_id, 0) + original.get(to_deployed_model_id, 0)
+    others = {k: v for k, v in original.items() if k not in (from_deployed_model_id, to_deployed_model_id)}
+    if pair_total == 0:
+        if sum(others.values()):
+            raise ValueError(
+                f"{from_deployed_model_id} and {to_deployed_model_id} get no traffic on '{endpoint_display_name}'; "
+                "give the old model a share first"
+            )
+        pair_total = 100
+
+    def set_split(split):
+        with telemetry.span("vertex.traffic", endpoint=endpoint_display_name):
+            client.update_endpoint(
+                endpoint=GcaEndpoint(name=endpoint.name, traffic_split=split),
+                update_mask={"paths": ["traffic_split"]},
+            )
+
+    try:
+        for percentage in steps:
+            to_share = round(pair_total * percentage / 100)
+            set_split({**others, from_deployed_model_id: pair_total - to_share, to_deployed_model_id: to_share})
+            log(f"→ {percentage}% of traffic on {to_deployed_model_id}, baking for {bake_time:.0f}s...")
+            time.sleep(bake_time)
+
+            with telemetry.span("vertex.health_check", endpoint=endpoint_display_name, traffic_percentage=percentage):
+                health = health_check(endpoint.name, to_deployed_model_id)
+            p95 = health.get("p95_latency_s")
+            samples = health.get("samples")
+            unhealthy = (
+                health["error_rate"] > max_error_rate
+                or (samples is not None and samples < min_samples)
+                or (max_p95_latency is not None and (p95 is None or p95 > max_p95_latency))
+            )
+            log(
+                f"  error rate {health['error_rate']:.1%}, p95 {'-' if p95 is None else f'{p95:.2f}s'}"
+                + ("" if samples is None else f" over {samples} sample(s)")
+            )
+            if unhealthy:
+                set_split(original)
+                log(f"✗ Rollout of {to_deployed_model_id} failed its health check, traffic restored")
+                return False
+    except BaseException:
+        # A failed health check or traffic update must not leave a partial split behind
+        set_split(original)
+        log(f"✗ Rollout of {to_deployed_model_id} stopped by an error, traffic restored")
         raise
 
+    log(f"✓ Rollout of {to_deployed_model_id} completed")
+    if undeploy_old and steps and steps[-1] == 100:
+        with telemetry.span("vertex.undeploy", endpoint=endpoint_display_name, deployed_model=from_deployed_model_id):
+            operation = _undeploy_submit(client, endpoint.name, from_deployed_model_id)()
+            operation.result()
+        log(f"✓ Old deployed model {from_deployed_model_id} undeployed")
+    return True
+
 if __name__ == "__main__":
 
     # endpoint = deploy_model()
     start_time = time.perf_counter()
     try:
         # deploy_registered_model()
+        # deploy_registered_model(reconcile=True)
+        # deploy_registered_model(reconcile=True, profile="standard")
+        # rollout_traffic(ENDPOINT_DISPLAY_NAME, "old-deployed-model-id", "new-deployed-model-id", max_p95_latency=5)
+        # deploy_fleet([
+        #     (MODEL_ID, ENDPOINT_DISPLAY_NAME, {"machine_type": "g2-standard-12", "accelerator_count": 1}),
+        #     ("another-model-id", "another-endpoint", {"machine_type": "g2-standard-24", "accelerator_count": 2}),
+        # ])
+        # teardown_fleet([ENDPOINT_DISPLAY_NAME, "another-endpoint"])
         # undeploy_model(deployed_model_id=MODEL_ID)
         undeploy_model_by_name(model_display_name=MODEL_DISPLAY_NAME)
         delete_endpoint()
     finally:
         elapsed_s = time.perf_counter() - start_time
         print(f"Total time taken: {elapsed_s:.2f} seconds ({elapsed_s/60:.2f} minutes)")
+        telemetry.print_summary()
@@ -0,0 +1,278 @@
+import os
+import json
+import asyncio
+import aiohttp
+from dotenv import load_dotenv
+from google.api_core import exceptions as api_exceptions
+from chat_payload import StreamParser, as_messages, build_chat_instance, extract_content
+from response_cache import cache_key, is_deterministic
+from single_flight import AsyncSingleFlight
+from vertex_clients import endpoint_api_base, mock_endpoint_name
+
+load_dotenv()
+
+LOCATION = os.environ.get("LOCATION", "us-central1")
+ENDPOINT_DISPLAY_NAME = os.environ.get("ENDPOINT_DISPLAY_NAME", "llama-3-1-8b-instruct-deploy")
+ASYNC_MAX_CONCURRENCY = int(os.environ.get("ASYNC_MAX_CONCURRENCY", "64"))
+ASYNC_REQUEST_TIMEOUT = float(os.environ.get("ASYNC_REQUEST_TIMEOUT", "120"))
+# Point the client at a local mock server (see mock_predict_server.py)
+PREDICT_API_BASE = os.environ.get("PREDICT_API_BASE")
+
+
+class AsyncPredictClient:
+    """Asyncio client for the chatCompletions predict route of one endpoint.
+
+    All requests share one aiohttp session (one connection pool) and one set
+    of refreshed credentials. A semaphore bounds the number of requests in
+    flight, and every request has its own timeout.
+
+    Usage:
+        async with AsyncPredictClient(endpoint.resource_name) as client:
+            async for index, content, error in client.as_completed(prompts):
+                ...
+    """
+
+    def __init__(
+        self,
+        endpoint_resource_name: str,
+        location: str = LOCATION,
+        api_base: str = PREDICT_API_BASE,
+        max_concurrency: int = ASYNC_MAX_CONCURRENCY,
+        timeout: float = ASYNC_REQUEST_TIMEOUT,
+        credentials=None,
+        use_auth: bool = None,
+    ):
+        self.endpoint_resource_name = endpoint_resource_name
+        self.api_base = (api_base or f"https://{location}-aiplatform.googleapis.com").rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        # A mock server needs no token; the real API always does
+        self.use_auth = (api_base is None) if use_auth is None else use_auth
+        self._credentials = credentials
+        self._auth_lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = AsyncSingleFlight()
+        self._session = None
+
+    @classmethod
+    def from_display_name(cls, endpoint_display_name: str = ENDPOINT_DISPLAY_NAME, **kwargs):
+        """Resolve the endpoint through the cached resolver of the sync client.
+
+        Requests go to the same host as the sync client's: the endpoint's
+        dedicated DNS name if it has one, else the regional host. With a
+        mock server (api_base or PREDICT_API_BASE), nothing is resolved.
+        """
+        if kwargs.get("api_base", PREDICT_API_BASE):
+            return cls(mock_endpoint_name(endpoint_display_name), **kwargs)
+        from vertex_inference_online import endpoint_resolver
+
+        endpoint = endpoint_resolver.resolve(endpoint_display_name)
+        if not endpoint:
+            raise ValueError(f"Endpoint '{endpoint_display_name}' not found")
+        kwargs["api_base"] = endpoint_api_base(endpoint, kwargs.get("location", LOCATION))
+        kwargs.setdefault("use_auth", True)
+        return cls(endpoint.resource_name, **kwargs)
+
+    @property
+    def predict_url(self) -> str:
+        return f"{self.api_base}/v1/{self.endpoint_resource_name}:predict"
+
+    @property
+    def stream_url(self) -> str:
+        return f"{self.api_base}/v1/{self.endpoint_resource_name}:streamRawPredict"
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self._session = aiohttp.ClientSession(connector=connector)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _auth_headers(self) -> dict:
+        if not self.use_auth:
+            return {}
+        async with self._auth_lock:
+            if self._credentials is None:
+                from vertex_clients import get_credentials
+
+                self._credentials = get_credentials()
+            if not self._credentials.valid:
+                from google.auth.transport.requests import Request
+
+                # Token refresh is a blocking HTTP call; keep it off the event loop
+                await asyncio.to_thread(self._credentials.refresh, Request())
+            return {"Authorization": f"Bearer {self._credentials.token}"}
+
+    async def predict(self, instances: list, timeout: float = None) -> list:
+        """POST instances to the predict route and return the predictions list.
+
+        HTTP errors are raised as google.api_core exceptions (NotFound,
+        TooManyRequests, ServiceUnavailable, ...), the same types the sync
+        client raises; a request that runs out of time raises DeadlineExceeded.
+        """
+        await self.open()
+        headers = await self._auth_headers()
+        async with self._semaphore:
+            return await self._post(instances, headers, timeout or self.timeout)
+
+    async def _post(self, instances: list, headers: dict, timeout: float) -> list:
+        try:
+            async with self._session.post(
+                self.predict_url,
+                json={"instances": instances},
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=timeout),
+            ) as resp:
+                text = await resp.text()
+        except asyncio.TimeoutError:
+            raise api_exceptions.DeadlineExceeded(f"Request timed out after {timeout:g}s") from None
+        try:
+            body = json.loads(text) if text else {}
+        except ValueError:
+            # e.g. an HTML error page from a proxy; report the HTTP status instead
+            body = None
+        if resp.status >= 400:
+            error = body.get("error") if isinstance(body, dict) else None
+            message = error.get("message") if isinstance(error, dict) else (text[:500] or resp.reason)
+            raise api_exceptions.from_http_status(resp.status, message)
+        if not isinstance(body, dict):
+            raise api_exceptions.from_http_status(502, f"Response is not JSON: {text[:500]}")
+        return body.get("predictions", [])
+
+    async def chat_completion(
+        self,
+        messages: list,
+        max_tokens: int = 512,
+        temperature: float = 0.2,
+        top_p: float = 0.9,
+        timeout: float = None,
+        coalesce: bool = True,
+    ):
+        """Send one conversation and return the reply content.
+
+        With coalesce=True, concurrent identical deterministic requests
+        (temperature 0) share one predict call, as in the sync client.
+        """
+        instance = build_chat_instance(messages, max_tokens, temperature, top_p)
+        if coalesce and is_deterministic(instance):
+            key = cache_key(self.endpoint_resource_name, instance)
+            predictions = await self._in_flight.do(key, self.predict, [instance], timeout)
+        else:
+            predictions = await self.predict([instance], timeout=timeout)
+        if not predictions:
+            return None
+        content = extract_content(predictions[0])
+        return content if content is not None else str(predictions)
+
+    async def stream_chat_completion(
+        self,
+        messages: list,
+        max_tokens: int = 512,
+        temperature: float = 0.2,
+        top_p: float = 0.9,
+        timeout: float = None,
+    ):
+        """Async iterator over reply deltas from the streamRawPredict route.
+
+        ``timeout`` bounds the whole stream; the request counts against the
+        in-flight limit until the stream ends.
+        """
+        await self.open()
+        headers = await self._auth_headers()
+        headers["Accept"] = "text/event-stream"
+        body = build_chat_instance(messages, max_tokens, temperature, top_p)
+        body["stream"] = True
+
+        async with self._semaphore:
+            timeout = timeout or self.timeout
+            try:
+                async with self._session.post(
+                    self.stream_url, json=body, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)
+                ) as resp:
+                    if resp.status >= 400:
+                        raise api_exceptions.from_http_status(resp.status, await resp.text())
+                    parser = StreamParser()
+                    async for chunk in resp.content.iter_any():
+                        for delta in parser.feed(chunk):
+                            yield delta
+                        if parser.done:
+                            return
+                    for delta in parser.close():
+                        yield delta
+            except asyncio.TimeoutError:
+                raise api_exceptions.DeadlineExceeded(f"Stream timed out after {timeout:g}s") from None
+
+    async def as_completed(
+        self,
+        inputs,
+        max_tokens: int = 512,
+        temperature: float = 0.2,
+        top_p: float = 0.9,
+        timeout: float = None,
+    ):
+        """Yield (index, content, error) tuples as requests finish.
+
+        ``inputs`` is any iterable of prompt strings or message lists. It is
+        consumed lazily: at most ``max_concurrency`` requests are pending at
+        once, so large inputs do not create one task per item up front.
+        """
+        async def run(index, item):
+            try:
+                content = await self.chat_completion(
+                    as_messages(item), max_tokens, temperature, top_p, timeout
+                )
+                return index, content, None
+            except Exception as e:
+                return index, None, e
+
+        items = enumerate(inputs)
+        pending = set()
+        try:
+            while True:
+                for index, item in items:
+                    pending.add(asyncio.ensure_future(run(index, item)))
+                    if len(pending) >= self.max_concurrency:
+                        break
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+async def chat_completion_many(inputs, endpoint_display_name: str = ENDPOINT_DISPLAY_NAME, **kwargs):
+    """Run many conversations concurrently and return results in input order."""
+    inputs = list(inputs)
+    results = [None] * len(inputs)
+    async with AsyncPredictClient.from_display_name(endpoint_display_name) as client:
+        async for index, content, error in client.as_completed(inputs, **kwargs):
+            results[index] = {"index": index, "content": content, "error": str(error) if error else None}
+    return results
+
+
+async def _main():
+    prompts = [f"Give me fun fact #{i} about machine learning." for i in range(20)]
+
+    async with AsyncPredictClient.from_display_name(ENDPOINT_DISPLAY_NAME) as client:
+        async for index, content, error in client.as_completed(prompts, max_tokens=100):
+            if error:
+                print(f"  ✗ [{index}] {error}")
+            else:
+                print(f"  ✓ [{index}] {content}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
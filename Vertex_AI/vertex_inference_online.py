@@ -1,92 +1,261 @@
 import os
-from google.cloud import aiplatform
+import threading
+import time
+from collections import OrderedDict
+from google.api_core import exceptions as api_exceptions
 from dotenv import load_dotenv
 import json
+from vertex_clients import endpoint_api_base, get_authorized_session, init_vertex, mock_endpoint_name
+from chat_payload import MAX_PAYLOAD_BYTES, StreamParser, as_messages, build_chat_instance, extract_content, instance_size
+from response_cache import cache_key, is_deterministic, response_cache
+from single_flight import SingleFlight
+from resilience import HEDGE_DEFAULT_DELAY, PREDICT_RATE_LIMIT, AdaptiveRateLimiter, LatencyTracker, call_with_retry, hedged_call
+import _common  # noqa: F401  (puts the repository root on sys.path)
+from common.telemetry import log, telemetry
 
 load_dotenv()
 
-SA_FILE = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
-if not SA_FILE:
-    raise FileNotFoundError("GOOGLE_APPLICATION_CREDENTIALS environment variable not set")
-
+# Checked when the first cloud call is made (see vertex_clients), not at import
 PROJECT_ID = os.environ.get("PROJECT_ID")
-if not PROJECT_ID:
-    raise FileNotFoundError("PROJECT_ID environment variable not set")
 
 LOCATION = os.environ.get("LOCATION", "us-central1")
 ENDPOINT_DISPLAY_NAME = os.environ.get("ENDPOINT_DISPLAY_NAME", "llama-3-1-8b-instruct-deploy")
-
-aiplatform.init(project=PROJECT_ID, location=LOCATION)
+ENDPOINT_CACHE_TTL = float(os.environ.get("ENDPOINT_CACHE_TTL", "300"))
+ENDPOINT_CACHE_SIZE = int(os.environ.get("ENDPOINT_CACHE_SIZE", "32"))
+# Send streaming requests to a local mock server instead (see
+# mock_predict_server.py); no endpoint lookup or credentials are needed then
+PREDICT_API_BASE = os.environ.get("PREDICT_API_BASE")
+# Total time budget in seconds for one predict call, retries included (0 = none)
+PREDICT_DEADLINE = float(os.environ.get("PREDICT_DEADLINE", "0")) or None
+# Send a second, hedged request when the first is slower than the recent p95
+PREDICT_HEDGE = os.environ.get("PREDICT_HEDGE", "").lower() in ("1", "true", "yes")
 
 def get_endpoint(endpoint_display_name: str = ENDPOINT_DISPLAY_NAME):
     """Get endpoint by display name."""
+    init_vertex(PROJECT_ID, LOCATION)
+    from google.cloud import aiplatform
     try:
-        endpoints = aiplatform.Endpoint.list(
-            filter=f'display_name="{endpoint_display_name}"'
-        )
+        with telemetry.span("vertex.endpoint_list", endpoint=endpoint_display_name):
+            endpoints = aiplatform.Endpoint.list(
+                filter=f'display_name="{endpoint_display_name}"'
+            )
         
         if not endpoints:
-            print(f"✗ Endpoint '{endpoint_display_name}' not found")
+            log(f"✗ Endpoint '{endpoint_display_name}' not found")
             return None
         
-        print(f"✓ Found endpoint: {endpoints[0].resource_name}")
+        log(f"✓ Found endpoint: {endpoints[0].resource_name}")
         return endpoints[0]
         
     except Exception as e:
-        print(f"✗ Error retrieving endpoint: {e}")
+        log(f"✗ Error retrieving endpoint: {e}")
         raise
 
+
+class EndpointResolver:
+    """Thread-safe display name -> Endpoint cache with TTL and LRU eviction.
+
+    Resolving a display name costs an ``Endpoint.list`` control-plane call,
+    so the resolved ``Endpoint`` (which carries its resource name) is kept
+    for ``ttl`` seconds and reused by every predict call in the process.
+    """
+
+    def __init__(self, ttl: float = ENDPOINT_CACHE_TTL, max_size: int = ENDPOINT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._resolve_locks = {}
+
+    def _lookup(self, endpoint_display_name: str):
+        entry = self._entries.get(endpoint_display_name)
+        if entry is None:
+            return None
+        endpoint, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[endpoint_display_name]
+            return None
+        self._entries.move_to_end(endpoint_display_name)
+        return endpoint
+
+    def resolve(self, endpoint_display_name: str = ENDPOINT_DISPLAY_NAME):
+        """Return the cached endpoint, listing it only on a miss or expiry."""
+        with self._lock:
+            endpoint = self._lookup(endpoint_display_name)
+            if endpoint is not None:
+                return endpoint
+            resolve_lock = self._resolve_locks.setdefault(endpoint_display_name, threading.Lock())
+
+        # One thread lists the endpoint while concurrent callers wait for it
+        with resolve_lock:
+            with self._lock:
+                endpoint = self._lookup(endpoint_display_name)
+                if endpoint is not None:
+                    return endpoint
+
+            endpoint = get_endpoint(endpoint_display_name)
+            if endpoint is None:
+                return None
+
+            with self._lock:
+                self._entries[endpoint_display_name] = (endpoint, time.monotonic() + self.ttl)
+                self._entries.move_to_end(endpoint_display_name)
+                while len(self._entries) > self.max_size:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self._resolve_locks.pop(evicted, None)
+            return endpoint
+
+    def invalidate(self, endpoint_display_name: str):
+        """Drop a cached endpoint so the next call lists it again."""
+        with self._lock:
+            self._entries.pop(endpoint_display_name, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+endpoint_resolver = EndpointResolver()
+
+
+def _is_not_found(error: Exception) -> bool:
+    return isinstance(error, api_exceptions.NotFound) or getattr(error, "code", None) == 404
+
+
+predict_limiter = AdaptiveRateLimiter(PREDICT_RATE_LIMIT) if PREDICT_RATE_LIMIT > 0 else None
+predict_latency = LatencyTracker()
+
+
+def _predict_once(instances: list, endpoint_display_name: str, timeout: float = None):
+    """Run ``Endpoint.predict`` against the cached endpoint.
+
+    If the cached endpoint has been deleted or recreated, the predict call
+    fails with NotFound; the entry is invalidated and the call is retried
+    once against a freshly resolved endpoint.
+    """
+    endpoint = endpoint_resolver.resolve(endpoint_display_name)
+    if not endpoint:
+        raise ValueError(f"Endpoint '{endpoint_display_name}' not found")
+
+    start = time.monotonic()
+    try:
+        response = endpoint.predict(instances=instances, timeout=timeout)
+        predict_latency.record(time.monotonic() - start)
+        return response
+    except Exception as e:
+        if not _is_not_found(e):
+            raise
+        endpoint_resolver.invalidate(endpoint_display_name)
+
+    endpoint = endpoint_resolver.resolve(endpoint_display_name)
+    if not endpoint:
+        raise ValueError(f"Endpoint '{endpoint_display_name}' not found")
+    if timeout is not None:
+        timeout = max(0.0, timeout - (time.monotonic() - start))
+    return endpoint.predict(instances=instances, timeout=timeout)
+
+
+def predict_instances(
+    instances: list,
+    endpoint_display_name: str = ENDPOINT_DISPLAY_NAME,
+    deadline: float = PREDICT_DEADLINE,
+    hedge: bool = False
+):
+    """Run ``Endpoint.predict`` with retries, rate limiting and optional hedging.
+
+    Quota (429) and unavailable (503) errors are retried with exponential
+    backoff and jitter until ``deadline`` seconds have passed in total;
+    each attempt's RPC timeout is the time left. With PREDICT_RATE_LIMIT
+    set, calls pass through a token bucket that slows down on quota errors.
+    With hedge=True, a second request is sent if the first has not answered
+    within the recent p95 latency, and the first reply wins. Counters are
+    in ``resilience.metrics``.
+    """
+    def attempt(timeout):
+        if not hedge:
+            return _predict_once(instances, endpoint_display_name, timeout)
+        delay = predict_latency.percentile(95) or HEDGE_DEFAULT_DELAY
+        return hedged_call(
+            lambda: _predict_once(instances, endpoint_display_name, timeout), delay, limiter=predict_limiter
+        )
+
+    with telemetry.span("vertex.predict", endpoint=endpoint_display_name, instances=len(instances)):
+        return call_with_retry(attempt, deadline=deadline, limiter=predict_limiter)
+
+
+in_flight = SingleFlight()
+
+
+def _request_key(instance: dict, endpoint_display_name: str):
+    """Canonical key of a deterministic request, or None if replies may differ.
+
+    Only requests with this key may share a reply, from the response cache
+    or from an identical request already in flight.
+    """
+    if not is_deterministic(instance):
+        return None
+    return cache_key(f"{PROJECT_ID}/{LOCATION}/{endpoint_display_name}", instance)
+
+
+def _predict_coalesced(instances: list, endpoint_display_name: str, key: str = None, **kwargs):
+    """predict_instances, sharing one call among concurrent identical requests."""
+    if key is None:
+        return predict_instances(instances, endpoint_display_name, **kwargs)
+    return in_flight.do(key, predict_instances, instances, endpoint_display_name, **kwargs)
+
 def predict_text(
     prompt: str,
     endpoint_display_name: str = ENDPOINT_DISPLAY_NAME,
     max_tokens: int = 200,
     temperature: float = 0.2,
-    top_p: float = 0.9
+    top_p: float = 0.9,
+    use_cache: bool = False,
+    coalesce: bool = True,
+    deadline: float = PREDICT_DEADLINE,
+    hedge: bool = PREDICT_HEDGE
 ):
+    """Send one prompt and return the reply content.
+
+    With use_cache=True, replies to deterministic requests (temperature 0)
+    are served from the response cache when the same prompt and parameters
+    were sent to the same endpoint before. With coalesce=True (the default),
+    concurrent identical deterministic requests from other threads share a
+    single predict call. Sampled requests always get their own call.
+    deadline and hedge are passed to predict_instances.
+    """
     try:
-        endpoint = get_endpoint(endpoint_display_name)
-        if not endpoint:
-            raise ValueError(f"Endpoint '{endpoint_display_name}' not found")
-        
         # Prepare input using chatCompletions format
-        instances = [
-            {
-                "@requestFormat": "chatCompletions",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "max_tokens": max_tokens,
-                "temperature": temperature,
-                "top_p": top_p
-            }
-        ]
+        instances = [build_chat_instance(as_messages(prompt), max_tokens, temperature, top_p)]
+        
+        log(f"\nSending inference request...")
+        log(f"Prompt: {prompt}")
         
-        print(f"\nSending inference request...")
-        print(f"Prompt: {prompt}")
+        key = _request_key(instances[0], endpoint_display_name)
+        if use_cache and key is not None:
+            cached = response_cache.get(key)
+            if cached is not None:
+                log("✓ Served from response cache")
+                return cached
         
         # Make prediction
-        response = endpoint.predict(instances=instances)
+        response = _predict_coalesced(
+            instances, endpoint_display_name, key if coalesce else None, deadline=deadline, hedge=hedge
+        )
         
-        print(f"✓ Inference completed")
+        log(f"✓ Inference completed")
         
         # Extract predictions
         if hasattr(response, 'predictions') and response.predictions:
             predictions = response.predictions
-            print(f"\n🤖 Model Response:")
-            print(f"{'='*60}")
+            log(f"\n🤖 Model Response:")
+            log(f"{'='*60}")
             
             # Handle nested list structure: predictions[0][0]
             if isinstance(predictions, list) and len(predictions) > 0:
-                result = predictions[0]
-                if isinstance(result, list) and len(result) > 0:
-                    result = result[0]
-                
-                # Extract message content
-                if isinstance(result, dict) and 'message' in result:
-                    content = result['message'].get('content', '')
+                content = extract_content(predictions[0])
+                if content is not None:
+                    if use_cache and key is not None:
+                        response_cache.set(key, content)
                     return content
             
             return str(predictions)
@@ -94,7 +263,7 @@ def predict_text(
         return None
         
     except Exception as e:
-        print(f"✗ Error during inference: {e}")
+        log(f"✗ Error during inference: {e}")
         raise
 
 def chat_completion(
@@ -102,31 +271,36 @@ def chat_completion(
     endpoint_display_name: str = ENDPOINT_DISPLAY_NAME,
     max_tokens: int = 512,
     temperature: float = 0.2,
-    top_p: float = 0.9
+    top_p: float = 0.9,
+    use_cache: bool = False,
+    coalesce: bool = True,
+    deadline: float = PREDICT_DEADLINE,
+    hedge: bool = PREDICT_HEDGE
 ):
+    """Send a conversation and return the reply content (None on error).
+
+    use_cache, coalesce, deadline and hedge work as in predict_text.
+    """
     try:
-        endpoint = get_endpoint(endpoint_display_name)
-        if not endpoint:
-            raise ValueError(f"Endpoint '{endpoint_display_name}' not found")
-        
-        print(f"\n💬 Sending chat completion request...")
-        print(f"Messages: {len(messages)}")
+        log(f"\n💬 Sending chat completion request...")
+        log(f"Messages: {len(messages)}")
         
         # Prepare input using chatCompletions format
-        instances = [
-            {
-                "@requestFormat": "chatCompletions",
-                "messages": messages,
-                "max_tokens": max_tokens,
-                "temperature": temperature,
-                "top_p": top_p
-            }
-        ]
+        instances = [build_chat_instance(messages, max_tokens, temperature, top_p)]
+        
+        key = _request_key(instances[0], endpoint_display_name)
+        if use_cache and key is not None:
+            cached = response_cache.get(key)
+            if cached is not None:
+                log("✓ Served from response cache")
+                return cached
         
         # Make prediction
-        response = endpoint.predict(instances=instances)
+        response = _predict_coalesced(
+            instances, endpoint_display_name, key if coalesce else None, deadline=deadline, hedge=hedge
+        )
         
-        print(f"✓ Chat inference completed")
+        log(f"✓ Chat inference completed")
         
         # Extract predictions
         if hasattr(response, 'predictions') and response.predictions:
@@ -134,13 +308,10 @@ def chat_completion(
             
             # Handle nested list structure: predictions[0][0]
             if isinstance(predictions, list) and len(predictions) > 0:
-                result = predictions[0]
-                if isinstance(result, list) and len(result) > 0:
-                    result = result[0]
-                
-                # Extract message content
-                if isinstance(result, dict) and 'message' in result:
-                    content = result['message'].get('content', '')
+                content = extract_content(predictions[0])
+                if content is not None:
+                    if use_cache and key is not None:
+                        response_cache.set(key, content)
                     return content
             
             return str(predictions)
@@ -148,9 +319,161 @@ def chat_completion(
         return None
         
     except Exception as e:
-        print(f"✗ Error during chat inference: {e}")
+        log(f"✗ Error during chat inference: {e}")
         return None
 
+_mock_session = None
+
+
+def _stream_target(endpoint_display_name: str):
+    """(URL, session) for a streaming request to the endpoint, or to the mock server."""
+    global _mock_session
+    if PREDICT_API_BASE:
+        if _mock_session is None:
+            import requests
+
+            _mock_session = requests.Session()
+        url = f"{PREDICT_API_BASE.rstrip('/')}/v1/{mock_endpoint_name(endpoint_display_name)}:streamRawPredict"
+        return url, _mock_session
+    endpoint = endpoint_resolver.resolve(endpoint_display_name)
+    if not endpoint:
+        raise ValueError(f"Endpoint '{endpoint_display_name}' not found")
+    url = f"{endpoint_api_base(endpoint, LOCATION)}/v1/{endpoint.resource_name}:streamRawPredict"
+    return url, get_authorized_session()
+
+
+def stream_chat_completion(
+    messages: list,
+    endpoint_display_name: str = ENDPOINT_DISPLAY_NAME,
+    max_tokens: int = 512,
+    temperature: float = 0.2,
+    top_p: float = 0.9,
+    timeout: float = 300
+):
+    """Yield the reply content piece by piece as the model generates it.
+
+    Sends the chatCompletions request with ``stream: true`` to the
+    endpoint's streamRawPredict route, which the vLLM and TGI serving
+    containers answer with server-sent events. Deltas are yielded as soon as
+    each event is complete, so the first one arrives after the first token
+    instead of after the whole generation.
+    """
+    url, session = _stream_target(endpoint_display_name)
+    body = build_chat_instance(messages, max_tokens, temperature, top_p)
+    body["stream"] = True
+    with telemetry.span("vertex.stream_predict", endpoint=endpoint_display_name) as span, session.post(
+        url,
+        json=body,
+        headers={"Accept": "text/event-stream"},
+        stream=True,
+        timeout=timeout,
+    ) as resp:
+        if resp.status_code == 404:
+            endpoint_resolver.invalidate(endpoint_display_name)
+        if resp.status_code >= 400:
+            raise api_exceptions.from_http_status(resp.status_code, resp.text)
+
+        parser = StreamParser()
+        start = time.perf_counter()
+        for chunk in resp.iter_content(chunk_size=None):
+            if "ttft_s" not in span.attributes:
+                span.set(ttft_s=round(time.perf_counter() - start, 6))
+            span.add_bytes(len(chunk))
+            yield from parser.feed(chunk)
+            if parser.done:
+                return
+        yield from parser.close()
+
+
+def _pack_batches(instances: list, batch_size: int, max_payload_bytes: int):
+    """Group instance indexes into requests bounded by count and payload size.
+
+    Yields lists of indexes; an instance too large to send on its own is
+    yielded as a one-element list so the caller can report it.
+    """
+    batch, batch_bytes = [], 0
+    for index, instance in enumerate(instances):
+        size = instance_size(instance) + 1  # separating comma
+        if batch and (len(batch) >= batch_size or batch_bytes + size > max_payload_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(index)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def _predict_chunk(indexes: list, instances: list, results: list, endpoint_display_name: str):
+    """Predict one packed request and write a result for each of its inputs."""
+    try:
+        response = predict_instances([instances[i] for i in indexes], endpoint_display_name)
+        predictions = list(response.predictions or [])
+        if len(predictions) != len(indexes):
+            raise api_exceptions.InvalidArgument(
+                f"Expected {len(indexes)} predictions, got {len(predictions)}"
+            )
+    except Exception as e:
+        # A malformed instance fails the whole request; split it to isolate
+        # the bad input. Transient errors (quota, unavailable) have already
+        # been retried with backoff by predict_instances.
+        if len(indexes) > 1 and isinstance(e, (api_exceptions.InvalidArgument, api_exceptions.BadRequest)):
+            middle = len(indexes) // 2
+            _predict_chunk(indexes[:middle], instances, results, endpoint_display_name)
+            _predict_chunk(indexes[middle:], instances, results, endpoint_display_name)
+            return
+        for i in indexes:
+            results[i] = {"index": i, "content": None, "error": str(e)}
+        return
+
+    for i, prediction in zip(indexes, predictions):
+        content = extract_content(prediction)
+        results[i] = {
+            "index": i,
+            "content": content if content is not None else str(prediction),
+            "error": None,
+        }
+
+
+def predict_batch(
+    inputs: list,
+    endpoint_display_name: str = ENDPOINT_DISPLAY_NAME,
+    batch_size: int = 16,
+    max_payload_bytes: int = MAX_PAYLOAD_BYTES,
+    max_tokens: int = 512,
+    temperature: float = 0.2,
+    top_p: float = 0.9
+):
+    """Predict many prompts or conversations with multi-instance predict calls.
+
+    Each input is either a prompt string or a list of chat messages. Inputs
+    are packed into requests of at most ``batch_size`` instances and
+    ``max_payload_bytes`` bytes. Returns one dict per input, in input order:
+    ``{"index", "content", "error"}``; a failed item has ``content=None``
+    and the error message, and does not fail the rest of the batch.
+    """
+    instances = [
+        build_chat_instance(as_messages(item), max_tokens, temperature, top_p)
+        for item in inputs
+    ]
+    results = [None] * len(instances)
+
+    log(f"\n📦 Sending {len(instances)} instance(s) in batches of up to {batch_size}...")
+    request_count = 0
+    for indexes in _pack_batches(instances, batch_size, max_payload_bytes):
+        if len(indexes) == 1 and instance_size(instances[indexes[0]]) > max_payload_bytes:
+            results[indexes[0]] = {
+                "index": indexes[0],
+                "content": None,
+                "error": f"Instance exceeds max payload size of {max_payload_bytes} bytes",
+            }
+            continue
+        _predict_chunk(indexes, instances, results, endpoint_display_name)
+        request_count += 1
+
+    failed = sum(1 for r in results if r["error"])
+    log(f"✓ Batch inference completed: {len(results) - failed} succeeded, {failed} failed ({request_count} request(s))")
+    return results
+
 if __name__ == "__main__":
     # Example 1: Simple text prediction
     print("\n" + "="*60)
@@ -174,3 +497,25 @@ if __name__ == "__main__":
     response = chat_completion(messages, max_tokens=100)
     if response:
         print(response)
+    
+    # Example 3: Many prompts packed into a few predict calls
+    print("\n" + "="*60)
+    print("EXAMPLE 3: Batch Prediction")
+    print("="*60)
+    
+    prompts = [
+        "What is machine learning?",
+        "What is a neural network?",
+        [{"role": "user", "content": "Explain overfitting in one sentence."}],
+    ]
+    for result in predict_batch(prompts, max_tokens=100):
+        print(f"[{result['index']}] {result['error'] or result['content']}")
+    
+    # Example 4: Stream the reply as it is generated
+    print("\n" + "="*60)
+    print("EXAMPLE 4: Streaming Chat Completion")
+    print("="*60)
+    
+    for delta in stream_chat_completion(messages, max_tokens=100):
+        print(delta, end="", flush=True)
+    print()
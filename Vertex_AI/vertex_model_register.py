@@ -1,55 +1,372 @@
 import os
-from google.cloud import aiplatform
+import json
+import time
 from dotenv import load_dotenv
+from vertex_clients import get_model_service_client, init_vertex
+import _common  # noqa: F401  (puts the repository root on sys.path)
+from common.telemetry import log, telemetry
 load_dotenv()
 
-SA_FILE = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
-if not SA_FILE:
-    raise FileNotFoundError("GOOGLE_APPLICATION_CREDENTIALS environment variable not set")
-
+# Checked when the first cloud call is made (see vertex_clients), not at import
 PROJECT_ID = os.environ.get("PROJECT_ID")
-if not PROJECT_ID:
-    raise FileNotFoundError("PROJECT_ID environment variable not set")
 
 LOCATION = os.environ.get("LOCATION", "us-central1")
 DELETE_MODEL_ID = os.environ.get("DELETE_MODEL_ID", "meta-llama3_1-llama-3-1-8b-instruct-1770181322")
+# Where register_models keeps the uploads it submitted, so a rerun can reattach
+REGISTER_STATE_FILE = os.environ.get("REGISTER_STATE_FILE", "model_registrations.json")
+REGISTER_POLL_INTERVAL = float(os.environ.get("REGISTER_POLL_INTERVAL", "15"))
+# Uploads/deletes running at once (Vertex AI limits concurrent operations per project)
+REGISTER_MAX_IN_FLIGHT = int(os.environ.get("REGISTER_MAX_IN_FLIGHT", "10"))
 
-def model_register(display_name, artifact_uri, serving_container_image_uri, description):
+SPEC_FIELDS = ("display_name", "artifact_uri", "serving_container_image_uri", "description")
 
-    aiplatform.init(
-        project=PROJECT_ID,
-        location=LOCATION
-    )
+def model_register(display_name, artifact_uri, serving_container_image_uri, description, parent_model=None):
+    """Register one model and wait for it; with parent_model, as a new version of that model."""
 
-    model = aiplatform.Model.upload(
-        display_name=display_name,
-        artifact_uri=artifact_uri,
-        serving_container_image_uri=serving_container_image_uri,
-        # serving_container_ports=[7080],
-        # serving_container_predict_route="/predict",
-        # serving_container_health_route="/health",
-        description=description
-    )
+    init_vertex(PROJECT_ID, LOCATION)
+    from google.cloud import aiplatform
+
+    with telemetry.span("vertex.model_upload", model=display_name):
+        model = aiplatform.Model.upload(
+            display_name=display_name,
+            artifact_uri=artifact_uri,
+            serving_container_image_uri=serving_container_image_uri,
+            # serving_container_ports=[7080],
+            # serving_container_predict_route="/predict",
+            # serving_container_health_route="/health",
+            description=description,
+            parent_model=parent_model,
+        )
 
-    print("Model registered:", model.resource_name)
-    print("Model ID:", model.name.split("/")[-1])
+    log("Model registered:", model.resource_name)
+    log("Model ID:", model.name.split("/")[-1])
+    if parent_model:
+        log("Model version:", model.version_id)
 
 def model_delete(model_id):
 
-    aiplatform.init(project=PROJECT_ID, location=LOCATION)
+    init_vertex(PROJECT_ID, LOCATION)
+    from google.cloud import aiplatform
 
     try:
-        print(f"Deleting model with ID: {model_id}...")
+        log(f"Deleting model with ID: {model_id}...")
         model = aiplatform.Model(model_id)
         
-        model.delete()
+        with telemetry.span("vertex.model_delete", model=model_id):
+            model.delete()
         
-        print(f"✓ Model {model_id} deleted successfully!")
+        log(f"✓ Model {model_id} deleted successfully!")
         
     except Exception as e:
-        print(f"✗ Error deleting model: {e}")
+        log(f"✗ Error deleting model: {e}")
         raise
 
+
+def _parent() -> str:
+    return f"projects/{PROJECT_ID}/locations/{LOCATION}"
+
+
+def _model_resource_name(model_id: str) -> str:
+    return model_id if "/" in model_id else f"{_parent()}/models/{model_id}"
+
+
+def _as_spec(spec) -> dict:
+    """A registration spec as a dict, from a dict or a (display_name, artifact_uri, image[, description]) tuple."""
+    spec = dict(spec) if isinstance(spec, dict) else dict(zip(SPEC_FIELDS, spec))
+    missing = [field for field in SPEC_FIELDS[:3] if not spec.get(field)]
+    if missing:
+        raise ValueError(f"Registration spec {spec} is missing {', '.join(missing)}")
+    return spec
+
+
+def load_specs(path: str, serving_container_image_uri: str = None) -> list:
+    """Read registration specs from a JSONL file, one object per line.
+
+    Lines without serving_container_image_uri use the one given here.
+    """
+    specs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                spec = json.loads(line)
+                if serving_container_image_uri:
+                    spec.setdefault("serving_container_image_uri", serving_container_image_uri)
+                specs.append(_as_spec(spec))
+    return specs
+
+
+def _load_state(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_state(path: str, state: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _upload_request(spec: dict, parent_model: str = None):
+    from google.cloud.aiplatform_v1 import types
+
+    model = types.Model(
+        display_name=spec["display_name"],
+        artifact_uri=spec["artifact_uri"],
+        description=spec.get("description") or "",
+        container_spec=types.ModelContainerSpec(image_uri=spec["serving_container_image_uri"]),
+        version_aliases=spec.get("version_aliases") or [],
+        version_description=spec.get("version_description") or "",
+        labels=spec.get("labels") or {},
+    )
+    return types.UploadModelRequest(parent=_parent(), model=model, parent_model=parent_model or "")
+
+
+def _reattach_upload(client, operation_name: str):
+    """The upload operation with this name, as returned by upload_model when it was submitted."""
+    from google.api_core import operation as ga_operation
+    from google.cloud.aiplatform_v1 import types
+
+    operations_client = client.transport.operations_client
+    return ga_operation.from_gapic(
+        operations_client.get_operation(operation_name),
+        operations_client,
+        types.UploadModelResponse,
+        metadata_type=types.UploadModelOperationMetadata,
+    )
+
+
+def _latest_models_by_name(client) -> dict:
+    """Resource name of the most recently updated model per display name, in one list call."""
+    latest = {}
+    for model in client.list_models(parent=_parent()):
+        current = latest.get(model.display_name)
+        if current is None or model.update_time > current.update_time:
+            latest[model.display_name] = model
+    return {name: model.name for name, model in latest.items()}
+
+
+def _run_model_operations(
+    queues: dict,
+    poll_interval: float = REGISTER_POLL_INTERVAL,
+    max_in_flight: int = REGISTER_MAX_IN_FLIGHT,
+) -> list:
+    """Run per-group step queues concurrently and return one result row per step.
+
+    queues maps a group (a model, or the model new versions go to) to a
+    list of (action, name, submit, on_done, on_failed) steps. submit()
+    starts a long-running operation and returns it, or returns None when
+    there is nothing to do; on_done(result) returns what to show as the
+    step's result and on_failed(error) is called when the step fails.
+    Steps of a group run one after another and a failed step does not stop
+    the rest; at most max_in_flight operations run at once, all waited on
+    by one poller.
+
+    Each step is recorded as the telemetry spans vertex.model_<action>.submit
+    and vertex.model_<action>.wait (up to poll_interval late).
+    """
+    rows = []
+    running = {}
+    queues = {group: list(steps) for group, steps in queues.items()}
+
+    def start_next(group):
+        while queues[group]:
+            action, name, submit, on_done, on_failed = queues[group].pop(0)
+            row = {"action": action, "model": name, "status": "running", "seconds": 0.0, "result": None, "error": None}
+            rows.append(row)
+            started = time.monotonic()
+            try:
+                with telemetry.span(f"vertex.model_{action}.submit", model=name):
+                    operation = submit()
+            except Exception as e:
+                row.update(status="failed", error=str(e))
+                log(f"  ✗ {action} {name} failed: {e}")
+                on_failed(e)
+                continue
+            if operation is None:
+                row["status"] = "unchanged"
+                continue
+            log(f"  → {action} {name} submitted")
+            running[group] = (operation, row, started, time.monotonic(), on_done, on_failed)
+            return
+
+    def fill():
+        for group in queues:
+            if len(running) >= max_in_flight:
+                return
+            if group not in running:
+                start_next(group)
+
+    fill()
+    while running:
+        time.sleep(poll_interval)
+        for group, (operation, row, started, submitted, on_done, on_failed) in list(running.items()):
+            if not operation.done():
+                continue
+            del running[group]
+            row["seconds"] = time.monotonic() - started
+            error = operation.exception()
+            telemetry.record(
+                f"vertex.model_{row['action']}.wait", time.monotonic() - submitted,
+                error=str(error) if error is not None else None, model=row["model"],
+            )
+            if error is not None:
+                row.update(status="failed", error=str(error))
+                log(f"  ✗ {row['action']} {row['model']} failed: {error}")
+                on_failed(error)
+            else:
+                row.update(status="done", result=on_done(operation.result()))
+                log(f"  ✓ {row['action']} {row['model']} done in {row['seconds'] / 60:.1f} min")
+        fill()
+    return rows
+
+
+def print_model_results(rows: list):
+    log(f"\n{'ACTION':<8} {'MODEL':<40} {'STATUS':<10} {'MINUTES':>7}  RESULT")
+    for row in rows:
+        log(
+            f"{row['action']:<8} {row['model']:<40} {row['status']:<10} {row['seconds'] / 60:>7.1f}  "
+            + (row["result"] or "-")
+            + (f"  {row['error']}" if row["error"] else "")
+        )
+
+
+def register_models(
+    specs: list,
+    versions: bool = False,
+    state_path: str = REGISTER_STATE_FILE,
+    poll_interval: float = REGISTER_POLL_INTERVAL,
+    max_in_flight: int = REGISTER_MAX_IN_FLIGHT,
+) -> list:
+    """Register many models at once without waiting on each upload.
+
+    specs are (display_name, artifact_uri, serving_container_image_uri[,
+    description]) tuples or dicts with those keys and optionally
+    parent_model (model ID or resource name to add a version to),
+    version_aliases, version_description and labels. With versions=True, a
+    spec without parent_model becomes a new version of the latest model
+    with the same display name, if there is one.
+
+    Uploads for the same parent model (or, with versions=True, the same
+    display name) run one after another so each version lands on the model
+    the first one created; the others run concurrently, up to max_in_flight
+    at a time, with one poller waiting on all of them.
+
+    Every upload is saved to state_path as it is submitted and finishes.
+    Rerunning with the same file skips finished uploads, reattaches to ones
+    still running (e.g. after the process was killed) and retries failed
+    ones. Returns one result row per spec; the result is MODEL_ID@VERSION.
+    """
+    init_vertex(PROJECT_ID, LOCATION)
+    client = get_model_service_client(LOCATION)
+    specs = [_as_spec(spec) for spec in specs]
+    state = _load_state(state_path)
+    existing = _latest_models_by_name(client) if versions and any(not spec.get("parent_model") for spec in specs) else {}
+    parents = {}
+    queues = {}
+    rows = []
+
+    def upload_step(key, group, spec):
+        def submit():
+            entry = state.get(key)
+            if entry and entry.get("status") == "running":
+                try:
+                    operation = _reattach_upload(client, entry["operation"])
+                    log(f"  ↻ Reattached to upload of {spec['display_name']}")
+                    return operation
+                except Exception as e:
+                    log(f"  ✗ Could not reattach to {entry['operation']} ({e}), uploading again")
+            operation = client.upload_model(request=_upload_request(spec, parents.get(group)))
+            state[key] = {
+                "display_name": spec["display_name"],
+                "artifact_uri": spec["artifact_uri"],
+                "parent_model": parents.get(group),
+                "operation": operation.operation.name,
+                "status": "running",
+            }
+            _save_state(state_path, state)
+            return operation
+
+        def on_done(response):
+            parents.setdefault(group, response.model)
+            state[key].update(status="done", model=response.model, version_id=response.model_version_id)
+            _save_state(state_path, state)
+            return f"{response.model.split('/')[-1]}@{response.model_version_id}"
+
+        def on_failed(error):
+            if key in state:
+                state[key].update(status="failed", error=str(error))
+                _save_state(state_path, state)
+        return submit, on_done, on_failed
+
+    for spec in specs:
+        key = f"{spec['display_name']}|{spec['artifact_uri']}"
+        if spec.get("parent_model"):
+            group = _model_resource_name(spec["parent_model"])
+            parents[group] = group
+        elif versions:
+            group = spec["display_name"]
+            if group in existing:
+                parents[group] = existing[group]
+        else:
+            group = key
+        entry = state.get(key)
+        if entry and entry.get("status") == "done":
+            # Finished in an earlier run; later versions in the group still chain onto its model
+            parents.setdefault(group, entry["model"])
+            rows.append({
+                "action": "upload", "model": spec["display_name"], "status": "unchanged", "seconds": 0.0,
+                "result": f"{entry['model'].split('/')[-1]}@{entry['version_id']}", "error": None,
+            })
+            continue
+        queues.setdefault(group, []).append(("upload", spec["display_name"], *upload_step(key, group, spec)))
+
+    log(f"Registering {len(specs)} model(s), {len(rows)} already registered...")
+    rows += _run_model_operations(queues, poll_interval, max_in_flight)
+    print_model_results(rows)
+    return rows
+
+
+def delete_models(
+    model_ids: list,
+    poll_interval: float = REGISTER_POLL_INTERVAL,
+    max_in_flight: int = REGISTER_MAX_IN_FLIGHT,
+) -> list:
+    """Delete many models, or single versions given as "MODEL_ID@VERSION", at once.
+
+    Deletes of the same model run one after another, the others
+    concurrently with one poller. Models that no longer exist are reported
+    as unchanged. Returns one result row per ID.
+    """
+    init_vertex(PROJECT_ID, LOCATION)
+    from google.api_core import exceptions as api_exceptions
+
+    client = get_model_service_client(LOCATION)
+    queues = {}
+
+    def delete_step(model_id):
+        name = _model_resource_name(model_id)
+
+        def submit():
+            try:
+                if "@" in name:
+                    return client.delete_model_version(name=name)
+                return client.delete_model(name=name)
+            except api_exceptions.NotFound:
+                return None
+        return submit, lambda result: None, lambda error: None
+
+    for model_id in model_ids:
+        queues.setdefault(model_id.split("@")[0], []).append(("delete", model_id, *delete_step(model_id)))
+
+    log(f"Deleting {len(model_ids)} model(s)...")
+    rows = _run_model_operations(queues, poll_interval, max_in_flight)
+    print_model_results(rows)
+    return rows
+
+
 if __name__ == "__main__":
     # model_register(
     #     display_name="qwen-2.5-3b-instruct",
@@ -58,4 +375,8 @@ if __name__ == "__main__":
     #     description="Qwen 2.5 3B Instruct model"
     # )
 
-    model_delete(model_id=DELETE_MODEL_ID)
\ No newline at end of file
+    # Many checkpoints at once, each as a new version of the model with the same name:
+    # register_models(load_specs("checkpoints.jsonl", serving_container_image_uri="..."), versions=True)
+    # delete_models(["1234567890", "9876543210@3"])
+
+    model_delete(model_id=DELETE_MODEL_ID)
@@ -0,0 +1,311 @@
+# One entry point for the whole toolkit:
+#
+#   python cli.py hf --snapshot Qwen/Qwen2.5-3B-Instruct --local-dir models --reshard 2GB
+#   python cli.py upload models/qwen2.5-3b-instruct
+#   python cli.py register qwen-2.5-3b-instruct gs://my-bucket/qwen2.5-3b-instruct --image IMAGE_URI
+#   python cli.py register-batch checkpoints.jsonl --image IMAGE_URI --versions
+#   python cli.py deploy --model-id 1234567890 --profile standard --reconcile
+#   python cli.py predict "What is machine learning?"
+#   python cli.py bench --mock --requests 200
+#   python cli.py startup-check
+#
+# Only the script a command needs is imported, after the command line has
+# been parsed, so --help and short jobs do not pay for the Google client
+# libraries they never use.
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+FOLDERS = ("Vertex_AI", "GCS", "HF")
+
+# Seconds a module may take to import in a fresh interpreter (startup-check)
+IMPORT_TIME_BUDGET = float(os.environ.get("IMPORT_TIME_BUDGET", "0.5"))
+STARTUP_MODULES = (
+    "chat_payload",
+    "common.telemetry",
+    "resilience",
+    "vertex_clients",
+    "vertex_inference_online",
+    "endpoint_router",
+    "vertex_deployment",
+    "vertex_model_register",
+    "vertex_batch_predict",
+    "common.storage_clients",
+    "gcs",
+    "gcs_operations",
+    "hf",
+)
+
+
+def _add_folders_to_path():
+    for folder in reversed(FOLDERS):
+        path = os.path.join(ROOT, folder)
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+def cmd_hf(args):
+    import hf
+
+    hf.main(args.rest)
+
+
+def cmd_upload(args):
+    import gcs
+
+    if args.sync:
+        gcs.sync_model_directory(
+            args.model_dir, args.bucket or gcs.BUCKET_NAME,
+            delete_orphans=args.delete_orphans, dry_run=args.dry_run, max_workers=args.workers,
+        )
+    else:
+        gcs.upload_model_directory_parallel(args.model_dir, args.bucket or gcs.BUCKET_NAME, max_workers=args.workers)
+
+
+def cmd_download(args):
+    import gcs_operations
+
+    gcs_operations.download_model_parallel(
+        args.local_dir, prefix=args.prefix, max_workers=args.workers, use_cache=args.cached_listing,
+    )
+
+
+def cmd_register(args):
+    import vertex_model_register
+
+    vertex_model_register.model_register(
+        args.display_name, args.artifact_uri, args.image, args.description, parent_model=args.parent_model,
+    )
+
+
+def cmd_register_batch(args):
+    import vertex_model_register
+
+    specs = vertex_model_register.load_specs(args.specs, serving_container_image_uri=args.image)
+    vertex_model_register.register_models(
+        specs, versions=args.versions, state_path=args.state, max_in_flight=args.max_in_flight,
+    )
+
+
+def cmd_delete_models(args):
+    import vertex_model_register
+
+    vertex_model_register.delete_models(args.model_ids, max_in_flight=args.max_in_flight)
+
+
+def cmd_deploy(args):
+    import vertex_deployment
+
+    vertex_deployment.deploy_registered_model(
+        model_id=args.model_id or vertex_deployment.MODEL_ID,
+        endpoint_display_name=args.endpoint or vertex_deployment.ENDPOINT_DISPLAY_NAME,
+        machine_type=args.machine_type,
+        accelerator_type=args.accelerator_type,
+        accelerator_count=args.accelerator_count,
+        min_replica_count=args.min_replicas,
+        max_replica_count=args.max_replicas,
+        reconcile=args.reconcile,
+        profile=args.profile,
+    )
+
+
+def cmd_undeploy(args):
+    import vertex_deployment
+
+    endpoint = args.endpoint or vertex_deployment.ENDPOINT_DISPLAY_NAME
+    if args.model_name:
+        vertex_deployment.undeploy_model_by_name(endpoint, args.model_name)
+    if args.delete_endpoint:
+        vertex_deployment.delete_endpoint(endpoint)
+
+
+def cmd_predict(args):
+    import vertex_inference_online
+
+    endpoint = args.endpoint or vertex_inference_online.ENDPOINT_DISPLAY_NAME
+    messages = vertex_inference_online.as_messages(args.prompt)
+    if args.stream:
+        for piece in vertex_inference_online.stream_chat_completion(
+            messages, endpoint, max_tokens=args.max_tokens, temperature=args.temperature,
+        ):
+            print(piece, end="", flush=True)
+        print()
+        return
+    reply = vertex_inference_online.chat_completion(
+        messages, endpoint, max_tokens=args.max_tokens, temperature=args.temperature, use_cache=args.cache,
+    )
+    if reply is None:
+        sys.exit(1)
+    print(reply)
+
+
+def cmd_batch(args):
+    import vertex_batch_predict
+
+    vertex_batch_predict.main(args.rest)
+
+
+def cmd_bench(args):
+    import vertex_benchmark
+
+    vertex_benchmark.main(args.rest)
+
+
+def measure_import_time(module: str, runs: int = 3) -> float:
+    """Best-of-runs seconds to import module in a fresh interpreter, without cloud settings."""
+    env = {k: v for k, v in os.environ.items() if k not in ("GOOGLE_APPLICATION_CREDENTIALS", "PROJECT_ID", "BUCKET")}
+    code = (
+        "import sys, time; "
+        f"sys.path[:0] = {[os.path.join(ROOT, folder) for folder in FOLDERS]!r}; "
+        f"start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    )
+    best = None
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+        elapsed = float(result.stdout.strip().splitlines()[-1])
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def cmd_startup_check(args):
+    """Fail (exit 1) if any module imports slower than the budget or needs settings to import."""
+    failures = 0
+    for module in args.modules or STARTUP_MODULES:
+        try:
+            elapsed = measure_import_time(module, args.runs)
+        except RuntimeError as e:
+            failures += 1
+            print(f"✗ {module:<26} failed to import: {e}")
+            continue
+        ok = elapsed <= args.budget
+        failures += not ok
+        print(f"{'✓' if ok else '✗'} {module:<26} {elapsed:.3f}s")
+    if failures:
+        print(f"✗ {failures} module(s) over the {args.budget:.2f}s import budget or failing")
+        sys.exit(1)
+    print(f"✓ All modules import within {args.budget:.2f}s")
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Download, store, register, deploy and query models")
+    parser.add_argument("--quiet", action="store_true", help="hide progress messages")
+    parser.add_argument("--timings", action="store_true", help="print where the time went at the end")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    # Commands that already have their own command line get the rest of the arguments as is
+    for name, func, help_text in (
+        ("hf", cmd_hf, "download or stage a model from Hugging Face (HF/hf.py options)"),
+        ("batch", cmd_batch, "batch prediction from a JSONL file (vertex_batch_predict.py options)"),
+        ("bench", cmd_bench, "benchmark an endpoint (vertex_benchmark.py options)"),
+    ):
+        command = commands.add_parser(name, help=help_text, add_help=False)
+        command.set_defaults(func=func, passthrough=True)
+
+    upload = commands.add_parser("upload", help="upload a model folder to Cloud Storage")
+    upload.add_argument("model_dir", nargs="?", default=os.environ.get("MODEL_DIR", "qwen2.5-3b-instruct"))
+    upload.add_argument("--bucket", help="bucket name (default: BUCKET)")
+    upload.add_argument("--workers", type=int, default=int(os.environ.get("UPLOAD_WORKERS", "8")))
+    upload.add_argument("--sync", action="store_true", help="only upload files that changed")
+    upload.add_argument("--delete-orphans", action="store_true", help="with --sync, delete remote files that no longer exist locally")
+    upload.add_argument("--dry-run", action="store_true", help="with --sync, only show what would change")
+    upload.set_defaults(func=cmd_upload)
+
+    download = commands.add_parser("download", help="download a model from Cloud Storage")
+    download.add_argument("--prefix", help="only blobs under this prefix, e.g. the model folder")
+    download.add_argument("--local-dir", default=os.environ.get("DOWNLOAD_DIR", "downloaded_model"))
+    download.add_argument("--workers", type=int, default=int(os.environ.get("DOWNLOAD_WORKERS", "8")))
+    download.add_argument(
+        "--cached-listing",
+        action="store_true",
+        help="reuse this machine's bucket listing from the last LIST_CACHE_TTL seconds "
+        "(files uploaded since by other machines or hf.py are not seen)",
+    )
+    download.set_defaults(func=cmd_download)
+
+    register = commands.add_parser("register", help="register a model in Vertex AI")
+    register.add_argument("display_name")
+    register.add_argument("artifact_uri", help="gs:// folder with the model files")
+    register.add_argument("--image", required=True, help="serving container image URI")
+    register.add_argument("--description", default="")
+    register.add_argument("--parent-model", help="add the model as a new version of this model ID")
+    register.set_defaults(func=cmd_register)
+
+    register_batch = commands.add_parser("register-batch", help="register many models at once from a JSONL file")
+    register_batch.add_argument("specs", help="JSONL file, one {display_name, artifact_uri, ...} per line")
+    register_batch.add_argument("--image", help="serving container image URI for lines that have none")
+    register_batch.add_argument("--versions", action="store_true", help="add each model as a new version of the model with the same name")
+    register_batch.add_argument("--state", default=os.environ.get("REGISTER_STATE_FILE", "model_registrations.json"),
+                                help="file that remembers submitted uploads, so a rerun picks up where it left off")
+    register_batch.add_argument("--max-in-flight", type=int, default=int(os.environ.get("REGISTER_MAX_IN_FLIGHT", "10")))
+    register_batch.set_defaults(func=cmd_register_batch)
+
+    delete_models = commands.add_parser("delete-models", help="delete many models (or MODEL_ID@VERSION versions) at once")
+    delete_models.add_argument("model_ids", nargs="+")
+    delete_models.add_argument("--max-in-flight", type=int, default=int(os.environ.get("REGISTER_MAX_IN_FLIGHT", "10")))
+    delete_models.set_defaults(func=cmd_delete_models)
+
+    deploy = commands.add_parser("deploy", help="deploy a registered model to an endpoint")
+    deploy.add_argument("--model-id", help="registered model ID (default: MODEL_ID)")
+    deploy.add_argument("--endpoint", help="endpoint display name (default: ENDPOINT_DISPLAY_NAME)")
+    deploy.add_argument("--machine-type", default="g2-standard-12")
+    deploy.add_argument("--accelerator-type", default="NVIDIA_L4")
+    deploy.add_argument("--accelerator-count", type=int, default=1)
+    deploy.add_argument("--min-replicas", type=int)
+    deploy.add_argument("--max-replicas", type=int)
+    deploy.add_argument("--profile", help="deployment profile, e.g. dev, standard, burst")
+    deploy.add_argument("--reconcile", action="store_true", help="reuse the endpoint and change only what differs")
+    deploy.set_defaults(func=cmd_deploy)
+
+    undeploy = commands.add_parser("undeploy", help="undeploy a model and/or delete its endpoint")
+    undeploy.add_argument("--endpoint", help="endpoint display name (default: ENDPOINT_DISPLAY_NAME)")
+    undeploy.add_argument("--model-name", help="display name of the deployed model to remove")
+    undeploy.add_argument("--delete-endpoint", action="store_true")
+    undeploy.set_defaults(func=cmd_undeploy)
+
+    predict = commands.add_parser("predict", help="send one prompt to an endpoint")
+    predict.add_argument("prompt")
+    predict.add_argument("--endpoint", help="endpoint display name (default: ENDPOINT_DISPLAY_NAME)")
+    predict.add_argument("--max-tokens", type=int, default=512)
+    predict.add_argument("--temperature", type=float, default=0.2)
+    predict.add_argument("--stream", action="store_true", help="print the reply as it is generated")
+    predict.add_argument("--cache", action="store_true", help="use the response cache (temperature 0 only)")
+    predict.set_defaults(func=cmd_predict)
+
+    check = commands.add_parser("startup-check", help="check that every module imports within a time budget")
+    check.add_argument("--budget", type=float, default=IMPORT_TIME_BUDGET, help="seconds per module")
+    check.add_argument("--runs", type=int, default=3, help="imports per module; the fastest counts")
+    check.add_argument("modules", nargs="*", help=f"modules to check (default: {', '.join(STARTUP_MODULES)})")
+    check.set_defaults(func=cmd_startup_check)
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args, extra = parser.parse_known_args(argv)
+    if getattr(args, "passthrough", False):
+        args.rest = argv[argv.index(args.command) + 1:]
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    return args
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    if args.quiet:
+        os.environ["QUIET"] = "1"
+    _add_folders_to_path()
+    start = time.perf_counter()
+    try:
+        args.func(args)
+    finally:
+        if args.timings:
+            if "common.telemetry" in sys.modules:
+                sys.modules["common.telemetry"].telemetry.print_summary()
+            print(f"Total: {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# Code shared by the GCS, Vertex_AI and HF folders. Scripts in those folders
+# import _common first, which puts the repository root on sys.path.
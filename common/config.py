@@ -0,0 +1,12 @@
+import os
+
+
+def require_env(*names):
+    """Raise FileNotFoundError for the first of these environment variables that is not set.
+
+    Settings are checked when a cloud call is first made rather than at
+    import time.
+    """
+    for name in names:
+        if not os.environ.get(name):
+            raise FileNotFoundError(f"{name} environment variable not set")
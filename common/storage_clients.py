@@ -0,0 +1,57 @@
+import os
+import threading
+
+# google.cloud.storage is imported on first use, so importing these scripts
+# stays fast and works without credentials.
+
+# Connections kept open per client; raise it for high-concurrency transfers
+STORAGE_POOL_SIZE = int(os.environ.get("STORAGE_POOL_SIZE", "32"))
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _pooled_session(credentials, pool_size: int):
+    from google.auth.transport.requests import AuthorizedSession
+    from requests.adapters import HTTPAdapter
+
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_storage_client(project: str = None, pool_size: int = STORAGE_POOL_SIZE):
+    """Return the process-wide storage.Client for a project, creating it on first use.
+
+    Each client owns one authenticated HTTP session with a connection pool
+    of pool_size, shared by every thread that uses it, so credentials and
+    open connections survive across calls. The default urllib3 pool (10
+    connections) is too small for the parallel upload/download helpers and
+    makes extra threads open and drop connections.
+    """
+    key = (project, pool_size)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    import google.auth
+    from google.cloud import storage
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            credentials, default_project = google.auth.default(scopes=storage.Client.SCOPE)
+            client = storage.Client(
+                project=project or default_project,
+                credentials=credentials,
+                _http=_pooled_session(credentials, pool_size),
+            )
+            _clients[key] = client
+        return client
+
+
+def clear_storage_clients():
+    """Forget all cached clients, e.g. after credentials change or a fork."""
+    with _lock:
+        _clients.clear()
@@ -0,0 +1,322 @@
+import os
+import json
+import time
+import atexit
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+# Shared by the GCS, Vertex_AI and HF scripts, so every folder records and
+# reports operations the same way.
+
+# Where finished spans go, comma separated: "json", "prometheus", "otel", "console"
+TELEMETRY_SINKS = os.environ.get("TELEMETRY_SINKS", "")
+TELEMETRY_JSON_PATH = os.environ.get("TELEMETRY_JSON_PATH", "telemetry.jsonl")
+# Prometheus text file, e.g. for node_exporter's textfile collector
+TELEMETRY_PROM_PATH = os.environ.get("TELEMETRY_PROM_PATH", "telemetry.prom")
+# Silences progress output ("✓ Uploaded ...") from the scripts
+QUIET = os.environ.get("QUIET", "").lower() in ("1", "true", "yes")
+
+PROM_PREFIX = "model_ops"
+PROM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 1800, float("inf"))
+# Durations kept per operation for the percentiles in the summary
+SUMMARY_WINDOW = 1000
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def log(*args, **kwargs):
+    """print() unless QUIET is set."""
+    if not QUIET:
+        print(*args, **kwargs)
+
+
+def set_quiet(quiet: bool = True):
+    global QUIET
+    QUIET = quiet
+
+
+class Span:
+    """One timed operation: name, duration, bytes moved, retries and free-form attributes."""
+
+    def __init__(self, name: str, attributes: dict = None):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time()
+        self.duration = 0.0
+        self.bytes = 0
+        self.retries = 0
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add_bytes(self, count: int):
+        self.bytes += count
+
+    @property
+    def throughput(self):
+        """Bytes per second, or None when no bytes were recorded."""
+        if not self.bytes or self.duration <= 0:
+            return None
+        return self.bytes / self.duration
+
+    def to_dict(self) -> dict:
+        record = {
+            "name": self.name,
+            "start": self.start_time,
+            "duration_s": round(self.duration, 6),
+            "status": "error" if self.error else "ok",
+        }
+        if self.bytes:
+            record["bytes"] = self.bytes
+            if self.throughput is not None:
+                record["mib_per_s"] = round(self.throughput / (1024 * 1024), 3)
+        if self.retries:
+            record["retries"] = self.retries
+        if self.error:
+            record["error"] = self.error
+        if self.attributes:
+            record["attributes"] = self.attributes
+        return record
+
+
+def current_span():
+    """The innermost span open in this thread or task, or None."""
+    return _current_span.get()
+
+
+def note_retry(count: int = 1):
+    """Count a retry against the current span, if there is one."""
+    span = _current_span.get()
+    if span is not None:
+        span.retries += count
+
+
+class JsonSink:
+    """Appends one JSON line per span to a file."""
+
+    def __init__(self, path: str = TELEMETRY_JSON_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def flush(self):
+        pass
+
+
+class ConsoleSink:
+    """Prints one line per span (ignores QUIET, since it was asked for)."""
+
+    def export(self, span: Span):
+        line = f"⏱ {span.name}: {span.duration:.3f}s"
+        if span.bytes:
+            line += f", {span.bytes / (1024 * 1024):.1f} MiB"
+            if span.throughput is not None:
+                line += f" at {span.throughput / (1024 * 1024):.1f} MiB/s"
+        if span.retries:
+            line += f", {span.retries} retr{'y' if span.retries == 1 else 'ies'}"
+        if span.error:
+            line += f" ✗ {span.error}"
+        print(line)
+
+    def flush(self):
+        pass
+
+
+class PrometheusSink:
+    """Aggregates spans into Prometheus metrics, written as a text file on flush.
+
+    Per operation and status (ok/error): a duration histogram and counters
+    of bytes and retries. Only those two become labels, so the number of
+    series stays small.
+    """
+
+    def __init__(self, path: str = TELEMETRY_PROM_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def export(self, span: Span):
+        key = (span.name, "error" if span.error else "ok")
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"buckets": [0] * len(PROM_BUCKETS), "count": 0, "sum": 0.0, "bytes": 0, "retries": 0}
+            for i, bound in enumerate(PROM_BUCKETS):
+                if span.duration <= bound:
+                    series["buckets"][i] += 1
+            series["count"] += 1
+            series["sum"] += span.duration
+            series["bytes"] += span.bytes
+            series["retries"] += span.retries
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        name = f"{PROM_PREFIX}_duration_seconds"
+        lines = [f"# HELP {name} Duration of GCS and Vertex AI operations.", f"# TYPE {name} histogram"]
+        counters = {"bytes": [], "retries": []}
+        with self._lock:
+            for (operation, status), series in sorted(self._series.items()):
+                labels = f'operation="{operation}",status="{status}"'
+                for bound, count in zip(PROM_BUCKETS, series["buckets"]):
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f'{name}_bucket{{{labels},le="{le}"}} {count}')
+                lines.append(f"{name}_sum{{{labels}}} {series['sum']:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {series['count']}")
+                for counter in counters:
+                    counters[counter].append(f"{PROM_PREFIX}_{counter}_total{{{labels}}} {series[counter]}")
+        for counter, samples in counters.items():
+            lines.append(f"# TYPE {PROM_PREFIX}_{counter}_total counter")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.path)
+
+
+class OpenTelemetrySink:
+    """Re-emits spans through the OpenTelemetry tracer provider the application configured."""
+
+    def __init__(self, tracer_name: str = "llm-deploy"):
+        from opentelemetry import trace
+
+        self._trace = trace
+        self._tracer = trace.get_tracer(tracer_name)
+
+    def export(self, span: Span):
+        attributes = {key: value for key, value in span.attributes.items() if isinstance(value, (str, bool, int, float))}
+        attributes.update({"bytes": span.bytes, "retries": span.retries})
+        start_ns = int(span.start_time * 1e9)
+        otel_span = self._tracer.start_span(span.name, start_time=start_ns, attributes=attributes)
+        if span.error:
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error))
+        otel_span.end(end_time=start_ns + int(span.duration * 1e9))
+
+    def flush(self):
+        pass
+
+
+SINKS = {"json": JsonSink, "console": ConsoleSink, "prometheus": PrometheusSink, "otel": OpenTelemetrySink}
+
+
+class Telemetry:
+    """Records spans, keeps a per-operation summary and hands spans to the sinks.
+
+    Spans nest: retries noted inside a span (see note_retry) count against
+    the innermost one. Recording costs a few microseconds, so it is always
+    on; sinks only add their own cost when configured.
+    """
+
+    def __init__(self, sinks: list = None):
+        self.sinks = list(sinks or [])
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @classmethod
+    def from_env(cls, spec: str = TELEMETRY_SINKS):
+        sinks = []
+        for name in filter(None, (part.strip().lower() for part in spec.split(","))):
+            if name not in SINKS:
+                raise ValueError(f"Unknown telemetry sink '{name}' (expected one of {', '.join(SINKS)})")
+            sinks.append(SINKS[name]())
+        return cls(sinks)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time the body of a with-block as one span; yields the Span."""
+        span = Span(name, attributes)
+        token = _current_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            _current_span.reset(token)
+            self.finish(span)
+
+    def record(self, name: str, duration: float, nbytes: int = 0, retries: int = 0, error: str = None, **attributes) -> Span:
+        """Record an operation timed elsewhere (e.g. a long-running operation seen by a poller)."""
+        span = Span(name, attributes)
+        span.start_time = time.time() - duration
+        span.duration = duration
+        span.bytes = nbytes
+        span.retries = retries
+        span.error = error
+        self.finish(span)
+        return span
+
+    def finish(self, span: Span):
+        with self._lock:
+            stats = self._stats.get(span.name)
+            if stats is None:
+                stats = self._stats[span.name] = {
+                    "count": 0, "errors": 0, "total_s": 0.0, "bytes": 0, "retries": 0,
+                    "durations": deque(maxlen=SUMMARY_WINDOW),
+                }
+            stats["count"] += 1
+            stats["errors"] += span.error is not None
+            stats["total_s"] += span.duration
+            stats["bytes"] += span.bytes
+            stats["retries"] += span.retries
+            stats["durations"].append(span.duration)
+        for sink in self.sinks:
+            try:
+                sink.export(span)
+            except Exception as e:
+                log(f"✗ Telemetry sink {type(sink).__name__} failed: {e}")
+
+    def summary(self) -> dict:
+        """Per operation: count, errors, total and p50/p95 seconds, bytes, MiB/s and retries."""
+        with self._lock:
+            items = [(name, dict(stats, durations=sorted(stats["durations"]))) for name, stats in self._stats.items()]
+        summary = {}
+        for name, stats in sorted(items):
+            durations = stats.pop("durations")
+            stats["p50_s"] = durations[int(0.5 * (len(durations) - 1))]
+            stats["p95_s"] = durations[int(0.95 * (len(durations) - 1))]
+            stats["mib_per_s"] = stats["bytes"] / (1024 * 1024) / stats["total_s"] if stats["bytes"] and stats["total_s"] else None
+            summary[name] = stats
+        return summary
+
+    def print_summary(self):
+        """Print where the time went, slowest operations first."""
+        summary = self.summary()
+        if not summary:
+            return
+        print(f"{'operation':<32} {'count':>6} {'errors':>6} {'total s':>9} {'p50 s':>8} {'p95 s':>8} {'MiB/s':>8} {'retries':>7}")
+        for name, stats in sorted(summary.items(), key=lambda item: -item[1]["total_s"]):
+            throughput = f"{stats['mib_per_s']:.1f}" if stats["mib_per_s"] is not None else "-"
+            print(
+                f"{name:<32} {stats['count']:>6} {stats['errors']:>6} {stats['total_s']:>9.2f} "
+                f"{stats['p50_s']:>8.3f} {stats['p95_s']:>8.3f} {throughput:>8} {stats['retries']:>7}"
+            )
+
+    def flush(self):
+        for sink in self.sinks:
+            try:
+                sink.flush()
+            except Exception as e:
+                log(f"✗ Telemetry sink {type(sink).__name__} failed to flush: {e}")
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+telemetry = Telemetry.from_env()
+atexit.register(telemetry.flush)